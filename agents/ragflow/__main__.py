@@ -12,8 +12,14 @@ sys.path.insert(0, project_root)  # 直接添加项目根目录
 from common.server import A2AServer
 from common.types import AgentCard, AgentCapabilities, AgentSkill, MissingAPIKeyError, AgentProvider, AgentAuthentication
 from common.utils.push_notification_auth import PushNotificationSenderAuth
+from common.utils.tracing import configure_tracing_from_env
+from common.utils.profiling import Profiler
+from common.utils.loop_monitor import EventLoopMonitor
+from common.utils.logging_config import configure_logging
+from common.utils.admission import AdmissionController
 from agents.ragflow.task_manager import RagFlowTaskManager
 from agents.ragflow.agent import RagFlowAgent
+from agents.ragflow.answer_cache import AnswerCache
 from common.server.task_manager_factory import TaskManagerFactory
 import click
 import logging
@@ -24,27 +30,37 @@ import asyncio
 log_dir = pathlib.Path(project_root) / "log"
 log_dir.mkdir(exist_ok=True)
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),  # 控制台输出
-        logging.FileHandler(log_dir / "ragflow_agent.log", encoding='utf-8')  # 文件输出
-    ]
-)
+# 配置日志：经队列由后台线程写入控制台和按大小轮转的JSON日志文件，避免在事件循环上写盘
+configure_logging(log_dir / "ragflow_agent.log")
 logger = logging.getLogger(__name__)
 
 @click.command()
 @click.option("--host", "host", default="localhost")
 @click.option("--port", "port", default=10003)
-@click.option("--chat-id", "chat_id", default=None, help="RagFlow Chat ID, 与agent-id必须设置其中之一，如果未提供则从环境变量读取")
-@click.option("--agent-id", "agent_id", default=None, help="RagFlow Agent ID, 与chat-id必须设置其中之一")
-@click.option("--ragflow-url", "ragflow_url", default=None, help="RagFlow服务器URL，默认从环境变量RAGFLOW_API_URL或RAGFLOW_ENDPOINT读取")
+@click.option("--chat-id", "chat_id", default=None, help="RagFlow Chat ID，多个用逗号分隔时在它们之间负载均衡，与agent-id必须设置其中之一，如果未提供则从环境变量读取")
+@click.option("--agent-id", "agent_id", default=None, help="RagFlow Agent ID，多个用逗号分隔时在它们之间负载均衡，与chat-id必须设置其中之一")
+@click.option("--ragflow-url", "ragflow_url", default=None, help="RagFlow服务器URL，多个主机用逗号分隔时加权轮询并自动故障转移（url;weight=N设置权重），默认从环境变量RAGFLOW_API_URL或RAGFLOW_ENDPOINT读取")
 @click.option("--storage-type", "storage_type", default=None, help="任务存储类型: memory或database，默认从环境变量TASK_STORAGE_TYPE读取")
 @click.option("--db-url", "db_url", default=None, help="数据库连接URL，默认从环境变量TASK_DB_URL读取")
 @click.option("--public-url", "public_url", default=None, help="公开访问的URL（如https://ragflow.example.com），用于AgentCard，与Nginx等反向代理配合使用")
-def main(host, port, chat_id, agent_id, ragflow_url, storage_type, db_url, public_url):
+@click.option("--profiling/--no-profiling", "profiling", default=False, envvar="A2A_PROFILING", help="开启SIGUSR2信号采集性能剖析；设置环境变量A2A_ADMIN_TOKEN时同时开启需要该令牌的端点POST /admin/profile")
+@click.option("--loop-lag-threshold", "loop_lag_threshold", default=0.1, type=float, help="事件循环阻塞超过该秒数时记录调用栈，0表示关闭事件循环监控")
+@click.option("--max-concurrency", "max_concurrency", default=0, type=int, envvar="A2A_MAX_CONCURRENCY", help="同时调用RagFlow的任务数上限，默认0表示不限制")
+@click.option("--max-queue", "max_queue", default=64, type=int, envvar="A2A_MAX_QUEUE", help="达到并发上限后允许排队的任务数，超出则立即拒绝")
+@click.option("--max-session-concurrency", "max_session_concurrency", default=0, type=int, envvar="A2A_MAX_SESSION_CONCURRENCY", help="单个会话同时处理的任务数上限，默认0表示不限制")
+@click.option("--queue-timeout", "queue_timeout", default=30.0, type=float, envvar="A2A_QUEUE_TIMEOUT", help="任务排队等待的最长秒数，超时则拒绝")
+@click.option("--answer-cache/--no-answer-cache", "answer_cache", default=False, envvar="A2A_ANSWER_CACHE", help="开启回答缓存，重复问题直接返回缓存的回答")
+@click.option("--answer-cache-ttl", "answer_cache_ttl", default=3600.0, type=float, envvar="A2A_ANSWER_CACHE_TTL", help="回答缓存的秒数")
+@click.option("--answer-cache-similarity", "answer_cache_similarity", default=0.0, type=float, envvar="A2A_ANSWER_CACHE_SIMILARITY", help="相似问题命中缓存的Jaccard阈值(0~1)，0表示只做精确匹配")
+@click.option("--answer-cache-exclude", "answer_cache_exclude", default=None, envvar="A2A_ANSWER_CACHE_EXCLUDE", help="匹配该正则的问题不走缓存，如依赖上下文的追问")
+@click.option("--single-flight/--no-single-flight", "single_flight", default=True, envvar="A2A_SINGLE_FLIGHT", help="合并进行中的相同无状态问题，共享一次RagFlow调用")
+@click.option("--session-pool", "session_pool", default=0, type=int, envvar="A2A_SESSION_POOL", help="预创建RagFlow会话池的低水位，池中会话少于该数时在后台补充到2倍，0表示关闭")
+@click.option("--session-pool-max-idle", "session_pool_max_idle", default=600.0, type=float, envvar="A2A_SESSION_POOL_MAX_IDLE", help="预创建的会话在池中闲置超过该秒数后回收")
+@click.option("--routing-policy", "routing_policy", default="least_outstanding", type=click.Choice(["least_outstanding", "ewma"]), envvar="A2A_ROUTING_POLICY", help="多个助手时新会话的选择策略：进行中请求最少或延迟EWMA最低")
+def main(host, port, chat_id, agent_id, ragflow_url, storage_type, db_url, public_url, profiling, loop_lag_threshold,
+         max_concurrency, max_queue, max_session_concurrency, queue_timeout,
+         answer_cache, answer_cache_ttl, answer_cache_similarity, answer_cache_exclude, single_flight,
+         session_pool, session_pool_max_idle, routing_policy):
     """启动RagFlow代理服务器"""
     
     # 设置环境变量
@@ -63,18 +79,41 @@ def main(host, port, chat_id, agent_id, ragflow_url, storage_type, db_url, publi
     # 加载环境变量
     load_dotenv()
 
+    # 按TRACING_EXPORTER等环境变量启用链路追踪，未配置时为空操作
+    configure_tracing_from_env()
+
     # 检查和设置RAGFLOW相关变量
     # ...现有代码保持不变...
 
     try:
         # 启动异步服务器
-        asyncio.run(async_main(host, port, chat_id, agent_id, ragflow_url, public_url))
+        # 准入控制默认关闭，设置了全局或单会话并发上限时才开启
+        admission = None
+        if max_concurrency > 0 or max_session_concurrency > 0:
+            admission = AdmissionController(
+                max_concurrent=max_concurrency,
+                max_queued=max_queue,
+                max_per_session=max_session_concurrency,
+                queue_timeout=queue_timeout,
+            )
+        cache = None
+        if answer_cache:
+            cache = AnswerCache(
+                ttl=answer_cache_ttl,
+                similarity_threshold=answer_cache_similarity,
+                exclude_pattern=answer_cache_exclude,
+            )
+        asyncio.run(async_main(host, port, chat_id, agent_id, ragflow_url, public_url, profiling, loop_lag_threshold,
+                               admission, cache, single_flight, session_pool, session_pool_max_idle,
+                               routing_policy))
     except KeyboardInterrupt:
         logger.info("服务器已被用户中断")
     except Exception as e:
         logger.error(f"服务器启动错误: {e}", exc_info=True)
 
-async def async_main(host, port, chat_id, agent_id, ragflow_url, public_url=None):
+async def async_main(host, port, chat_id, agent_id, ragflow_url, public_url=None, profiling=False, loop_lag_threshold=0.1,
+                     admission=None, answer_cache=None, single_flight=True, session_pool=0,
+                     session_pool_max_idle=600.0, routing_policy="least_outstanding"):
     """异步服务器启动实现"""
     # 验证API密钥和URL
     api_key = os.environ.get("RAGFLOW_API_KEY")
@@ -89,8 +128,8 @@ async def async_main(host, port, chat_id, agent_id, ragflow_url, public_url=None
     if not chat_id and not agent_id:
         chat_assistants = os.environ.get("chat_assistants")
         if chat_assistants:
-            # 如果有多个ID用逗号分隔，取第一个
-            chat_id = chat_assistants.split(",")[0].strip()
+            # 多个ID用逗号分隔，全部参与负载均衡
+            chat_id = chat_assistants
             logger.info(f"从环境变量获取chat_id: {chat_id}")
     
     # 确认提供了chat_id或agent_id之一
@@ -184,12 +223,14 @@ async def async_main(host, port, chat_id, agent_id, ragflow_url, public_url=None
         ),
         
         # A2A协议标准可选字段：性能指标 | A2A Protocol optional standard field: performance metrics
+        # 由A2AServer根据实测的tasks/send和tasks/sendSubscribe数据定期更新 | Updated by A2AServer from measured tasks/send and tasks/sendSubscribe calls
         metrics={
-            "averageResponseTime": "暂未测量",  # 平均响应时间 | Average response time
-            "successRate": "暂未统计"  # 成功率 | Success rate
+            "averageResponseTime": None,  # 平均响应时间（毫秒） | Average response time (ms)
+            "successRate": None  # 成功率（0~1） | Success rate (0-1)
         },
         
         # A2A协议标准可选字段：使用限制 | A2A Protocol optional standard field: usage limits
+        # 启用准入控制时，A2AServer会合入并发上限与实时排队情况 | With admission control, A2AServer merges in concurrency limits and live queue state
         limits={
             "requestsPerMinute": None,  # 每分钟请求数限制 | Request rate limit per minute
             "maxMessageLength": None    # 最大消息长度限制 | Maximum message length limit
@@ -210,7 +251,15 @@ async def async_main(host, port, chat_id, agent_id, ragflow_url, public_url=None
     )
     
     # 创建RagFlow代理实例
-    agent = RagFlowAgent(chat_id=chat_id, agent_id=agent_id)
+    agent = RagFlowAgent(
+        chat_id=chat_id,
+        agent_id=agent_id,
+        answer_cache=answer_cache,
+        single_flight=single_flight,
+        session_pool_low_water=session_pool,
+        session_pool_max_idle=session_pool_max_idle,
+        routing_policy=routing_policy,
+    )
     
     # 创建推送通知认证
     notification_sender_auth = PushNotificationSenderAuth()
@@ -225,15 +274,26 @@ async def async_main(host, port, chat_id, agent_id, ragflow_url, public_url=None
     ragflow_task_manager = RagFlowTaskManager(
         task_manager=base_task_manager,
         agent=agent, 
-        notification_sender_auth=notification_sender_auth
+        notification_sender_auth=notification_sender_auth,
+        admission=admission,
     )
     
+    # 按需开启性能剖析，产物写入log/profiles
+    profiler = None
+    if profiling:
+        profiler = Profiler(output_dir=str(log_dir / "profiles"))
+        if not os.environ.get("A2A_ADMIN_TOKEN"):
+            logger.warning("未设置A2A_ADMIN_TOKEN，不开放性能剖析端点，只能通过SIGUSR2信号采集")
+
     # 创建服务器实例
     server = A2AServer(
         agent_card=agent_card,
         task_manager=ragflow_task_manager,
         host=host,
         port=port,
+        profiler=profiler,
+        admin_token=os.environ.get("A2A_ADMIN_TOKEN"),
+        loop_monitor=EventLoopMonitor(threshold=loop_lag_threshold) if loop_lag_threshold > 0 else None,
     )
     
     # 添加JWKS端点
@@ -242,10 +302,25 @@ async def async_main(host, port, chat_id, agent_id, ragflow_url, public_url=None
         notification_sender_auth.handle_jwks_endpoint, 
         methods=["GET"]
     )
+
+    # 知识库更新后由更新流程调用，清空回答缓存；没有管理令牌时不开放，避免任何客户端都能清空缓存
+    if answer_cache is not None:
+        if os.environ.get("A2A_ADMIN_TOKEN"):
+            server.app.add_route(
+                "/admin/cache/invalidate",
+                answer_cache.invalidate_endpoint(os.environ.get("A2A_ADMIN_TOKEN")),
+                methods=["POST"]
+            )
+        else:
+            logger.warning("未设置A2A_ADMIN_TOKEN，不开放回答缓存失效端点/admin/cache/invalidate，缓存条目只能等待TTL过期")
     
     # 启动服务器（使用异步方法）
     logger.info(f"启动服务器 {host}:{port}")
-    await server.start_async()
+    await agent.start()
+    try:
+        await server.start_async()
+    finally:
+        await agent.close()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -10,21 +10,55 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)  # 直接添加项目根目录
 
 import httpx
-import json
 import logging
-from typing import Dict, Any, AsyncIterable, Literal, Optional, List
+from typing import Dict, Any, AsyncIterable, Literal, Optional, List, Set, Tuple
 from pydantic import BaseModel
 import asyncio
+import math
 import time
 import random
+import re
+from contextlib import aclosing
 from agents.ragflow.session_manager import SessionManager
+from agents.ragflow.answer_cache import CACHE_LOOKUPS, AnswerCache, CachedAnswer
+from agents.ragflow.session_pool import RagFlowSessionPool
+from agents.ragflow.assistant_router import AssistantRouter, RagFlowAssistant
+from collections import OrderedDict
+from common.utils.metrics import REGISTRY
+from common.utils.tracing import TRACER
+from common.utils.single_flight import SingleFlight
+from common.utils.sse import ServerSentEvent, SSEDecoder, json_loads
+from common.utils.upstream_health import (
+    RETRYABLE_STATUS,
+    CircuitOpenError,
+    RetryState,
+    parse_retry_after,
+)
+from common.utils.upstream_pool import UpstreamEndpoint, UpstreamPool
 
 logger = logging.getLogger(__name__)
 
+UPSTREAM_DURATION = REGISTRY.histogram(
+    "ragflow_upstream_duration_seconds",
+    "Latency of RagFlow API calls, by operation and outcome",
+    ["operation", "outcome"],
+)
+UPSTREAM_TTFT = REGISTRY.histogram(
+    "ragflow_time_to_first_token_seconds",
+    "Time from sending a streaming completion to the first answer token",
+)
+
 # 全局配置
 DEFAULT_TIMEOUT = 180.0  # 增加默认超时到3分钟
-MAX_RETRIES = 3          # 最大重试次数
-RETRY_BACKOFF = [1, 3, 5]  # 重试间隔（秒）
+MAX_RETRIES = 3          # 最大尝试次数（含首次请求）
+# 流式事件的快速识别，避免对每个事件中重复的引用做JSON解码
+_SUCCESS_EVENT = re.compile(rb'\s*\{\s*"code"\s*:\s*0\s*,')
+_DONE_EVENT = re.compile(rb'"data"\s*:\s*true\s*\}\s*$')
+_ANSWER_FIELD = re.compile(rb'"answer"\s*:\s*"([^"\\]*(?:\\.[^"\\]*)*)"')
+_EMPTY_REFERENCE = re.compile(rb'"reference"\s*:\s*(?:\{\s*\}|\[\s*\]|null|"")\s*[,}]')
+MAX_KEEPALIVE_CONNECTIONS = 64  # 共享HTTP客户端保留的空闲连接数（所有RagFlow主机合计）
+DETACHED_SESSION_TTL = 3600  # 记住脱离RagFlow会话应答过的A2A会话的秒数
+MAX_DETACHED_SESSIONS = 10000
 
 class ResponseFormat(BaseModel):
     """标准化响应格式，便于与A2A协议对接"""
@@ -32,20 +66,48 @@ class ResponseFormat(BaseModel):
     message: str
     references: Optional[List[Dict[str, Any]]] = None
 
+def parse_ids(value) -> List[str]:
+    """把逗号分隔的字符串或列表解析为去重后的ID列表"""
+    if not value:
+        return []
+    items = value.split(",") if isinstance(value, str) else value
+    ids = []
+    for item in items:
+        item = item.strip()
+        if item and item not in ids:
+            ids.append(item)
+    return ids
+
 class RagFlowAgent:
     """RagFlow代理实现，负责与RagFlow API交互"""
     
     SUPPORTED_CONTENT_TYPES = ["text", "text/plain"]
     
-    def __init__(self, chat_id: Optional[str] = None, agent_id: Optional[str] = None):
+    def __init__(
+        self,
+        chat_id=None,
+        agent_id=None,
+        upstream: Optional[UpstreamPool] = None,
+        answer_cache: Optional[AnswerCache] = None,
+        single_flight: bool = True,
+        session_pool_low_water: int = 0,
+        session_pool_max_idle: float = 600,
+        routing_policy: str = "least_outstanding",
+    ):
         """
         初始化RagFlow代理
         
         Args:
-            chat_id: RagFlow中的chat_id，用于与Chat Assistant交互
-            agent_id: RagFlow中的agent_id，用于与Agent交互
+            chat_id: RagFlow中的chat_id，用于与Chat Assistant交互；多个ID（逗号分隔或列表）时在它们之间负载均衡
+            agent_id: RagFlow中的agent_id，用于与Agent交互；同样支持多个
+            upstream: 共享的RagFlow主机池（加权轮询、按主机熔断、重试预算、退避），默认按RAGFLOW_API_URL新建
+            answer_cache: 可选的回答缓存，命中时invoke和stream不调用RagFlow
+            single_flight: 是否合并进行中的相同无状态请求，共享一次RagFlow调用
+            session_pool_low_water: 预创建会话池的低水位，池中会话少于该数时在后台补充到2倍，0表示不使用会话池
+            session_pool_max_idle: 预创建的会话在池中闲置超过该秒数后回收
+            routing_policy: 多个助手时新会话的选择策略，least_outstanding或ewma
         
-        注意：必须提供chat_id或agent_id之一
+        注意：必须提供chat_id或agent_id之一，多个助手应配置相同（同样的知识库和提示词）
         """
         # 获取API密钥
         self.api_key = os.environ.get("RAGFLOW_API_KEY")
@@ -53,38 +115,98 @@ class RagFlowAgent:
             raise ValueError("RAGFLOW_API_KEY环境变量未设置")
             
         # 获取API URL，优先使用RAGFLOW_API_URL，如果没有则使用RAGFLOW_ENDPOINT
-        self.base_url = os.environ.get("RAGFLOW_API_URL") or os.environ.get("RAGFLOW_ENDPOINT") or "https://api.ragflow.ai"
+        # 多个主机用逗号分隔，可用"url;weight=N"设置权重
+        api_urls = os.environ.get("RAGFLOW_API_URL") or os.environ.get("RAGFLOW_ENDPOINT") or "https://api.ragflow.ai"
         if not (os.environ.get("RAGFLOW_API_URL") or os.environ.get("RAGFLOW_ENDPOINT")):
-            logger.warning(f"未设置RAGFLOW_API_URL或RAGFLOW_ENDPOINT环境变量，使用默认值: {self.base_url}")
+            logger.warning(f"未设置RAGFLOW_API_URL或RAGFLOW_ENDPOINT环境变量，使用默认值: {api_urls}")
+
+        # create_session/invoke/stream共用同一个主机池：按主机熔断，共享重试预算
+        self.upstream = upstream or UpstreamPool("ragflow", api_urls, max_attempts=MAX_RETRIES)
+        self.base_url = self.upstream.endpoints[0].url
         
+        chat_ids = parse_ids(chat_id)
+        agent_ids = parse_ids(agent_id)
+
         # 如果没有提供chat_id，尝试从环境变量中获取
-        if not chat_id and not agent_id:
-            chat_assistants = os.environ.get("chat_assistants")
-            if chat_assistants:
-                # 如果有多个ID用逗号分隔，取第一个
-                chat_id = chat_assistants.split(",")[0].strip()
-                logger.info(f"从环境变量获取chat_id: {chat_id}")
+        if not chat_ids and not agent_ids:
+            chat_ids = parse_ids(os.environ.get("chat_assistants"))
+            if chat_ids:
+                logger.info(f"从环境变量获取chat_id: {', '.join(chat_ids)}")
             
         # 确认至少提供了一个ID
-        if not chat_id and not agent_id:
+        if not chat_ids and not agent_ids:
             raise ValueError("必须提供chat_id或agent_id之一")
-            
-        self.chat_id = chat_id
-        self.agent_id = agent_id
-        self.is_agent_mode = agent_id is not None
+
+        # 参与负载均衡的助手，第一个为主助手（决定代理卡片和缓存作用域）
+        self.assistants = [RagFlowAssistant("agent", i) for i in agent_ids] + [RagFlowAssistant("chat", i) for i in chat_ids]
+        self.router = AssistantRouter(self.assistants, policy=routing_policy)
+        primary = self.assistants[0]
+        self.chat_id = chat_ids[0] if chat_ids else None
+        self.agent_id = agent_ids[0] if agent_ids else None
+        self.is_agent_mode = primary.kind == "agent"
         
-        logger.info(f"初始化RagFlow代理: {'Agent模式' if self.is_agent_mode else 'Chat模式'}, ID: {self.agent_id or self.chat_id}")
-        logger.info(f"使用RagFlow API: {self.base_url}")
+        logger.info(f"初始化RagFlow代理: {'Agent模式' if self.is_agent_mode else 'Chat模式'}, ID: {primary.id}")
+        if len(self.assistants) > 1:
+            logger.info("在%d个助手之间负载均衡(%s): %s", len(self.assistants), routing_policy,
+                        ", ".join(a.key for a in self.assistants))
+        logger.info(f"使用RagFlow API: {', '.join(e.url for e in self.upstream.endpoints)}")
         
         # 使用会话管理器替代内存字典
         self.session_manager = SessionManager()
+
+        # 所有RagFlow请求共用一个HTTP客户端，复用到各主机的连接，首次请求时创建
+        self._client: Optional[httpx.AsyncClient] = None
+
+        # 回答缓存按主助手隔离，同组助手配置相同，共用一个作用域
+        self.answer_cache = answer_cache
+        self.cache_scope = primary.key
+
+        # 每个助手一个预创建的RagFlow会话池，新会话首轮对话直接领取，随start()/close()启停
+        if session_pool_low_water > 0:
+            for assistant in self.assistants:
+                assistant.session_pool = RagFlowSessionPool(
+                    lambda assistant=assistant: self._create_remote_session(assistant, "A2A Pooled Session"),
+                    lambda ids, assistant=assistant: self._delete_remote_sessions(assistant, ids),
+                    low_water=session_pool_low_water,
+                    max_idle=session_pool_max_idle,
+                    name=assistant.key,
+                )
+
+        # 同一A2A会话的并发首轮请求共享一次会话创建
+        self._session_creation = SingleFlight("ragflow.create_session")
+
+        # 相同问题的并发无状态请求共享一次上游调用
+        self.single_flight = SingleFlight("ragflow") if single_flight else None
+
+        # 未经自己的RagFlow会话就得到回答的A2A会话（缓存命中或共享他人的请求）：
+        # RagFlow中没有这一轮对话，其后续问题按有上下文处理，不再走缓存或合并
+        self._detached_sessions: "OrderedDict[str, float]" = OrderedDict()
+
+        # 新会话的映射在后台写入数据库，首轮对话不等待；写入完成前由这里提供映射
+        self._unsaved_sessions: Dict[str, Tuple[RagFlowAssistant, str]] = {}
+        self._session_saves: Dict[str, asyncio.Task] = {}
+        # 写入映射时发现其他进程已抢先写入的RagFlow会话，使用它的对话都结束后删除
+        self._superseded_sessions: Dict[str, RagFlowAssistant] = {}
+        self._sessions_in_use: Dict[str, int] = {}
+        # 后台的数据库写入与清理任务，close()时等待完成
+        self._background: Set[asyncio.Task] = set()
         
-    def get_headers(self):
-        """获取API请求头"""
-        return {
+    def _http(self) -> httpx.AsyncClient:
+        """共享的HTTP客户端，并发数由准入控制限制，这里不再限制连接数"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=30.0),
+                limits=httpx.Limits(max_connections=None, max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS),
+            )
+        return self._client
+
+    def get_headers(self, span=None):
+        """获取API请求头，启用链路追踪时附带traceparent（默认取当前span）"""
+        headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
         }
+        return TRACER.inject(headers, span)
     
     async def create_session(self, session_id: str) -> str:
         """
@@ -96,66 +218,244 @@ class RagFlowAgent:
         Returns:
             RagFlow会话ID
         """
-        # 先尝试从会话管理器获取
-        ragflow_session_id = self.session_manager.get_session(session_id)
-        if ragflow_session_id:
-            logger.info(f"从持久化存储中恢复会话: A2A会话ID {session_id} -> RagFlow会话ID {ragflow_session_id}")
-            return ragflow_session_id
-            
-        endpoint = None
-        if self.is_agent_mode:
-            endpoint = f"/api/v1/agents/{self.agent_id}/sessions"
-        else:
-            endpoint = f"/api/v1/chats/{self.chat_id}/sessions"
-            
-        # 添加重试逻辑
-        for attempt in range(MAX_RETRIES):
+        _, ragflow_session_id = await self._open_session(session_id)
+        # 对话请求不等待映射写入，这里等待写入完成，返回最终生效的会话（其他进程可能抢先写入）
+        saving = self._session_saves.get(session_id)
+        if saving is not None:
+            await asyncio.shield(saving)
+            mapping = await asyncio.to_thread(self.session_manager.get_session_info, session_id, touch=False)
+            if mapping is not None:
+                return mapping["ragflow_session_id"]
+        return ragflow_session_id
+
+    async def _open_session(self, session_id: str) -> Tuple[RagFlowAssistant, str]:
+        """恢复或创建A2A会话对应的RagFlow会话，返回(所属助手, RagFlow会话ID)"""
+        with TRACER.span("ragflow.create_session", attributes={"a2a.session_id": session_id}) as span:
+            # 刚创建、映射尚未写入数据库的会话直接使用，已有会话固定在创建它的助手上
+            unsaved = self._unsaved_sessions.get(session_id)
+            if unsaved is not None:
+                assistant, ragflow_session_id = unsaved
+                cached = True
+            else:
+                # 同一A2A会话的并发请求共享一次查找，只创建一个RagFlow会话
+                (assistant, ragflow_session_id, cached), shared = await self._session_creation.do(
+                    session_id, lambda: self._restore_or_create_session(session_id)
+                )
+                span.set_attribute("ragflow.session_creation_shared", shared)
+            span.set_attribute("ragflow.session_cached", cached)
+            span.set_attribute("ragflow.assistant", assistant.key)
+            return assistant, ragflow_session_id
+
+    async def _restore_or_create_session(self, session_id: str) -> Tuple[RagFlowAssistant, str, bool]:
+        """
+        从持久化存储恢复会话，没有时创建；数据库查询在线程中进行，不阻塞事件循环
+
+        Returns:
+            (所属助手, RagFlow会话ID, 是否为已有会话)
+        """
+        mapping = await asyncio.to_thread(self.session_manager.get_session_info, session_id, touch=False)
+        if mapping is None:
+            assistant, ragflow_session_id = await self._create_and_save_session(session_id)
+            return assistant, ragflow_session_id, False
+        logger.info("从持久化存储中恢复会话: A2A会话ID %s -> RagFlow会话ID %s", session_id, mapping["ragflow_session_id"])
+        assistant = self.router.get(mapping["agent_type"], mapping["agent_id"])
+        # 最后使用时间在后台更新，不阻塞对话请求
+        self._spawn(asyncio.to_thread(self.session_manager.touch_session, session_id))
+        return assistant, mapping["ragflow_session_id"], True
+
+    async def _create_and_save_session(self, session_id: str) -> Tuple[RagFlowAssistant, str]:
+        """为新会话选择助手，领取或创建RagFlow会话，映射在后台持久化，对话请求可以立即发出"""
+        assistant = self.router.select()
+        # 优先领取会话池中预创建的会话，无需等待创建请求
+        ragflow_session_id = assistant.session_pool.claim() if assistant.session_pool is not None else None
+        if ragflow_session_id is None:
+            # 创建期间计入进行中请求，避免突发的新会话都选中同一个助手
+            self.router.acquire(assistant)
+            started = time.perf_counter()
+            outcome = "error"
             try:
-                async with httpx.AsyncClient(timeout=30.0) as client:
-                    response = await client.post(
-                        f"{self.base_url}{endpoint}",
-                        headers=self.get_headers(),
-                        json={"name": f"A2A Session {session_id}"}
-                    )
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        if data.get("code") == 0:
-                            # 存储映射关系到持久化存储
-                            ragflow_session_id = data["data"]["id"]
-                            agent_type = "agent" if self.is_agent_mode else "chat"
-                            agent_id = self.agent_id if self.is_agent_mode else self.chat_id
-                            
-                            # 保存到会话管理器
-                            if self.session_manager.save_session(session_id, ragflow_session_id, agent_type, agent_id):
-                                logger.info(f"创建RagFlow会话成功并持久化: A2A会话ID {session_id} -> RagFlow会话ID {ragflow_session_id}")
-                            else:
-                                logger.warning(f"会话持久化失败: A2A会话ID {session_id} -> RagFlow会话ID {ragflow_session_id}")
-                                
-                            return ragflow_session_id
-                    
-                    # 如果是500或503错误，重试
-                    if response.status_code in [429, 500, 502, 503, 504]:
-                        retry_delay = RETRY_BACKOFF[min(attempt, len(RETRY_BACKOFF)-1)]
-                        logger.warning(f"创建会话失败，HTTP {response.status_code}，{retry_delay}秒后重试 ({attempt+1}/{MAX_RETRIES})")
-                        await asyncio.sleep(retry_delay)
-                        continue
-                        
-                    # 其他错误，直接失败
-                    logger.error(f"创建会话失败: {response.text}")
-                    raise ValueError(f"创建会话失败: {response.text}")
-            
+                ragflow_session_id = await self._create_remote_session(assistant, f"A2A Session {session_id}")
+                outcome = "ok"
+            except CircuitOpenError:
+                outcome = "rejected"
+                raise
+            finally:
+                UPSTREAM_DURATION.labels("create_session", outcome).observe(time.perf_counter() - started)
+                # 创建成功不清零失败计数，否则对话总是失败的助手永远不会被摘除
+                self.router.release(assistant, False if outcome == "error" else None)
+
+        # 存储映射关系到持久化存储，与首轮对话请求并发进行
+        self._unsaved_sessions[session_id] = (assistant, ragflow_session_id)
+        self._session_saves[session_id] = self._spawn(self._save_session(session_id, assistant, ragflow_session_id))
+        return assistant, ragflow_session_id
+
+    async def _save_session(self, session_id: str, assistant: RagFlowAssistant, ragflow_session_id: str):
+        """在线程中写入会话映射；其他进程抢先写入时后续对话沿用已有映射，本会话在使用它的对话结束后删除"""
+        try:
+            stored = await asyncio.to_thread(
+                self.session_manager.save_session_if_absent, session_id, ragflow_session_id, assistant.kind, assistant.id
+            )
+        finally:
+            self._unsaved_sessions.pop(session_id, None)
+            self._session_saves.pop(session_id, None)
+        if stored is None:
+            logger.warning(f"会话持久化失败: A2A会话ID {session_id} -> RagFlow会话ID {ragflow_session_id}")
+            return
+        if stored != ragflow_session_id:
+            logger.info("A2A会话 %s 已由其他请求创建RagFlow会话 %s，对话结束后删除多余的会话 %s", session_id, stored, ragflow_session_id)
+            self._superseded_sessions[ragflow_session_id] = assistant
+            if not self._sessions_in_use.get(ragflow_session_id):
+                await self._discard_superseded(ragflow_session_id)
+
+    def _use_session(self, ragflow_session_id: str):
+        """记录一个正在使用该RagFlow会话的对话请求"""
+        self._sessions_in_use[ragflow_session_id] = self._sessions_in_use.get(ragflow_session_id, 0) + 1
+
+    def _release_session(self, ragflow_session_id: str):
+        """对话请求结束，最后一个使用者结束时删除已被取代的会话"""
+        remaining = self._sessions_in_use.pop(ragflow_session_id, 1) - 1
+        if remaining > 0:
+            self._sessions_in_use[ragflow_session_id] = remaining
+        elif ragflow_session_id in self._superseded_sessions:
+            self._spawn(self._discard_superseded(ragflow_session_id))
+
+    async def _discard_superseded(self, ragflow_session_id: str):
+        assistant = self._superseded_sessions.pop(ragflow_session_id, None)
+        if assistant is None:
+            return
+        try:
+            await self._delete_remote_sessions(assistant, [ragflow_session_id])
+        except Exception as e:
+            logger.warning("删除多余的RagFlow会话失败: %s", e)
+
+    def _spawn(self, coro) -> asyncio.Task:
+        """在后台运行不影响回答的工作（数据库写入、清理），保留引用直到完成"""
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    async def _create_remote_session(self, assistant: RagFlowAssistant, name: str) -> str:
+        """在助手下创建RagFlow会话并返回其ID，熔断打开时抛出CircuitOpenError"""
+        endpoint = assistant.sessions_endpoint
+        retry = self.upstream.start_request()
+        tried: List[UpstreamEndpoint] = []
+        while True:
+            host = self.upstream.select(tried)
+            sent = time.perf_counter()
+            try:
+                response = await self._http().post(
+                    f"{host.url}{endpoint}",
+                    headers=self.get_headers(),
+                    json={"name": name},
+                    timeout=30.0
+                )
             except (httpx.ConnectError, httpx.TimeoutException) as e:
-                if attempt < MAX_RETRIES - 1:
-                    retry_delay = RETRY_BACKOFF[min(attempt, len(RETRY_BACKOFF)-1)]
-                    logger.warning(f"连接错误: {str(e)}，{retry_delay}秒后重试 ({attempt+1}/{MAX_RETRIES})")
-                    await asyncio.sleep(retry_delay)
-                else:
-                    logger.error(f"创建会话失败，连接错误: {str(e)}")
+                delay = self._on_upstream_failure(retry, "创建会话", host, tried, error=e)
+                if delay is None:
                     raise ValueError(f"创建会话失败，连接错误: {str(e)}")
-            
-        # 所有重试都失败
-        raise ValueError("创建会话失败：超过最大重试次数")
+                await asyncio.sleep(delay)
+                continue
+
+            # 临时错误按退避策略重试
+            if response.status_code in RETRYABLE_STATUS:
+                delay = self._on_upstream_failure(
+                    retry, "创建会话", host, tried, response.status_code,
+                    parse_retry_after(response.headers.get("Retry-After")),
+                )
+                if delay is None:
+                    raise ValueError(f"创建会话失败: HTTP {response.status_code}")
+                await asyncio.sleep(delay)
+                continue
+
+            self.upstream.record_success(host, time.perf_counter() - sent)
+            if response.status_code == 200:
+                data = response.json()
+                if data.get("code") == 0:
+                    return data["data"]["id"]
+
+            # 其他错误，直接失败
+            logger.error(f"创建会话失败: {response.text}")
+            raise ValueError(f"创建会话失败: {response.text}")
+
+    async def _delete_remote_sessions(self, assistant: RagFlowAssistant, ragflow_session_ids: List[str]):
+        """删除助手下的一批RagFlow会话（会话池回收用），不重试"""
+        host = self.upstream.select()
+        try:
+            response = await self._http().request(
+                "DELETE",
+                f"{host.url}{assistant.sessions_endpoint}",
+                headers=self.get_headers(),
+                json={"ids": ragflow_session_ids},
+                timeout=30.0
+            )
+        except (httpx.ConnectError, httpx.TimeoutException):
+            self.upstream.record_failure(host)
+            raise
+        if response.status_code in RETRYABLE_STATUS:
+            self.upstream.record_failure(host, response.status_code)
+        else:
+            self.upstream.record_success(host)
+        if response.status_code != 200 or response.json().get("code") != 0:
+            raise ValueError(f"删除会话失败: HTTP {response.status_code} - {response.text}")
+
+    async def start(self):
+        """启动后台任务（会话池补充），需在服务所在的事件循环中调用"""
+        for assistant in self.assistants:
+            if assistant.session_pool is not None:
+                assistant.session_pool.start()
+
+    async def close(self):
+        """停止后台任务，等待会话映射写入完成，删除会话池中未领取的会话，关闭共享的HTTP客户端"""
+        await asyncio.gather(*(
+            assistant.session_pool.stop() for assistant in self.assistants if assistant.session_pool is not None
+        ))
+        # 已完成的任务由done回调移出集合，但gather对已完成的任务不让出事件循环，因此显式移除
+        while self._background:
+            pending = list(self._background)
+            await asyncio.gather(*pending, return_exceptions=True)
+            self._background.difference_update(pending)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _on_upstream_failure(
+        self,
+        retry: RetryState,
+        operation: str,
+        host: UpstreamEndpoint,
+        tried: List[UpstreamEndpoint],
+        status_code: Optional[int] = None,
+        retry_after: Optional[float] = None,
+        error: Optional[Exception] = None,
+    ) -> Optional[float]:
+        """
+        向主机池报告一次失败，返回重试前的等待秒数，None表示放弃重试
+
+        重试优先发往本次请求尚未尝试过的主机；连接失败且有其他可用主机时立即切换，不再退避。
+        """
+        self.upstream.record_failure(host, status_code)
+        tried.append(host)
+        failover = isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout)) and self.upstream.has_alternative(tried)
+        delay = retry.next_delay(retry_after, failover=failover)
+        reason = f"HTTP {status_code}" if status_code is not None else f"连接错误: {error}"
+        if delay is None:
+            logger.error("%s失败(%s)，%s，不再重试 (%d/%d)", operation, host.url, reason, retry.attempt, self.upstream.max_attempts)
+        elif failover:
+            logger.warning("%s失败(%s)，%s，切换到其他主机 (%d/%d)", operation, host.url, reason, retry.attempt - 1, self.upstream.max_attempts)
+        else:
+            logger.warning("%s失败(%s)，%s，%.1f秒后重试 (%d/%d)", operation, host.url, reason, delay, retry.attempt - 1, self.upstream.max_attempts)
+        return delay
+
+    @staticmethod
+    def _unavailable_result(error: CircuitOpenError) -> Dict[str, Any]:
+        """熔断打开时直接返回的错误结果，不再请求RagFlow"""
+        return {
+            "is_task_complete": False,
+            "require_user_input": True,
+            "content": f"RagFlow服务暂时不可用，请{math.ceil(error.retry_after)}秒后再试",
+            "references": None
+        }
     
     async def invoke(self, query: str, session_id: str) -> Dict[str, Any]:
         """
@@ -168,94 +468,153 @@ class RagFlowAgent:
         Returns:
             标准化的响应结果
         """
-        ragflow_session_id = await self.create_session(session_id)
+        with TRACER.span("ragflow.invoke", attributes={"a2a.session_id": session_id}) as span:
+            stateless = await self._is_stateless(session_id)
+            cacheable, cached = self._lookup_cache(query, stateless)
+            span.set_attribute("ragflow.answer_cache", "hit" if cached else ("miss" if cacheable else "bypass"))
+            if cached is not None:
+                self._mark_detached(session_id)
+                return cached.to_result()
+
+            if stateless and self.single_flight is not None:
+                result, shared = await self.single_flight.do(
+                    self._flight_key(query), lambda: self._invoke_upstream(query, session_id, cacheable)
+                )
+                span.set_attribute("ragflow.single_flight", "follower" if shared else "leader")
+                if shared:
+                    self._mark_detached(session_id)
+                    result = dict(result)
+            else:
+                result = await self._invoke_upstream(query, session_id, cacheable)
+
+            if not result.get("is_task_complete"):
+                span.set_status(False, result.get("content", ""))
+            return result
+
+    async def _invoke_upstream(self, query: str, session_id: str, cacheable: bool) -> Dict[str, Any]:
+        """创建或恢复RagFlow会话并发送非流式请求，成功的回答按需写入缓存"""
+        try:
+            assistant, ragflow_session_id = await self._open_session(session_id)
+        except CircuitOpenError as e:
+            return self._unavailable_result(e)
+
+        self.router.acquire(assistant)
+        self._use_session(ragflow_session_id)
+        started = time.perf_counter()
+        outcome = "cancelled"
+        try:
+            result = await self._complete(assistant, query, ragflow_session_id)
+            outcome = "ok" if result.get("is_task_complete") else "error"
+        except CircuitOpenError as e:
+            outcome = "rejected"
+            result = self._unavailable_result(e)
+        finally:
+            elapsed = time.perf_counter() - started
+            UPSTREAM_DURATION.labels("invoke", outcome).observe(elapsed)
+            if outcome == "ok":
+                self.router.observe_latency(assistant, elapsed)
+            # 熔断拒绝和取消与助手本身的健康无关
+            self.router.release(assistant, {"ok": True, "error": False}.get(outcome))
+            self._release_session(ragflow_session_id)
+        if outcome == "ok" and cacheable:
+            self.answer_cache.put(self.cache_scope, query, result["content"], result["references"])
+        return result
+
+    def _flight_key(self, query: str) -> Tuple[str, str]:
+        return (self.cache_scope, AnswerCache.normalize(query))
+
+    async def _is_stateless(self, session_id: str) -> bool:
+        """
+        会话是否没有对话上下文
+
+        已有RagFlow会话的A2A会话处于多轮对话中，回答可能依赖上下文，不能走缓存或与其他会话合并。
+        """
+        if session_id in self._unsaved_sessions:
+            return False
+        expires_at = self._detached_sessions.get(session_id)
+        if expires_at is not None:
+            if expires_at > time.monotonic():
+                return False
+            del self._detached_sessions[session_id]
+        return not await asyncio.to_thread(self.session_manager.get_session, session_id, touch=False)
+
+    def _mark_detached(self, session_id: str):
+        now = time.monotonic()
+        self._detached_sessions[session_id] = now + DETACHED_SESSION_TTL
+        self._detached_sessions.move_to_end(session_id)
+        while self._detached_sessions:
+            oldest, expires_at = next(iter(self._detached_sessions.items()))
+            if expires_at > now and len(self._detached_sessions) <= MAX_DETACHED_SESSIONS:
+                break
+            del self._detached_sessions[oldest]
+
+    def _lookup_cache(self, query: str, stateless: bool) -> Tuple[bool, Optional[CachedAnswer]]:
+        """
+        查找回答缓存
+
+        Returns:
+            (该问题的回答是否可写入缓存, 命中的缓存回答)
+        """
+        if self.answer_cache is None:
+            return False, None
+        if not stateless or not self.answer_cache.is_cacheable(query):
+            CACHE_LOOKUPS.labels("bypass").inc()
+            return False, None
+        return True, self.answer_cache.get(self.cache_scope, query)
+
+    async def _replay(self, cached: CachedAnswer, pieces: int = 8) -> AsyncIterable[Dict[str, Any]]:
+        """把缓存的回答分几段快速回放，与流式输出的格式一致"""
+        content = cached.content
+        step = max(1, math.ceil(len(content) / pieces))
+        for end in range(step, len(content), step):
+            yield {
+                "is_task_complete": False,
+                "require_user_input": False,
+                "content": content[:end],
+                "references": None
+            }
+            await asyncio.sleep(0)
+        yield cached.to_result()
+
+    async def _complete(self, assistant: RagFlowAssistant, query: str, ragflow_session_id: str) -> Dict[str, Any]:
+        """发送非流式对话请求，包含重试逻辑，熔断打开时抛出CircuitOpenError"""
         
-        endpoint = None
+        endpoint = assistant.completions_endpoint
         payload = {"question": query, "stream": False}
-        
-        if self.is_agent_mode:
-            endpoint = f"/api/v1/agents/{self.agent_id}/completions"
-        else:
-            endpoint = f"/api/v1/chats/{self.chat_id}/completions"
-            
         payload["session_id"] = ragflow_session_id
         
-        logger.info(f"发送非流式请求: {query}")
+        logger.info("发送非流式请求: %s", query)
         
-        # 添加重试逻辑
-        for attempt in range(MAX_RETRIES):
+        retry = self.upstream.start_request()
+        tried: List[UpstreamEndpoint] = []
+        while True:
+            host = self.upstream.select(tried)
+            sent = time.perf_counter()
+
             try:
-                # 增加超时时间
-                timeout = httpx.Timeout(DEFAULT_TIMEOUT, connect=30.0)
-                async with httpx.AsyncClient(timeout=timeout) as client:
-                    response = await client.post(
-                        f"{self.base_url}{endpoint}",
-                        headers=self.get_headers(),
-                        json=payload
-                    )
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        if data.get("code") == 0:
-                            # 处理结果
-                            result = data.get("data", {})
-                            answer = result.get("answer", "")
-                            references = result.get("reference", {})
-                            
-                            logger.info(f"收到非流式回答: {answer[:100]}...")
-                            
-                            # 返回标准格式
-                            return {
-                                "is_task_complete": True,
-                                "require_user_input": False,
-                                "content": answer,
-                                "references": references
-                            }
-                    
-                    # 如果是临时错误，重试
-                    if response.status_code in [429, 500, 502, 503, 504]:
-                        retry_delay = RETRY_BACKOFF[min(attempt, len(RETRY_BACKOFF)-1)]
-                        logger.warning(f"对话请求失败，HTTP {response.status_code}，{retry_delay}秒后重试 ({attempt+1}/{MAX_RETRIES})")
-                        await asyncio.sleep(retry_delay)
-                        continue
-                        
-                    # 其他错误
-                    logger.error(f"对话请求失败: HTTP {response.status_code} - {response.text}")
-                    return {
-                        "is_task_complete": False,
-                        "require_user_input": True,
-                        "content": f"与RagFlow服务通信失败: HTTP {response.status_code}",
-                        "references": None
-                    }
-                    
-            except httpx.TimeoutException as e:
-                if attempt < MAX_RETRIES - 1:
-                    retry_delay = RETRY_BACKOFF[min(attempt, len(RETRY_BACKOFF)-1)]
-                    logger.warning(f"请求超时: {str(e)}，{retry_delay}秒后重试 ({attempt+1}/{MAX_RETRIES})")
-                    await asyncio.sleep(retry_delay)
-                else:
-                    logger.error(f"对话请求失败，请求超时: {str(e)}")
+                response = await self._http().post(
+                    f"{host.url}{endpoint}",
+                    headers=self.get_headers(),
+                    json=payload
+                )
+            except (httpx.ConnectError, httpx.TimeoutException) as e:
+                delay = self._on_upstream_failure(retry, "对话请求", host, tried, error=e)
+                if delay is not None:
+                    await asyncio.sleep(delay)
+                    continue
+                if isinstance(e, httpx.TimeoutException):
                     return {
                         "is_task_complete": False,
                         "require_user_input": True,
                         "content": "RagFlow服务响应超时，请尝试更简短的问题，或稍后再试",
                         "references": None
                     }
-                    
-            except httpx.ConnectError as e:
-                if attempt < MAX_RETRIES - 1:
-                    retry_delay = RETRY_BACKOFF[min(attempt, len(RETRY_BACKOFF)-1)]
-                    logger.warning(f"连接错误: {str(e)}，{retry_delay}秒后重试 ({attempt+1}/{MAX_RETRIES})")
-                    await asyncio.sleep(retry_delay)
-                else:
-                    logger.error(f"对话请求失败，连接错误: {str(e)}")
-                    return {
-                        "is_task_complete": False,
-                        "require_user_input": True,
-                        "content": f"无法连接到RagFlow服务: {str(e)}",
-                        "references": None
-                    }
-                    
+                return {
+                    "is_task_complete": False,
+                    "require_user_input": True,
+                    "content": f"无法连接到RagFlow服务: {str(e)}",
+                    "references": None
+                }
             except Exception as e:
                 logger.error(f"对话请求失败，未知错误: {str(e)}")
                 logger.exception(e)
@@ -265,14 +624,53 @@ class RagFlowAgent:
                     "content": f"调用RagFlow服务时出现未知错误: {str(e)}",
                     "references": None
                 }
-        
-        # 所有重试都失败
-        return {
-            "is_task_complete": False,
-            "require_user_input": True,
-            "content": "达到最大重试次数，无法完成请求，请稍后再试",
-            "references": None
-        }
+
+            # 如果是临时错误，按退避策略重试
+            if response.status_code in RETRYABLE_STATUS:
+                delay = self._on_upstream_failure(
+                    retry, "对话请求", host, tried, response.status_code,
+                    parse_retry_after(response.headers.get("Retry-After")),
+                )
+                if delay is not None:
+                    await asyncio.sleep(delay)
+                    continue
+                return {
+                    "is_task_complete": False,
+                    "require_user_input": True,
+                    "content": "达到最大重试次数，无法完成请求，请稍后再试",
+                    "references": None
+                }
+
+            self.upstream.record_success(host, time.perf_counter() - sent)
+            if response.status_code == 200:
+                try:
+                    data = response.json()
+                except ValueError:
+                    data = {}
+                if data.get("code") == 0:
+                    # 处理结果
+                    result = data.get("data", {})
+                    answer = result.get("answer", "")
+                    references = result.get("reference", {})
+                    
+                    logger.info("收到非流式回答: %.100s...", answer)
+                    
+                    # 返回标准格式
+                    return {
+                        "is_task_complete": True,
+                        "require_user_input": False,
+                        "content": answer,
+                        "references": references
+                    }
+
+            # 其他错误
+            logger.error(f"对话请求失败: HTTP {response.status_code} - {response.text}")
+            return {
+                "is_task_complete": False,
+                "require_user_input": True,
+                "content": f"与RagFlow服务通信失败: HTTP {response.status_code}",
+                "references": None
+            }
     
     async def stream(self, query: str, session_id: str) -> AsyncIterable[Dict[str, Any]]:
         """
@@ -283,136 +681,156 @@ class RagFlowAgent:
             session_id: 会话ID
             
         Yields:
-            流式标准化响应结果
+            流式标准化响应结果；带is_notice的项是状态提示（如正在重试），不是回答内容
         """
-        ragflow_session_id = await self.create_session(session_id)
+        # 异步生成器在yield之间不能改动调用方的当前span，因此span只在await期间激活，
+        # 并显式传给请求头
+        span = TRACER.start_span("ragflow.stream", attributes={"a2a.session_id": session_id})
+        stateless = await self._is_stateless(session_id)
+        cacheable, cached = self._lookup_cache(query, stateless)
+        span.set_attribute("ragflow.answer_cache", "hit" if cached else ("miss" if cacheable else "bypass"))
+        if cached is not None:
+            self._mark_detached(session_id)
+            try:
+                async for item in self._replay(cached):
+                    yield item
+            finally:
+                span.end()
+            return
+
+        if stateless and self.single_flight is not None:
+            source = self._shared_stream(query, session_id, span, cacheable)
+        else:
+            source = self._stream_upstream(query, session_id, span, cacheable)
+
+        outcome = "cancelled"
+        try:
+            async for item in source:
+                if item["is_task_complete"]:
+                    outcome = "ok"
+                elif item["require_user_input"]:
+                    outcome = "error"
+                yield item
+        finally:
+            span.set_attribute("outcome", outcome)
+            if outcome == "error":
+                span.set_status(False)
+            span.end()
+
+    async def _shared_stream(self, query: str, session_id: str, span, cacheable: bool) -> AsyncIterable[Dict[str, Any]]:
+        """与其他会话中进行中的相同问题共享一个RagFlow流，跟随者收到最新的累积回答"""
+        flight = self.single_flight.stream(
+            self._flight_key(query), lambda: self._stream_upstream(query, session_id, span, cacheable)
+        )
+        try:
+            first = True
+            async for item, shared in flight:
+                if first:
+                    first = False
+                    span.set_attribute("ragflow.single_flight", "follower" if shared else "leader")
+                    if shared:
+                        self._mark_detached(session_id)
+                yield item
+        finally:
+            await flight.aclose()
+
+    async def _stream_upstream(self, query: str, session_id: str, span, cacheable: bool) -> AsyncIterable[Dict[str, Any]]:
+        """创建或恢复RagFlow会话并发送流式请求，成功的回答按需写入缓存"""
+        try:
+            with TRACER.use_span(span):
+                assistant, ragflow_session_id = await self._open_session(session_id)
+        except CircuitOpenError as e:
+            yield self._unavailable_result(e)
+            return
+
+        self.router.acquire(assistant)
+        self._use_session(ragflow_session_id)
+        started = time.perf_counter()
+        outcome = "cancelled"
+        try:
+            async for item in self._stream_completion(assistant, query, ragflow_session_id, span):
+                if item["is_task_complete"]:
+                    outcome = "ok"
+                    if cacheable:
+                        self.answer_cache.put(self.cache_scope, query, item["content"], item["references"])
+                elif item["require_user_input"]:
+                    outcome = "error"
+                yield item
+        except CircuitOpenError as e:
+            outcome = "rejected"
+            yield self._unavailable_result(e)
+        finally:
+            UPSTREAM_DURATION.labels("stream", outcome).observe(time.perf_counter() - started)
+            self.router.release(assistant, {"ok": True, "error": False}.get(outcome))
+            self._release_session(ragflow_session_id)
+
+    async def _stream_completion(self, assistant: RagFlowAssistant, query: str, ragflow_session_id: str, span=None) -> AsyncIterable[Dict[str, Any]]:
+        """发送流式对话请求，包含重试逻辑，熔断打开时抛出CircuitOpenError"""
         
-        endpoint = None
+        endpoint = assistant.completions_endpoint
         payload = {"question": query, "stream": True}
-        
-        if self.is_agent_mode:
-            endpoint = f"/api/v1/agents/{self.agent_id}/completions"
-        else:
-            endpoint = f"/api/v1/chats/{self.chat_id}/completions"
-            
         payload["session_id"] = ragflow_session_id
         
-        logger.info(f"发送流式请求: {query}")
+        logger.info("发送流式请求: %s", query)
         
-        # 第一个中间状态
-        yield {
-            "is_task_complete": False,
-            "require_user_input": False,
-            "content": "正在查询知识库...",
-            "references": None
-        }
-        
-        # 重试逻辑
-        for attempt in range(MAX_RETRIES):
+        request_started = time.perf_counter()
+        retry = self.upstream.start_request()
+        tried: List[UpstreamEndpoint] = []
+        while True:
+            host = self.upstream.select(tried)
+            sent = time.perf_counter()
+
+            # 只在收到响应之前重试（连接失败时切换主机），已经开始输出的回答无法重放
+            responded = False
+            retry_delay = None
             try:
-                # 增加流式请求的超时时间
-                timeout = httpx.Timeout(DEFAULT_TIMEOUT, connect=30.0)
-                async with httpx.AsyncClient(timeout=timeout) as client:
-                    async with client.stream(
-                        "POST",
-                        f"{self.base_url}{endpoint}",
-                        headers=self.get_headers(),
-                        json=payload
-                    ) as response:
-                        if response.status_code != 200:
-                            # 如果是临时错误，重试
-                            if response.status_code in [429, 500, 502, 503, 504] and attempt < MAX_RETRIES - 1:
-                                error_text = await response.text()
-                                retry_delay = RETRY_BACKOFF[min(attempt, len(RETRY_BACKOFF)-1)]
-                                logger.warning(f"流式对话请求失败，HTTP {response.status_code}，{retry_delay}秒后重试 ({attempt+1}/{MAX_RETRIES}): {error_text}")
-                                
-                                yield {
-                                    "is_task_complete": False,
-                                    "require_user_input": False,
-                                    "content": f"正在重试请求... ({attempt+1}/{MAX_RETRIES})",
-                                    "references": None
-                                }
-                                
-                                await asyncio.sleep(retry_delay)
-                                continue
-                            
-                            # 其他错误直接返回
-                            error_text = await response.text()
-                            logger.error(f"流式对话请求失败: HTTP {response.status_code} - {error_text}")
-                            yield {
-                                "is_task_complete": False,
-                                "require_user_input": True,
-                                "content": f"与RagFlow服务通信失败: HTTP {response.status_code}",
-                                "references": None
-                            }
-                            return
-                        
-                        accumulated_answer = ""
-                        references = None
-                        has_error = False
-                        
-                        # 解析SSE流
-                        async for line in response.aiter_lines():
-                            if not line or not line.startswith("data:"):
-                                continue
-                            
-                            try:
-                                data_str = line[5:].strip()
-                                data = json.loads(data_str)
-                                
-                                # 检查是否是最后一个事件
-                                if data.get("data") is True:
-                                    logger.info("流式回答完成")
-                                    break
-                                
-                                # 检查是否有错误
-                                if data.get("code") != 0:
-                                    has_error = True
-                                    error_msg = data.get("message", "未知错误")
-                                    logger.error(f"流式回答错误: {error_msg}")
-                                    yield {
-                                        "is_task_complete": False,
-                                        "require_user_input": True,
-                                        "content": f"RagFlow服务返回错误: {error_msg}",
-                                        "references": None
-                                    }
-                                    break
-                                
-                                result = data.get("data", {})
-                                
-                                # 更新累积的回答
-                                if "answer" in result:
-                                    accumulated_answer = result["answer"]
-                                    
-                                    # 只有当有实质性更新时才发送
-                                    if len(accumulated_answer) > 0:
-                                        logger.debug(f"流式回答更新: {accumulated_answer[-50:]}...")
-                                        yield {
-                                            "is_task_complete": False, 
-                                            "require_user_input": False,
-                                            "content": accumulated_answer,
-                                            "references": None
-                                        }
-                                
-                                # 获取引用信息
-                                if "reference" in result and result["reference"]:
-                                    references = result["reference"]
-                            
-                            except json.JSONDecodeError:
-                                logger.warning(f"解析SSE数据失败: {line}")
-                                continue
-                        
-                        # 最终结果
-                        if not has_error:
-                            logger.info(f"流式回答最终结果: {accumulated_answer[:100]}...")
-                            if references:
-                                logger.info(f"包含 {len(references.get('chunks', []))} 个引用")
-                            yield {
-                                "is_task_complete": True,
-                                "require_user_input": False,
-                                "content": accumulated_answer,
-                                "references": references
-                            }
+                async with self._http().stream(
+                    "POST",
+                    f"{host.url}{endpoint}",
+                    headers=self.get_headers(span),
+                    json=payload
+                ) as response:
+                    responded = True
+                    if response.status_code == 200:
+                        self.upstream.record_success(host, time.perf_counter() - sent)
+                        async for item in self._parse_stream(response, request_started, span, assistant):
+                            yield item
+                        return
+
+                    await response.aread()
+                    if response.status_code in RETRYABLE_STATUS:
+                        # 如果是临时错误，按退避策略重试
+                        retry_delay = self._on_upstream_failure(
+                            retry, "流式对话请求", host, tried, response.status_code,
+                            parse_retry_after(response.headers.get("Retry-After")),
+                        )
+                    else:
+                        self.upstream.record_success(host)
+
+                    if retry_delay is None:
+                        # 其他错误直接返回
+                        logger.error(f"流式对话请求失败: HTTP {response.status_code} - {response.text}")
+                        yield {
+                            "is_task_complete": False,
+                            "require_user_input": True,
+                            "content": f"与RagFlow服务通信失败: HTTP {response.status_code}",
+                            "references": None
+                        }
+                        return
+            except (httpx.ConnectError, httpx.TimeoutException) as e:
+                if responded:
+                    self.upstream.record_failure(host)
+                else:
+                    retry_delay = self._on_upstream_failure(retry, "流式对话请求", host, tried, error=e)
+                if retry_delay is None:
+                    logger.error(f"流式请求异常: {str(e)}")
+                    yield {
+                        "is_task_complete": False,
+                        "require_user_input": True,
+                        "content": f"流式请求异常: {str(e)}",
+                        "references": None
+                    }
+                    return
             except Exception as e:
                 logger.error(f"流式请求异常: {str(e)}")
                 yield {
@@ -420,4 +838,145 @@ class RagFlowAgent:
                     "require_user_input": True,
                     "content": f"流式请求异常: {str(e)}",
                     "references": None
-                } 
\ No newline at end of file
+                }
+                return
+
+            yield {
+                "is_task_complete": False,
+                "require_user_input": False,
+                "content": f"正在重试请求... ({retry.attempt - 1}/{self.upstream.max_attempts})",
+                "references": None,
+                "is_notice": True
+            }
+            await asyncio.sleep(retry_delay)
+
+    async def _sse_batches(self, response: httpx.Response) -> AsyncIterable[List[ServerSentEvent]]:
+        """按网络读取的批次产出SSE事件，事件数据保持为字节"""
+        decoder = SSEDecoder(raw_data=True)
+        async with aclosing(response.aiter_bytes()) as chunks:
+            async for chunk in chunks:
+                events = decoder.feed(chunk)
+                if events:
+                    yield events
+        events = decoder.flush()
+        if events:
+            yield events
+
+    async def _parse_stream(self, response: httpx.Response, request_started: float, span=None,
+                            assistant: Optional[RagFlowAssistant] = None) -> AsyncIterable[Dict[str, Any]]:
+        """
+        解析RagFlow的SSE响应，逐步产出累积的回答和最终结果，首个回答的延迟计入助手的EWMA
+
+        RagFlow的每个事件都携带完整的累积回答，还可能携带完整的引用。为避免反复解码和扫描引用：
+        - 同一次读取中被后续回答取代的成功事件直接跳过
+        - 成功事件只在reference字段之前提取answer字段，带非空引用的最新事件原样保留，结束时只解码这一个
+        无法快速识别的事件（错误、结束标记、answer不在reference之前的事件）按完整JSON解析。
+        """
+        accumulated_answer = ""
+        references = None
+        pending_reference = None  # 最新的带非空引用、尚未解码的事件
+        first_token_seen = False
+        
+        # 解析SSE流
+        async with aclosing(self._sse_batches(response)) as batches:
+            async for events in batches:
+                finished = False
+                # 结束标记不取代之前的回答
+                newest = len(events) - 1
+                if newest > 0 and len(events[newest].data) < 64 and _DONE_EVENT.search(events[newest].data):
+                    newest -= 1
+                for index, event in enumerate(events):
+                    raw = event.data
+                    answer = None
+                    if _SUCCESS_EVENT.match(raw):
+                        reference_at = raw.find(b'"reference"')
+                        if reference_at < 0:
+                            reference_at = len(raw)
+                        elif not _EMPTY_REFERENCE.match(raw, reference_at):
+                            pending_reference = raw
+                        match = _ANSWER_FIELD.search(raw, 0, reference_at)
+                        if match is not None and index < newest:
+                            continue
+                        if match is not None:
+                            try:
+                                answer = json_loads(b'"' + match.group(1) + b'"')
+                            except ValueError:
+                                answer = None
+
+                    if answer is None:
+                        try:
+                            data = json_loads(raw)
+                        except ValueError:
+                            logger.warning("解析SSE数据失败: %s", raw[:200].decode("utf-8", "replace"))
+                            continue
+                        if not isinstance(data, dict):
+                            logger.warning("忽略非对象的SSE数据: %s", raw[:200].decode("utf-8", "replace"))
+                            continue
+                    
+                        # 检查是否是最后一个事件
+                        if data.get("data") is True:
+                            logger.info("流式回答完成")
+                            finished = True
+                            break
+                    
+                        # 检查是否有错误
+                        if data.get("code") != 0:
+                            error_msg = data.get("message", "未知错误")
+                            logger.error(f"流式回答错误: {error_msg}")
+                            yield {
+                                "is_task_complete": False,
+                                "require_user_input": True,
+                                "content": f"RagFlow服务返回错误: {error_msg}",
+                                "references": None
+                            }
+                            return
+                    
+                        result = data.get("data") or {}
+                        # 获取引用信息
+                        if result.get("reference"):
+                            references = result["reference"]
+                            pending_reference = None
+                        answer = result.get("answer")
+                        if answer is None:
+                            continue
+                
+                    # 更新累积的回答，只有当有实质性更新时才发送
+                    accumulated_answer = answer
+                    if len(accumulated_answer) > 0:
+                        if not first_token_seen:
+                            first_token_seen = True
+                            ttft = time.perf_counter() - request_started
+                            UPSTREAM_TTFT.observe(ttft)
+                            if assistant is not None:
+                                self.router.observe_latency(assistant, ttft)
+                            if span is not None:
+                                span.add_event("first_token")
+                        logger.debug("流式回答更新: %s...", accumulated_answer[-50:])
+                        yield {
+                            "is_task_complete": False, 
+                            "require_user_input": False,
+                            "content": accumulated_answer,
+                            "references": None
+                        }
+                if finished:
+                    break
+
+        # 只解码最新的一份引用
+        if pending_reference is not None:
+            try:
+                result = json_loads(pending_reference).get("data") or {}
+                if result.get("reference"):
+                    references = result["reference"]
+            except (ValueError, AttributeError):
+                logger.warning("解析SSE引用失败: %s", pending_reference[:200].decode("utf-8", "replace"))
+        
+        # 最终结果
+        logger.info("流式回答最终结果: %.100s...", accumulated_answer)
+        if references:
+            logger.info("包含 %d 个引用", len(references.get('chunks', [])))
+        yield {
+            "is_task_complete": True,
+            "require_user_input": False,
+            "content": accumulated_answer,
+            "references": references
+        }
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+RagFlow回答缓存
+对高频重复的问题直接复用之前的完整回答，跳过RagFlow调用
+
+两级查找：
+1. 精确匹配：规范化后的问题文本（NFKC、忽略大小写、去掉标点和多余空白）
+2. 相似匹配（可选）：字符n-gram的MinHash签名按LSH分桶取候选，
+   再以n-gram集合的Jaccard相似度不低于similarity_threshold为准
+
+缓存键包含作用域（chat:<chat_id>或agent:<agent_id>），知识库更新后可调用
+invalidate()或POST /admin/cache/invalidate清空。只应在单个事件循环中使用。
+"""
+
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+from common.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CACHE_LOOKUPS = REGISTRY.counter(
+    "ragflow_answer_cache_lookups",
+    "Answer cache lookups by result: exact, similar, miss or bypass",
+    ["result"],
+)
+CACHE_ENTRIES = REGISTRY.gauge("ragflow_answer_cache_entries", "Answers currently cached")
+
+_PRIME = (1 << 61) - 1
+
+
+class CachedAnswer:
+    """一条缓存的完整回答"""
+
+    __slots__ = ("scope", "key", "content", "references", "shingles", "signature", "expires_at")
+
+    def __init__(self, scope: str, key: str, content: str, references: Any,
+                 shingles: frozenset, signature: Tuple[int, ...], expires_at: float):
+        self.scope = scope
+        self.key = key
+        self.content = content
+        self.references = references
+        self.shingles = shingles
+        self.signature = signature
+        self.expires_at = expires_at
+
+    def to_result(self) -> Dict[str, Any]:
+        """转换为RagFlowAgent的标准结果格式"""
+        return {
+            "is_task_complete": True,
+            "require_user_input": False,
+            "content": self.content,
+            "references": self.references,
+        }
+
+
+class AnswerCache:
+    """带TTL和LRU淘汰的问答缓存，similarity_threshold为0时只做精确匹配"""
+
+    def __init__(
+        self,
+        ttl: float = 3600,
+        max_entries: int = 10000,
+        similarity_threshold: float = 0.0,
+        ngram: int = 3,
+        num_perm: int = 64,
+        band_rows: int = 4,
+        exclude_pattern: Optional[str] = None,
+    ):
+        """
+        Args:
+            ttl: 回答的缓存秒数
+            max_entries: 最多缓存的回答数，超出时淘汰最久未使用的
+            similarity_threshold: 相似匹配的Jaccard阈值(0~1)，0表示关闭相似匹配
+            ngram: 计算相似度的字符n-gram长度
+            num_perm: MinHash签名长度
+            band_rows: LSH每个分桶的签名行数，越小召回越高、候选越多
+            exclude_pattern: 匹配该正则的问题不走缓存（如依赖上下文的追问）
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.ngram = ngram
+        self.num_perm = num_perm
+        self.band_rows = band_rows
+        self.exclude = re.compile(exclude_pattern) if exclude_pattern else None
+
+        # 固定种子，保证同一配置下签名稳定
+        rng = random.Random(0x5EED)
+        self._perms = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+        self._entries: "OrderedDict[Tuple[str, str], CachedAnswer]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, int, Tuple[int, ...]], set] = {}
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """规范化问题文本：全半角统一、忽略大小写、去掉标点并合并空白"""
+        text = unicodedata.normalize("NFKC", query).casefold()
+        text = "".join(" " if unicodedata.category(ch)[0] in "PZ" else ch for ch in text)
+        return " ".join(text.split())
+
+    def _shingles(self, key: str) -> frozenset:
+        text = key.replace(" ", "")
+        if len(text) <= self.ngram:
+            grams = {text}
+        else:
+            grams = {text[i:i + self.ngram] for i in range(len(text) - self.ngram + 1)}
+        return frozenset(
+            int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest(), "little")
+            for g in grams
+        )
+
+    def _signature(self, shingles: frozenset) -> Tuple[int, ...]:
+        return tuple(min((a * h + b) % _PRIME for h in shingles) for a, b in self._perms)
+
+    def _bands(self, scope: str, signature: Tuple[int, ...]):
+        rows = self.band_rows
+        for band in range(len(signature) // rows):
+            yield (scope, band, signature[band * rows:(band + 1) * rows])
+
+    def is_cacheable(self, query: str) -> bool:
+        """问题是否可以走缓存：非空且不匹配排除规则"""
+        if not query or not query.strip():
+            return False
+        if self.exclude is not None and self.exclude.search(query):
+            return False
+        return True
+
+    def get(self, scope: str, query: str) -> Optional[CachedAnswer]:
+        """查找缓存的回答，先精确匹配再相似匹配"""
+        key = self.normalize(query)
+        now = time.monotonic()
+        entry = self._entries.get((scope, key))
+        if entry is not None:
+            if entry.expires_at > now:
+                self._entries.move_to_end((scope, key))
+                CACHE_LOOKUPS.labels("exact").inc()
+                return entry
+            self._remove(entry)
+
+        if self.similarity_threshold > 0 and self._entries:
+            shingles = self._shingles(key)
+            best, best_score = None, 0.0
+            candidates = set()
+            for band in self._bands(scope, self._signature(shingles)):
+                candidates.update(self._buckets.get(band, ()))
+            for candidate_key in candidates:
+                candidate = self._entries.get((scope, candidate_key))
+                if candidate is None:
+                    continue
+                if candidate.expires_at <= now:
+                    self._remove(candidate)
+                    continue
+                score = len(shingles & candidate.shingles) / len(shingles | candidate.shingles)
+                if score > best_score:
+                    best, best_score = candidate, score
+            if best is not None and best_score >= self.similarity_threshold:
+                self._entries.move_to_end((scope, best.key))
+                CACHE_LOOKUPS.labels("similar").inc()
+                logger.debug("回答缓存相似命中: %.2f %s -> %s", best_score, key, best.key)
+                return best
+
+        CACHE_LOOKUPS.labels("miss").inc()
+        return None
+
+    def put(self, scope: str, query: str, content: str, references: Any = None):
+        """缓存一条完整回答"""
+        if not content:
+            return
+        key = self.normalize(query)
+        old = self._entries.get((scope, key))
+        if old is not None:
+            self._remove(old)
+
+        shingles = signature = None
+        if self.similarity_threshold > 0:
+            shingles = self._shingles(key)
+            signature = self._signature(shingles)
+        entry = CachedAnswer(scope, key, content, references, shingles, signature,
+                             time.monotonic() + self.ttl)
+        self._entries[(scope, key)] = entry
+        if signature is not None:
+            for band in self._bands(scope, signature):
+                self._buckets.setdefault(band, set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries.values())))
+        CACHE_ENTRIES.set(len(self._entries))
+
+    def _remove(self, entry: CachedAnswer):
+        if self._entries.pop((entry.scope, entry.key), None) is None:
+            return
+        if entry.signature is not None:
+            for band in self._bands(entry.scope, entry.signature):
+                bucket = self._buckets.get(band)
+                if bucket is not None:
+                    bucket.discard(entry.key)
+                    if not bucket:
+                        del self._buckets[band]
+        CACHE_ENTRIES.set(len(self._entries))
+
+    def invalidate(self, scope: Optional[str] = None, query: Optional[str] = None) -> int:
+        """
+        知识库更新后清除缓存
+
+        Args:
+            scope: 只清除该作用域，None表示全部
+            query: 只清除该问题（精确匹配），需要同时给出scope
+
+        Returns:
+            清除的条目数
+        """
+        if query is not None and scope is not None:
+            entry = self._entries.get((scope, self.normalize(query)))
+            entries: List[CachedAnswer] = [entry] if entry is not None else []
+        else:
+            entries = [e for e in self._entries.values() if scope is None or e.scope == scope]
+        for entry in entries:
+            self._remove(entry)
+        logger.info("回答缓存已失效: scope=%s query=%s 共%d条", scope, query, len(entries))
+        return len(entries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries)}
+
+    def invalidate_endpoint(self, admin_token: Optional[str] = None):
+        """
+        生成失效端点的处理函数，供知识库更新流程调用
+
+        请求体可选JSON：{"scope": "chat:<id>", "query": "..."}，为空时清空全部缓存。
+        设置admin_token后要求Bearer令牌。
+        """
+        async def handle(request: Request) -> JSONResponse:
+            if admin_token and request.headers.get("authorization") != f"Bearer {admin_token}":
+                return JSONResponse({"error": "unauthorized"}, status_code=401)
+            body = await request.body()
+            try:
+                params = json.loads(body) if body else {}
+            except json.JSONDecodeError:
+                return JSONResponse({"error": "invalid JSON body"}, status_code=400)
+            if not isinstance(params, dict):
+                return JSONResponse({"error": "body must be a JSON object"}, status_code=400)
+            removed = self.invalidate(params.get("scope"), params.get("query"))
+            return JSONResponse({"removed": removed, **self.stats()})
+
+        return handle
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+RagFlow多助手路由
+在多个相同配置的Chat Assistant/Agent副本之间分配新会话
+
+选择策略：
+- least_outstanding：进行中请求最少的助手
+- ewma：按延迟的指数加权移动平均乘以（进行中请求数+1）打分，取最低者
+
+连续失败eject_after次的助手被摘除eject_time秒，再次被摘除时时间加倍（最多max_eject_time），
+同时被摘除的助手不超过max_ejected_ratio。已有会话始终留在创建它的助手上，不受摘除影响。
+只应在单个事件循环中使用。
+"""
+
+import logging
+import random
+import time
+from typing import Dict, List, Optional
+
+from common.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+ASSISTANT_OUTSTANDING = REGISTRY.gauge(
+    "ragflow_assistant_outstanding", "In-flight RagFlow requests per assistant", ["assistant"]
+)
+ASSISTANT_LATENCY = REGISTRY.gauge(
+    "ragflow_assistant_latency_ewma_seconds",
+    "EWMA of completion latency (time to first token for streams) per assistant",
+    ["assistant"],
+)
+ASSISTANT_REQUESTS = REGISTRY.counter(
+    "ragflow_assistant_requests", "RagFlow requests per assistant by outcome", ["assistant", "outcome"]
+)
+ASSISTANT_EJECTIONS = REGISTRY.counter(
+    "ragflow_assistant_ejections", "Times an assistant was ejected after consecutive failures", ["assistant"]
+)
+
+POLICIES = ("least_outstanding", "ewma")
+
+
+class RagFlowAssistant:
+    """一个RagFlow助手（Chat Assistant或Agent）及其负载与健康统计"""
+
+    def __init__(self, kind: str, assistant_id: str):
+        if kind not in ("chat", "agent"):
+            raise ValueError(f"未知的助手类型: {kind}")
+        self.kind = kind
+        self.id = assistant_id
+        self.key = f"{kind}:{assistant_id}"
+        self.outstanding = 0
+        self.latency_ewma: Optional[float] = None
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.session_pool = None  # 可选的预创建会话池，由RagFlowAgent设置
+
+    @property
+    def sessions_endpoint(self) -> str:
+        return f"/api/v1/{self.kind}s/{self.id}/sessions"
+
+    @property
+    def completions_endpoint(self) -> str:
+        return f"/api/v1/{self.kind}s/{self.id}/completions"
+
+    def is_ejected(self, now: Optional[float] = None) -> bool:
+        return self.ejected_until > (time.monotonic() if now is None else now)
+
+    def snapshot(self) -> Dict:
+        return {
+            "assistant": self.key,
+            "outstanding": self.outstanding,
+            "latencyEwma": self.latency_ewma,
+            "consecutiveFailures": self.consecutive_failures,
+            "ejected": self.is_ejected(),
+        }
+
+
+class AssistantRouter:
+    """为新会话选择助手，并记录各助手的负载、延迟与健康状态"""
+
+    def __init__(
+        self,
+        assistants: List[RagFlowAssistant],
+        policy: str = "least_outstanding",
+        ewma_alpha: float = 0.3,
+        eject_after: int = 3,
+        eject_time: float = 30.0,
+        max_eject_time: float = 300.0,
+        max_ejected_ratio: float = 0.5,
+    ):
+        """
+        Args:
+            assistants: 参与负载均衡的助手，至少一个
+            policy: least_outstanding或ewma
+            ewma_alpha: 延迟EWMA中新样本的权重
+            eject_after: 连续失败多少次后摘除
+            eject_time: 首次摘除的秒数，之后每次加倍
+            max_eject_time: 摘除时间上限
+            max_ejected_ratio: 同时被摘除的助手比例上限
+        """
+        if not assistants:
+            raise ValueError("至少需要一个助手")
+        if policy not in POLICIES:
+            raise ValueError(f"未知的路由策略: {policy}，可选 {', '.join(POLICIES)}")
+        self.assistants = list(assistants)
+        self.policy = policy
+        self.ewma_alpha = ewma_alpha
+        self.eject_after = eject_after
+        self.eject_time = eject_time
+        self.max_eject_time = max_eject_time
+        self.max_ejected_ratio = max_ejected_ratio
+        self._by_key: Dict[str, RagFlowAssistant] = {a.key: a for a in self.assistants}
+
+    def get(self, kind: str, assistant_id: str) -> RagFlowAssistant:
+        """按类型和ID取助手；不在池中的（如配置变更前创建的会话）单独登记，但不参与选择"""
+        key = f"{kind}:{assistant_id}"
+        assistant = self._by_key.get(key)
+        if assistant is None:
+            assistant = self._by_key[key] = RagFlowAssistant(kind, assistant_id)
+        return assistant
+
+    def select(self) -> RagFlowAssistant:
+        """为新会话选择助手；全部被摘除时退回到全部助手中选择"""
+        if len(self.assistants) == 1:
+            return self.assistants[0]
+        now = time.monotonic()
+        candidates = [a for a in self.assistants if not a.is_ejected(now)] or self.assistants
+        if self.policy == "ewma":
+            known = [a.latency_ewma for a in candidates if a.latency_ewma is not None]
+            # 还没有延迟数据的助手按平均值估计，既会被尝试又不会独占流量
+            default = sum(known) / len(known) if known else 1.0
+            scores = [
+                (a.latency_ewma if a.latency_ewma is not None else default) * (a.outstanding + 1)
+                for a in candidates
+            ]
+        else:
+            scores = [a.outstanding for a in candidates]
+        best = min(scores)
+        return random.choice([a for a, score in zip(candidates, scores) if score == best])
+
+    def acquire(self, assistant: RagFlowAssistant):
+        assistant.outstanding += 1
+        ASSISTANT_OUTSTANDING.labels(assistant.key).set(assistant.outstanding)
+
+    def observe_latency(self, assistant: RagFlowAssistant, seconds: float):
+        if assistant.latency_ewma is None:
+            assistant.latency_ewma = seconds
+        else:
+            assistant.latency_ewma += self.ewma_alpha * (seconds - assistant.latency_ewma)
+        ASSISTANT_LATENCY.labels(assistant.key).set(assistant.latency_ewma)
+
+    def release(self, assistant: RagFlowAssistant, ok: Optional[bool] = None):
+        """结束一次请求；ok为None表示结果与助手健康无关（如熔断打开、请求被取消或会话创建成功）"""
+        assistant.outstanding -= 1
+        ASSISTANT_OUTSTANDING.labels(assistant.key).set(assistant.outstanding)
+        self.record(assistant, ok)
+
+    def record(self, assistant: RagFlowAssistant, ok: Optional[bool]):
+        if ok is None:
+            return
+        ASSISTANT_REQUESTS.labels(assistant.key, "ok" if ok else "error").inc()
+        if ok:
+            assistant.consecutive_failures = 0
+            assistant.ejections = 0
+            return
+
+        assistant.consecutive_failures += 1
+        now = time.monotonic()
+        if assistant.consecutive_failures < self.eject_after or assistant.is_ejected(now):
+            return
+        ejected = sum(1 for a in self.assistants if a.is_ejected(now))
+        if assistant not in self.assistants or ejected + 1 > self.max_ejected_ratio * len(self.assistants):
+            return
+        assistant.ejections += 1
+        duration = min(self.max_eject_time, self.eject_time * 2 ** (assistant.ejections - 1))
+        assistant.ejected_until = now + duration
+        assistant.consecutive_failures = 0
+        ASSISTANT_EJECTIONS.labels(assistant.key).inc()
+        logger.warning("助手 %s 连续失败%d次，摘除%.0f秒", assistant.key, self.eject_after, duration)
+
+    def snapshot(self) -> List[Dict]:
+        return [a.snapshot() for a in self.assistants]
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+RagFlow模拟服务器
+用于离线性能测试，实现RagFlowAgent使用的会话与对话接口，无需真实的RagFlow部署
+
+支持配置生成速率、延迟分布、回答长度、引用块大小，以及按比例注入429/5xx错误
+
+用法:
+    python -m agents.ragflow.mock_server --port 9380 --token-rate 50 --latency lognormal:-1.5,0.5
+    RAGFLOW_API_URL=http://localhost:9380 RAGFLOW_API_KEY=mock python -m agents.ragflow --chat-id mock
+"""
+import sys
+import os
+import asyncio
+import json
+import random
+import uuid
+import logging
+from typing import Any, Dict, Optional
+
+# 添加项目根目录到Python路径（如果尚未添加）
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, "../.."))  # 只需上溯两级到项目根目录
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)  # 直接添加项目根目录
+
+import click
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+# 用于拼接模拟回答的词表
+_WORDS = ["知识库", "检索", "增强", "生成", "文档", "模型", "问答", "系统", "数据", "结果",
+          "RagFlow", "A2A", "agent", "context", "answer", "query", "chunk", "vector"]
+
+
+class LatencyDistribution:
+    """
+    首字延迟分布
+
+    规格格式:
+        fixed:0.2            固定0.2秒
+        uniform:0.1,0.5      0.1~0.5秒均匀分布
+        lognormal:-1.5,0.5   对数正态分布（mu, sigma）
+    """
+
+    def __init__(self, spec: str = "fixed:0"):
+        kind, _, args = spec.partition(":")
+        self.kind = kind.strip().lower()
+        self.args = [float(x) for x in args.split(",") if x.strip()]
+        if self.kind == "fixed" and len(self.args) == 1:
+            return
+        if self.kind in ("uniform", "lognormal") and len(self.args) == 2:
+            return
+        raise ValueError(f"无效的延迟分布: {spec}")
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            return self.args[0]
+        if self.kind == "uniform":
+            return random.uniform(*self.args)
+        return random.lognormvariate(*self.args)
+
+
+class MockConfig:
+    """模拟服务器配置"""
+
+    def __init__(
+        self,
+        token_rate: float = 50.0,
+        latency: str = "fixed:0.2",
+        answer_tokens: int = 100,
+        reference_chunks: int = 3,
+        chunk_size: int = 300,
+        reference_every_event: bool = False,
+        error_429_rate: float = 0.0,
+        error_5xx_rate: float = 0.0,
+        retry_after: Optional[float] = 1.0,
+        api_key: Optional[str] = None,
+        strict_sessions: bool = False,
+        session_latency: str = "fixed:0",
+    ):
+        """
+        Args:
+            token_rate: 每秒生成的token数，<=0表示不限速
+            latency: 首字延迟分布，见LatencyDistribution
+            answer_tokens: 每个回答的token数
+            reference_chunks: 每个回答附带的引用块数
+            chunk_size: 每个引用块的字符数
+            reference_every_event: 是否在每个流式事件中都携带完整引用（模拟大负载）
+            error_429_rate: 返回429的请求比例
+            error_5xx_rate: 返回5xx的请求比例
+            retry_after: 429响应中的Retry-After秒数，None表示不返回该头
+            api_key: 设置后校验Authorization头
+            strict_sessions: 是否拒绝未知的会话ID；默认接受，以便模拟服务器重启后复用已持久化的会话映射
+            session_latency: 创建会话的延迟分布，见LatencyDistribution
+        """
+        self.token_rate = token_rate
+        self.latency = LatencyDistribution(latency)
+        self.answer_tokens = answer_tokens
+        self.reference_chunks = reference_chunks
+        self.chunk_size = chunk_size
+        self.reference_every_event = reference_every_event
+        self.error_429_rate = error_429_rate
+        self.error_5xx_rate = error_5xx_rate
+        self.retry_after = retry_after
+        self.api_key = api_key
+        self.strict_sessions = strict_sessions
+        self.session_latency = LatencyDistribution(session_latency)
+
+
+class MockRagFlowServer:
+    """RagFlow API模拟实现"""
+
+    def __init__(self, config: Optional[MockConfig] = None):
+        self.config = config or MockConfig()
+        self.sessions: Dict[str, str] = {}
+        self.stats: Dict[str, int] = {
+            "sessions_created": 0,
+            "sessions_deleted": 0,
+            "completions": 0,
+            "stream_completions": 0,
+            "errors_429": 0,
+            "errors_5xx": 0,
+        }
+        self.app = Starlette()
+        for kind in ("chats", "agents"):
+            self.app.add_route(
+                f"/api/v1/{kind}/{{assistant_id}}/sessions", self._create_session, methods=["POST"]
+            )
+            self.app.add_route(
+                f"/api/v1/{kind}/{{assistant_id}}/sessions", self._delete_sessions, methods=["DELETE"]
+            )
+            self.app.add_route(
+                f"/api/v1/{kind}/{{assistant_id}}/completions", self._completions, methods=["POST"]
+            )
+        self.app.add_route("/mock/stats", self._get_stats, methods=["GET"])
+
+    def _check_auth(self, request: Request) -> Optional[JSONResponse]:
+        if self.config.api_key is None:
+            return None
+        if request.headers.get("Authorization") != f"Bearer {self.config.api_key}":
+            return JSONResponse({"code": 109, "message": "Authentication error: API key is invalid!"})
+        return None
+
+    def _inject_error(self) -> Optional[JSONResponse]:
+        """按配置比例注入429/5xx错误"""
+        roll = random.random()
+        if roll < self.config.error_429_rate:
+            self.stats["errors_429"] += 1
+            headers = {}
+            if self.config.retry_after is not None:
+                headers["Retry-After"] = str(self.config.retry_after)
+            return JSONResponse({"code": 429, "message": "Too Many Requests"}, status_code=429, headers=headers)
+        if roll < self.config.error_429_rate + self.config.error_5xx_rate:
+            self.stats["errors_5xx"] += 1
+            status = random.choice([500, 502, 503])
+            return JSONResponse({"code": status, "message": "Upstream error"}, status_code=status)
+        return None
+
+    async def _create_session(self, request: Request):
+        error = self._check_auth(request) or self._inject_error()
+        if error:
+            return error
+        body = await request.json()
+        await asyncio.sleep(self.config.session_latency.sample())
+        session_id = uuid.uuid4().hex
+        self.sessions[session_id] = request.path_params["assistant_id"]
+        self.stats["sessions_created"] += 1
+        return JSONResponse({
+            "code": 0,
+            "data": {
+                "id": session_id,
+                "chat_id": request.path_params["assistant_id"],
+                "name": body.get("name", "New session"),
+                "messages": [],
+            },
+        })
+
+    async def _delete_sessions(self, request: Request):
+        error = self._check_auth(request)
+        if error:
+            return error
+        body = await request.json()
+        for session_id in body.get("ids") or []:
+            if self.sessions.pop(session_id, None) is not None:
+                self.stats["sessions_deleted"] += 1
+        return JSONResponse({"code": 0})
+
+    def _build_reference(self) -> Dict[str, Any]:
+        chunks = []
+        for i in range(self.config.reference_chunks):
+            content = "".join(random.choice(_WORDS) for _ in range(self.config.chunk_size // 4))
+            chunks.append({
+                "id": uuid.uuid4().hex,
+                "content": content[: self.config.chunk_size],
+                "document_id": uuid.uuid4().hex,
+                "document_name": f"document_{i}.pdf",
+                "dataset_id": uuid.uuid4().hex,
+                "similarity": round(random.uniform(0.5, 1.0), 4),
+                "vector_similarity": round(random.uniform(0.5, 1.0), 4),
+                "term_similarity": round(random.uniform(0.5, 1.0), 4),
+                "positions": [[1, 10, 200, 30, 80]],
+            })
+        return {
+            "total": len(chunks),
+            "chunks": chunks,
+            "doc_aggs": [{"doc_name": c["document_name"], "doc_id": c["document_id"], "count": 1} for c in chunks],
+        }
+
+    async def _completions(self, request: Request):
+        error = self._check_auth(request) or self._inject_error()
+        if error:
+            return error
+        body = await request.json()
+        session_id = body.get("session_id")
+        if session_id and session_id not in self.sessions and self.config.strict_sessions:
+            return JSONResponse({"code": 102, "message": "Session does not exist"})
+
+        tokens = [random.choice(_WORDS) for _ in range(self.config.answer_tokens)]
+        reference = self._build_reference()
+        first_token_delay = self.config.latency.sample()
+        token_delay = 1.0 / self.config.token_rate if self.config.token_rate > 0 else 0.0
+
+        if not body.get("stream", True):
+            self.stats["completions"] += 1
+            await asyncio.sleep(first_token_delay + token_delay * len(tokens))
+            return JSONResponse({
+                "code": 0,
+                "data": {
+                    "answer": "".join(tokens),
+                    "reference": reference,
+                    "session_id": session_id,
+                    "id": uuid.uuid4().hex,
+                },
+            })
+
+        self.stats["stream_completions"] += 1
+
+        async def event_stream():
+            await asyncio.sleep(first_token_delay)
+            answer = ""
+            for i, token in enumerate(tokens):
+                answer += token
+                last = i == len(tokens) - 1
+                data = {
+                    "answer": answer,
+                    "reference": reference if (last or self.config.reference_every_event) else {},
+                    "session_id": session_id,
+                    "id": uuid.uuid4().hex,
+                }
+                yield f"data:{json.dumps({'code': 0, 'data': data}, ensure_ascii=False)}\n\n"
+                if token_delay and not last:
+                    await asyncio.sleep(token_delay)
+            yield f"data:{json.dumps({'code': 0, 'data': True})}\n\n"
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+    async def _get_stats(self, request: Request):
+        return JSONResponse(self.stats)
+
+
+@click.command()
+@click.option("--host", "host", default="localhost")
+@click.option("--port", "port", default=9380)
+@click.option("--token-rate", default=50.0, help="每秒生成的token数，0表示不限速")
+@click.option("--latency", default="fixed:0.2", help="首字延迟分布: fixed:S | uniform:A,B | lognormal:MU,SIGMA")
+@click.option("--answer-tokens", default=100, help="每个回答的token数")
+@click.option("--reference-chunks", default=3, help="每个回答的引用块数")
+@click.option("--chunk-size", default=300, help="每个引用块的字符数")
+@click.option("--reference-every-event", is_flag=True, help="每个流式事件都携带完整引用")
+@click.option("--error-429", "error_429_rate", default=0.0, help="返回429的请求比例(0~1)")
+@click.option("--error-5xx", "error_5xx_rate", default=0.0, help="返回5xx的请求比例(0~1)")
+@click.option("--retry-after", default=1.0, help="429响应的Retry-After秒数")
+@click.option("--api-key", default=None, help="设置后校验Authorization头")
+@click.option("--strict-sessions", is_flag=True, help="拒绝未知的会话ID")
+@click.option("--session-latency", default="fixed:0", help="创建会话的延迟分布，格式同--latency")
+def main(host, port, token_rate, latency, answer_tokens, reference_chunks, chunk_size,
+         reference_every_event, error_429_rate, error_5xx_rate, retry_after, api_key, strict_sessions,
+         session_latency):
+    """启动RagFlow模拟服务器"""
+    import uvicorn
+
+    logging.basicConfig(level=logging.INFO)
+    config = MockConfig(
+        token_rate=token_rate,
+        latency=latency,
+        answer_tokens=answer_tokens,
+        reference_chunks=reference_chunks,
+        chunk_size=chunk_size,
+        reference_every_event=reference_every_event,
+        error_429_rate=error_429_rate,
+        error_5xx_rate=error_5xx_rate,
+        retry_after=retry_after,
+        api_key=api_key,
+        strict_sessions=strict_sessions,
+        session_latency=session_latency,
+    )
+    server = MockRagFlowServer(config)
+    logger.info(f"RagFlow模拟服务器启动: http://{host}:{port}")
+    uvicorn.run(server.app, host=host, port=port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
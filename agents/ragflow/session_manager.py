@@ -25,7 +25,7 @@ if project_root not in sys.path:
 from sqlalchemy import Column, String, DateTime, Text, create_engine, text, func, select, insert, update, delete
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
 # dotenv用于加载环境变量
 from dotenv import load_dotenv
@@ -114,6 +114,7 @@ class SessionManager:
         
         # 内存缓存，提高性能
         self._cache = {}
+        self._info_cache = {}  # A2A会话ID -> (RagFlow会话ID, 代理类型, 代理ID)
         
     def _init_db(self):
         """初始化数据库表"""
@@ -125,12 +126,13 @@ class SessionManager:
             logger.error(f"初始化会话数据库错误: {e}")
             raise
     
-    def get_session(self, a2a_session_id: str) -> Optional[str]:
+    def get_session(self, a2a_session_id: str, touch: bool = True) -> Optional[str]:
         """
         获取RagFlow会话ID
         
         Args:
             a2a_session_id: A2A会话ID
+            touch: 是否同时更新最后使用时间（一次数据库写入）
             
         Returns:
             RagFlow会话ID，如果不存在则返回None
@@ -138,7 +140,8 @@ class SessionManager:
         # 先检查缓存
         if a2a_session_id in self._cache:
             # 更新最后使用时间
-            self._update_last_used(a2a_session_id)
+            if touch:
+                self._update_last_used(a2a_session_id)
             return self._cache[a2a_session_id]
         
         # 查询数据库
@@ -154,7 +157,8 @@ class SessionManager:
                     # 更新缓存
                     self._cache[a2a_session_id] = result
                     # 更新最后使用时间
-                    self._update_last_used(a2a_session_id)
+                    if touch:
+                        self._update_last_used(a2a_session_id)
                     return result
                 
                 return None
@@ -163,6 +167,45 @@ class SessionManager:
             logger.error(f"查询会话映射错误: {e}")
             return None
     
+    def get_session_info(self, a2a_session_id: str, touch: bool = True) -> Optional[Dict[str, str]]:
+        """
+        获取会话映射及其所属的助手
+
+        Args:
+            a2a_session_id: A2A会话ID
+            touch: 是否同时更新最后使用时间（一次数据库写入）
+
+        Returns:
+            包含ragflow_session_id、agent_type、agent_id的字典，如果不存在则返回None
+        """
+        info = self._info_cache.get(a2a_session_id)
+        if info is None:
+            try:
+                with self.Session() as session:
+                    stmt = select(
+                        SessionMapping.ragflow_session_id,
+                        SessionMapping.agent_type,
+                        SessionMapping.agent_id
+                    ).where(SessionMapping.a2a_session_id == a2a_session_id)
+                    row = session.execute(stmt).one_or_none()
+            except SQLAlchemyError as e:
+                logger.error(f"查询会话映射错误: {e}")
+                return None
+            if row is None:
+                return None
+            info = self._remember(a2a_session_id, row.ragflow_session_id, row.agent_type, row.agent_id)
+
+        if touch:
+            self._update_last_used(a2a_session_id)
+        return {"ragflow_session_id": info[0], "agent_type": info[1], "agent_id": info[2]}
+
+    def _remember(self, a2a_session_id: str, ragflow_session_id: str, agent_type: str, agent_id: str) -> tuple:
+        """更新内存缓存"""
+        info = (ragflow_session_id, agent_type, agent_id)
+        self._cache[a2a_session_id] = ragflow_session_id
+        self._info_cache[a2a_session_id] = info
+        return info
+
     def save_session(self, a2a_session_id: str, ragflow_session_id: str, agent_type: str, agent_id: str) -> bool:
         """
         保存会话映射
@@ -203,15 +246,70 @@ class SessionManager:
                 session.commit()
                 
                 # 更新缓存
-                self._cache[a2a_session_id] = ragflow_session_id
+                self._remember(a2a_session_id, ragflow_session_id, agent_type, agent_id)
                 
-                logger.info(f"保存会话映射: A2A会话ID {a2a_session_id} -> RagFlow会话ID {ragflow_session_id}")
+                logger.info("保存会话映射: A2A会话ID %s -> RagFlow会话ID %s", a2a_session_id, ragflow_session_id)
                 return True
                 
         except SQLAlchemyError as e:
             logger.error(f"保存会话映射错误: {e}")
             return False
     
+    def save_session_if_absent(self, a2a_session_id: str, ragflow_session_id: str, agent_type: str, agent_id: str) -> Optional[str]:
+        """
+        仅在映射不存在时保存，并发创建同一会话时以先写入者为准
+
+        依赖a2a_session_id主键的唯一性，多个进程共享数据库时同样有效。
+
+        Args:
+            a2a_session_id: A2A会话ID
+            ragflow_session_id: 新创建的RagFlow会话ID
+            agent_type: 代理类型，'chat'或'agent'
+            agent_id: chat_id或agent_id
+
+        Returns:
+            最终生效的RagFlow会话ID（本次写入的或已存在的），数据库错误时返回None
+        """
+        try:
+            with self.Session() as session:
+                session.add(SessionMapping(
+                    a2a_session_id=a2a_session_id,
+                    ragflow_session_id=ragflow_session_id,
+                    agent_type=agent_type,
+                    agent_id=agent_id
+                ))
+                try:
+                    session.commit()
+                except IntegrityError:
+                    session.rollback()
+                    stmt = select(
+                        SessionMapping.ragflow_session_id,
+                        SessionMapping.agent_type,
+                        SessionMapping.agent_id
+                    ).where(SessionMapping.a2a_session_id == a2a_session_id)
+                    existing = session.execute(stmt).one_or_none()
+                    if existing is None:
+                        return None
+                    logger.info("会话映射已存在: A2A会话ID %s -> RagFlow会话ID %s", a2a_session_id, existing.ragflow_session_id)
+                    self._remember(a2a_session_id, existing.ragflow_session_id, existing.agent_type, existing.agent_id)
+                    return existing.ragflow_session_id
+
+                self._remember(a2a_session_id, ragflow_session_id, agent_type, agent_id)
+                logger.info("保存会话映射: A2A会话ID %s -> RagFlow会话ID %s", a2a_session_id, ragflow_session_id)
+                return ragflow_session_id
+
+        except SQLAlchemyError as e:
+            logger.error(f"保存会话映射错误: {e}")
+            return None
+    
+    def touch_session(self, a2a_session_id: str):
+        """
+        更新会话最后使用时间
+
+        与get_session(..., touch=False)配合，调用方可以把这次写入移出请求的关键路径
+        """
+        self._update_last_used(a2a_session_id)
+
     def _update_last_used(self, a2a_session_id: str):
         """更新会话最后使用时间"""
         try:
@@ -247,8 +345,8 @@ class SessionManager:
                 session.commit()
                 
                 # 从缓存中删除
-                if a2a_session_id in self._cache:
-                    del self._cache[a2a_session_id]
+                self._cache.pop(a2a_session_id, None)
+                self._info_cache.pop(a2a_session_id, None)
                 
                 return result.rowcount > 0
                 
@@ -323,8 +421,8 @@ class SessionManager:
                     
                     # 从缓存中删除
                     for a2a_session_id in to_delete:
-                        if a2a_session_id in self._cache:
-                            del self._cache[a2a_session_id]
+                        self._cache.pop(a2a_session_id, None)
+                        self._info_cache.pop(a2a_session_id, None)
                     
                     deleted_count = result.rowcount
                     if deleted_count > 0:
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+RagFlow会话池
+后台预先创建RagFlow会话，新的A2A会话首轮对话直接领取，不必在关键路径上等待创建会话的请求
+
+池中会话数低于low_water时补充到target；在池中闲置超过max_idle秒的会话会被删除并由新会话替换，
+避免领取到上游已过期的会话。只应在单个事件循环中使用。
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, List, Optional
+
+from common.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = REGISTRY.gauge(
+    "ragflow_session_pool_size", "Pre-created RagFlow sessions waiting in the pool", ["pool"]
+)
+POOL_CLAIMS = REGISTRY.counter(
+    "ragflow_session_pool_claims", "Session claims by result: hit or miss (pool empty)", ["pool", "result"]
+)
+POOL_RECYCLED = REGISTRY.counter(
+    "ragflow_session_pool_recycled", "Pooled sessions deleted after idling longer than max_idle", ["pool"]
+)
+
+
+class RagFlowSessionPool:
+    """按助手维护的预创建会话池"""
+
+    def __init__(
+        self,
+        create: Callable[[], Awaitable[str]],
+        delete: Callable[[List[str]], Awaitable[None]],
+        low_water: int = 4,
+        target: Optional[int] = None,
+        max_idle: float = 600,
+        refill_concurrency: int = 2,
+        retry_interval: float = 5.0,
+        name: str = "default",
+    ):
+        """
+        Args:
+            create: 在RagFlow中创建一个会话并返回其ID
+            delete: 在RagFlow中删除一批会话
+            low_water: 池中会话少于该数时开始补充
+            target: 每次补充到的会话数，默认为low_water的2倍
+            max_idle: 会话在池中闲置超过该秒数后回收
+            refill_concurrency: 同时创建会话的请求数
+            retry_interval: 创建失败后等待多久再补充
+            name: 指标中的池名称，通常为所属助手
+        """
+        self.create = create
+        self.delete = delete
+        self.low_water = low_water
+        self.target = max(target or low_water * 2, low_water)
+        self.max_idle = max_idle
+        self.refill_concurrency = refill_concurrency
+        self.retry_interval = retry_interval
+        self.name = name
+        self._sessions: deque = deque()  # (ragflow_session_id, 入池时间)，先入先出
+        self._stale: list = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def size(self) -> int:
+        return len(self._sessions)
+
+    def claim(self) -> Optional[str]:
+        """领取一个预创建的会话，池为空时返回None"""
+        now = time.monotonic()
+        while self._sessions:
+            item = self._sessions.popleft()
+            if now - item[1] < self.max_idle:
+                self._changed()
+                POOL_CLAIMS.labels(self.name, "hit").inc()
+                return item[0]
+            # 已闲置过久，交给后台删除
+            self._stale.append(item)
+        self._changed()
+        POOL_CLAIMS.labels(self.name, "miss").inc()
+        return None
+
+    def _changed(self):
+        POOL_SIZE.labels(self.name).set(len(self._sessions))
+        if len(self._sessions) < self.low_water:
+            self._wakeup.set()
+
+    def start(self):
+        """在当前事件循环中启动后台补充任务"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name=f"ragflow-session-pool:{self.name}")
+
+    async def stop(self):
+        """停止后台任务并删除池中尚未领取的会话"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        remaining = [ragflow_session_id for ragflow_session_id, _ in list(self._sessions) + self._stale]
+        self._sessions.clear()
+        self._stale = []
+        POOL_SIZE.labels(self.name).set(0)
+        if remaining:
+            try:
+                await self.delete(remaining)
+            except Exception as e:
+                logger.warning("删除池中剩余的%d个RagFlow会话失败: %s", len(remaining), e)
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            await self._recycle()
+            if not await self._refill():
+                # 创建失败时不响应领取触发的唤醒，避免形成重试风暴
+                await asyncio.sleep(self.retry_interval)
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.max_idle / 2)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _recycle(self):
+        now = time.monotonic()
+        expired = self._stale + [s for s in self._sessions if now - s[1] >= self.max_idle]
+        self._stale = []
+        if not expired:
+            return
+        for item in expired:
+            if item in self._sessions:
+                self._sessions.remove(item)
+        POOL_SIZE.labels(self.name).set(len(self._sessions))
+        POOL_RECYCLED.labels(self.name).inc(len(expired))
+        logger.info("回收%d个闲置的池化RagFlow会话", len(expired))
+        try:
+            await self.delete([ragflow_session_id for ragflow_session_id, _ in expired])
+        except Exception as e:
+            logger.warning("删除闲置的RagFlow会话失败: %s", e)
+
+    async def _refill(self) -> bool:
+        """补充到target，返回是否全部创建成功"""
+        if len(self._sessions) >= self.low_water:
+            return True
+        while len(self._sessions) < self.target:
+            batch = min(self.refill_concurrency, self.target - len(self._sessions))
+            results = await asyncio.gather(*(self.create() for _ in range(batch)), return_exceptions=True)
+            failed = False
+            for result in results:
+                if isinstance(result, BaseException):
+                    if isinstance(result, asyncio.CancelledError):
+                        raise result
+                    failed = True
+                    logger.warning("预创建RagFlow会话失败: %s", result)
+                else:
+                    self._sessions.append((result, time.monotonic()))
+            POOL_SIZE.labels(self.name).set(len(self._sessions))
+            if failed:
+                return False
+        logger.debug("RagFlow会话池已补充到%d个", len(self._sessions))
+        return True
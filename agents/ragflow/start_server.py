@@ -17,6 +17,7 @@ sys.path.insert(0, project_root)  # 添加项目根目录到Python路径
 
 # 导入服务模块
 from agents.ragflow.__main__ import main as start_server
+from common.utils.logging_config import configure_logging
 
 # 设置日志
 def setup_logging():
@@ -24,15 +25,8 @@ def setup_logging():
     log_dir = Path('log')
     log_dir.mkdir(exist_ok=True)
     
-    log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    logging.basicConfig(
-        level=logging.INFO,
-        format=log_format,
-        handlers=[
-            logging.StreamHandler(),  # 控制台输出
-            logging.FileHandler('log/kbs_a2a_server.log', encoding='utf-8')  # 文件输出
-        ]
-    )
+    # 与basicConfig一致，若导入__main__时已配置日志则沿用其配置
+    configure_logging(log_dir / 'kbs_a2a_server.log')
     return logging.getLogger('kbs_a2a_server')
 
 def main():
@@ -67,7 +61,7 @@ def main():
     if args.agent_id:
         sys_args.extend(['--agent-id', args.agent_id])
     if args.url:
-        sys_args.extend(['--url', args.url])
+        sys_args.extend(['--ragflow-url', args.url])
     
     # 保存原始参数并设置新参数
     orig_args = sys.argv
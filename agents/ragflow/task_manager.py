@@ -7,6 +7,7 @@ RagFlow任务管理器
 import sys
 import os
 import asyncio
+import time
 
 # 添加项目根目录到Python路径（如果尚未添加）
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -43,10 +44,13 @@ from common.types import (
     CancelTaskResponse,
     TaskResubscriptionRequest,
     InvalidParamsError,
+    ServerBusyError,
 )
 from common.server.task_manager import TaskManager
 from agents.ragflow.agent import RagFlowAgent
 from common.utils.push_notification_auth import PushNotificationSenderAuth
+from common.utils.metrics import REGISTRY
+from common.utils.admission import AdmissionController, OverloadedError
 import common.server.utils as utils
 import logging
 import traceback
@@ -54,6 +58,12 @@ import json
 
 logger = logging.getLogger(__name__)
 
+ACTIVE_TASKS = REGISTRY.gauge("a2a_active_tasks", "Tasks currently being processed by the agent")
+STREAM_TTFT = REGISTRY.histogram(
+    "a2a_stream_time_to_first_token_seconds",
+    "Time from receiving a streaming task to publishing its first answer content",
+)
+
 class RagFlowTaskManager(TaskManager):
     """
     RagFlow任务管理器，将A2A协议请求映射到RagFlow代理
@@ -65,7 +75,8 @@ class RagFlowTaskManager(TaskManager):
     def __init__(self, 
                 task_manager: TaskManager, 
                 agent: RagFlowAgent, 
-                notification_sender_auth: PushNotificationSenderAuth):
+                notification_sender_auth: PushNotificationSenderAuth,
+                admission: Optional[AdmissionController] = None):
         """
         初始化RagFlow任务管理器
         
@@ -73,10 +84,14 @@ class RagFlowTaskManager(TaskManager):
             task_manager: 存储任务的管理器实例（可以是内存版或数据库版）
             agent: RagFlow代理实例
             notification_sender_auth: 推送通知认证
+            admission: 准入控制器，限制同时调用RagFlow的任务数；为None时不限制
         """
         self.task_manager = task_manager
         self.agent = agent
         self.notification_sender_auth = notification_sender_auth
+        self.admission = admission
+        # 后台发送中的推送通知，保留引用直到发送完成
+        self._notifications: set[asyncio.Task] = set()
 
     # 代理基础方法到底层task_manager
     async def on_get_task(self, request: GetTaskRequest) -> GetTaskResponse:
@@ -118,6 +133,24 @@ class RagFlowTaskManager(TaskManager):
         """更新任务存储"""
         return await self.task_manager.update_store(task_id, status, artifacts)
 
+    def get_card_limits(self) -> Optional[dict]:
+        """代理卡片limits块中的并发上限和实时排队情况"""
+        return self.admission.card_limits() if self.admission else None
+
+    async def _admit(self, session_id: str):
+        """申请准入名额，返回释放函数；超出上限且排队已满或等待超时时抛出OverloadedError"""
+        if self.admission is None:
+            return lambda: None
+        return await self.admission.acquire(session_id)
+
+    @staticmethod
+    def _busy_error(request_id, e: OverloadedError) -> JSONRPCResponse:
+        logger.warning("任务被准入控制拒绝: %s", e)
+        return JSONRPCResponse(
+            id=request_id,
+            error=ServerBusyError(data={"reason": f"{e.scope}_{e.reason}", "retryAfter": e.retry_after}),
+        )
+
     async def setup_sse_consumer(self, task_id: str, is_resubscribe: bool = False):
         """设置SSE事件消费者"""
         return await self.task_manager.setup_sse_consumer(task_id, is_resubscribe)
@@ -131,13 +164,45 @@ class RagFlowTaskManager(TaskManager):
         return self.task_manager.dequeue_events_for_sse(request_id, task_id, sse_event_queue)
 
     # RagFlow特定业务逻辑实现
-    async def _run_streaming_agent(self, request: SendTaskStreamingRequest):
-        """运行流式代理，处理流式请求"""
+    async def _agent_items(self, query: str, session_id: str, prepared: asyncio.Future) -> AsyncIterable[dict]:
+        """
+        代理的流式结果，第一项（会话查找或创建、RagFlow请求）立即开始获取，与任务的准备工作并发进行
+
+        prepared完成（任务已创建、推送配置和SSE队列已就绪）之后才产出；那时回答还没到达就先产出一个占位的中间状态
+        """
+        stream = self.agent.stream(query, session_id)
+        first = asyncio.ensure_future(anext(stream, None))
+        try:
+            await prepared
+            if not first.done():
+                yield {
+                    "is_task_complete": False,
+                    "require_user_input": False,
+                    "content": "正在查询知识库...",
+                    "references": None,
+                    "is_notice": True
+                }
+            item = await first
+            while item is not None:
+                yield item
+                item = await anext(stream, None)
+        finally:
+            first.cancel()
+            await asyncio.wait([first])
+            if not first.cancelled():
+                first.exception()
+            await stream.aclose()
+
+    async def _run_streaming_agent(self, request: SendTaskStreamingRequest, prepared: asyncio.Future, received_at: float):
+        """运行流式代理，处理流式请求；事件在prepared完成后才发布，received_at为收到请求的时刻"""
         task_send_params: TaskSendParams = request.params
-        query = self._get_user_query(task_send_params)
 
+        ACTIVE_TASKS.inc()
         try:
-            async for item in self.agent.stream(query, task_send_params.sessionId):
+            query = self._get_user_query(task_send_params)
+            first_token_seen = False
+            notification = None
+            async for item in self._agent_items(query, task_send_params.sessionId, prepared):
                 is_task_complete = item["is_task_complete"]
                 require_user_input = item["require_user_input"]
                 artifact = None
@@ -177,9 +242,6 @@ class RagFlowTaskManager(TaskManager):
                     None if artifact is None else [artifact],
                 )
                 
-                # 发送推送通知
-                await self.send_task_notification(latest_task)
-
                 # 如果有构件，发送构件更新事件
                 if artifact:
                     task_artifact_update_event = TaskArtifactUpdateEvent(
@@ -197,13 +259,28 @@ class RagFlowTaskManager(TaskManager):
                     task_send_params.id, task_update_event
                 )
 
+                # 端到端首token延迟：从收到请求到第一段回答发布给订阅者
+                if not first_token_seen and not item.get("is_notice") and not require_user_input:
+                    first_token_seen = True
+                    STREAM_TTFT.observe(time.perf_counter() - received_at)
+
+                # 在后台按顺序发送推送通知，SSE订阅者不等待webhook
+                notification = await self._notify_in_order(latest_task, notification)
+
+            # 任务结束前等待所有推送通知发出
+            if notification is not None:
+                await notification
+
         except Exception as e:
             logger.error(f"流式响应过程中发生错误: {e}")
             logger.error(traceback.format_exc())
+            await prepared
             await self.enqueue_events_for_sse(
                 task_send_params.id,
                 InternalError(message=f"流式响应过程中发生错误: {e}")                
             )
+        finally:
+            ACTIVE_TASKS.dec()
 
     def _validate_request(
         self, request: Union[SendTaskRequest, SendTaskStreamingRequest]
@@ -235,104 +312,164 @@ class RagFlowTaskManager(TaskManager):
         validation_error = self._validate_request(request)
         if validation_error:
             return SendTaskResponse(id=request.id, error=validation_error.error)
-        
-        # 设置推送通知
-        if request.params.pushNotification:
-            if not await self.set_push_notification_info(request.params.id, request.params.pushNotification):
-                return SendTaskResponse(id=request.id, error=InvalidParamsError(message="推送通知URL无效"))
-
-        # 更新任务状态为处理中
-        await self.upsert_task(request.params)
-        task = await self.update_store(
-            request.params.id, TaskStatus(state=TaskState.WORKING), None
-        )
-        await self.send_task_notification(task)
 
-        # 调用代理处理请求
+        # 准入控制：超出并发上限时排队，排队已满或超时则快速拒绝，此时不创建任务
+        try:
+            release = await self._admit(request.params.sessionId)
+        except OverloadedError as e:
+            return self._busy_error(request.id, e)
+        try:
+            return await self._send_task(request)
+        finally:
+            release()
+
+    async def _invoke_agent(self, query: str, session_id: str) -> dict:
+        """调用代理的非流式接口，计入正在处理的任务数"""
+        ACTIVE_TASKS.inc()
+        try:
+            return await self.agent.invoke(query, session_id)
+        finally:
+            ACTIVE_TASKS.dec()
+
+    async def _send_task(self, request: SendTaskRequest) -> SendTaskResponse:
+        """
+        在已获得准入名额的情况下处理发送任务请求
+
+        推送通知URL验证通过后RagFlow调用立即开始，与任务创建、推送配置和WORKING状态的写入并发进行，
+        WORKING通知在后台发送；URL无效时不调用RagFlow，也不创建任务
+        """
         task_send_params: TaskSendParams = request.params
+        if not await self._verify_push_notification_url(task_send_params.pushNotification):
+            return SendTaskResponse(id=request.id, error=InvalidParamsError(message="推送通知URL无效"))
+
         query = self._get_user_query(task_send_params)
+        invocation = asyncio.create_task(self._invoke_agent(query, task_send_params.sessionId))
         try:
-            agent_response = await self.agent.invoke(query, task_send_params.sessionId)
-            
-            # 检查代理响应是否成功
-            if not agent_response.get("is_task_complete", False):
-                error_msg = agent_response.get("content", "未知错误")
-                logger.warning(f"代理响应未完成: {error_msg}")
+            # 保存推送配置要求任务已存在
+            await self.upsert_task(task_send_params)
+            if task_send_params.pushNotification:
+                await self.task_manager.set_push_notification_info(task_send_params.id, task_send_params.pushNotification)
+
+            # 更新任务状态为处理中，通知在后台发送，之后的通知排在它后面
+            task = await self.update_store(
+                task_send_params.id, TaskStatus(state=TaskState.WORKING), None
+            )
+            notification = await self._notify_in_order(task)
+
+            # 等待代理处理结果
+            try:
+                agent_response = await invocation
                 
-                # 更新任务状态为错误或需要用户输入
-                if agent_response.get("require_user_input", False):
-                    task_status = TaskStatus(
-                        state=TaskState.INPUT_REQUIRED, 
-                        message=Message(
-                            role="agent",
-                            parts=[{"type": "text", "text": error_msg}]
-                        )
-                    )
-                    updated_task = await self.update_store(task_send_params.id, task_status, None)
-                    await self.send_task_notification(updated_task)
+                # 检查代理响应是否成功
+                if not agent_response.get("is_task_complete", False):
+                    error_msg = agent_response.get("content", "未知错误")
+                    logger.warning(f"代理响应未完成: {error_msg}")
                     
-                    # 返回INPUT_REQUIRED状态
-                    return SendTaskResponse(
-                        id=request.id,
-                        result=updated_task
-                    )
-                else:
-                    # 返回错误
-                    return JSONRPCResponse(
-                        id=request.id,
-                        error=InternalError(message=error_msg)
+                    # 更新任务状态为错误或需要用户输入
+                    if agent_response.get("require_user_input", False):
+                        task_status = TaskStatus(
+                            state=TaskState.INPUT_REQUIRED, 
+                            message=Message(
+                                role="agent",
+                                parts=[{"type": "text", "text": error_msg}]
+                            )
+                        )
+                        updated_task = await self.update_store(task_send_params.id, task_status, None)
+                        notification = await self._notify_in_order(updated_task, notification)
+                        if notification is not None:
+                            await notification
+                        
+                        # 返回INPUT_REQUIRED状态
+                        return SendTaskResponse(
+                            id=request.id,
+                            result=updated_task
+                        )
+                    else:
+                        # 返回错误
+                        return JSONRPCResponse(
+                            id=request.id,
+                            error=InternalError(message=error_msg)
+                        )
+                
+            except Exception as e:
+                logger.error(f"调用代理时出错: {e}")
+                logger.error(traceback.format_exc())
+                
+                # 更新任务状态为失败
+                error_message = f"调用代理时出错: {str(e)}"
+                task_status = TaskStatus(
+                    state=TaskState.FAILED, 
+                    message=Message(
+                        role="agent",
+                        parts=[{"type": "text", "text": "处理您的请求时发生错误，请稍后再试或尝试更简单的问题。"}]
                     )
-            
-        except Exception as e:
-            logger.error(f"调用代理时出错: {e}")
-            logger.error(traceback.format_exc())
-            
-            # 更新任务状态为错误
-            error_message = f"调用代理时出错: {str(e)}"
-            task_status = TaskStatus(
-                state=TaskState.ERROR, 
-                message=Message(
-                    role="agent",
-                    parts=[{"type": "text", "text": "处理您的请求时发生错误，请稍后再试或尝试更简单的问题。"}]
                 )
+                updated_task = await self.update_store(task_send_params.id, task_status, None)
+                notification = await self._notify_in_order(updated_task, notification)
+                if notification is not None:
+                    await notification
+                
+                return JSONRPCResponse(
+                    id=request.id,
+                    error=InternalError(message=error_message)
+                )
+                
+            # 处理代理响应
+            return await self._process_agent_response(
+                request, agent_response, notification
             )
-            updated_task = await self.update_store(task_send_params.id, task_status, None)
-            await self.send_task_notification(updated_task)
-            
-            return JSONRPCResponse(
-                id=request.id,
-                error=InternalError(message=error_message)
-            )
-            
-        # 处理代理响应
-        return await self._process_agent_response(
-            request, agent_response
-        )
+        finally:
+            # 提前返回或出错时不再需要代理的结果
+            invocation.cancel()
 
     async def on_send_task_subscribe(
         self, request: SendTaskStreamingRequest
     ) -> AsyncIterable[SendTaskStreamingResponse] | JSONRPCResponse:
-        """处理流式任务请求"""
+        """
+        处理流式任务请求
+
+        推送通知URL验证通过后立即启动代理的流式处理（会话查找或创建、RagFlow请求），任务创建、推送通知配置
+        和SSE队列的准备与之并发进行，事件在准备完成后才发布；URL无效时不调用RagFlow，也不创建任务
+        """
+        received_at = time.perf_counter()
         try:
             # 验证请求
             error = self._validate_request(request)
             if error:
                 return error
 
-            # 创建任务
-            await self.upsert_task(request.params)
-
-            # 设置推送通知
-            if request.params.pushNotification:
-                if not await self.set_push_notification_info(request.params.id, request.params.pushNotification):
-                    return JSONRPCResponse(id=request.id, error=InvalidParamsError(message="推送通知URL无效"))
+            # 准入控制，名额由后台流式任务结束时归还
+            try:
+                release = await self._admit(request.params.sessionId)
+            except OverloadedError as e:
+                return self._busy_error(request.id, e)
 
-            # 设置SSE事件队列
             task_send_params: TaskSendParams = request.params
-            sse_event_queue = await self.setup_sse_consumer(task_send_params.id, False)            
-
-            # 异步启动流式处理
-            asyncio.create_task(self._run_streaming_agent(request))
+            try:
+                verified = await self._verify_push_notification_url(task_send_params.pushNotification)
+            except BaseException:
+                release()
+                raise
+            if not verified:
+                release()
+                return JSONRPCResponse(id=request.id, error=InvalidParamsError(message="推送通知URL无效"))
+
+            prepared = asyncio.get_running_loop().create_future()
+            streaming = asyncio.create_task(self._run_streaming_agent(request, prepared, received_at))
+            # 流式任务结束时归还准入名额，尚未开始运行就被取消时同样归还
+            streaming.add_done_callback(lambda _: release())
+            try:
+                # 创建任务，保存推送配置要求任务已存在
+                await self.upsert_task(task_send_params)
+                if task_send_params.pushNotification:
+                    await self.task_manager.set_push_notification_info(task_send_params.id, task_send_params.pushNotification)
+
+                # 设置SSE事件队列
+                sse_event_queue = await self.setup_sse_consumer(task_send_params.id, False)
+            except BaseException:
+                streaming.cancel()
+                raise
+            prepared.set_result(None)
 
             # 返回事件队列
             return self.dequeue_events_for_sse(
@@ -349,9 +486,9 @@ class RagFlowTaskManager(TaskManager):
             )
 
     async def _process_agent_response(
-        self, request: SendTaskRequest, agent_response: dict
+        self, request: SendTaskRequest, agent_response: dict, notification: Optional[asyncio.Task] = None
     ) -> SendTaskResponse:
-        """处理代理响应，将其转换为A2A格式"""
+        """处理代理响应，将其转换为A2A格式；完成通知排在notification之后发送"""
         task_send_params: TaskSendParams = request.params
         
         # 检查响应有效性
@@ -384,8 +521,10 @@ class RagFlowTaskManager(TaskManager):
         task_status = TaskStatus(state=TaskState.COMPLETED)
         updated_task = await self.update_store(task_send_params.id, task_status, [artifact])
         
-        # 发送通知
-        await self.send_task_notification(updated_task)
+        # 发送通知，等待之前的通知都发出
+        notification = await self._notify_in_order(updated_task, notification)
+        if notification is not None:
+            await notification
         
         # 返回响应
         return SendTaskResponse(
@@ -403,16 +542,41 @@ class RagFlowTaskManager(TaskManager):
     async def send_task_notification(self, task: Task):
         """发送任务推送通知"""
         if not await self.has_push_notification_info(task.id):
-            logger.debug(f"未找到任务 {task.id} 的推送通知信息")
+            logger.debug("未找到任务 %s 的推送通知信息", task.id)
             return
         push_info = await self.get_push_notification_info(task.id)
 
-        logger.info(f"发送任务 {task.id} 通知 => {task.status.state}")
+        logger.info("发送任务 %s 通知 => %s", task.id, task.status.state)
         await self.notification_sender_auth.send_push_notification(
             push_info.url,
             data=task.model_dump(exclude_none=True)
         )
 
+    async def _notify_in_order(self, task: Task, previous: Optional[asyncio.Task] = None) -> Optional[asyncio.Task]:
+        """
+        在后台发送任务推送通知，等previous发完再发，webhook按状态变化的顺序收到通知
+
+        Returns:
+            发送这条通知的后台任务；任务没有推送通知配置时不发送，返回previous
+        """
+        if not await self.has_push_notification_info(task.id):
+            return previous
+        # 存储中的任务对象会被之后的状态更新修改，通知发送调用时的状态
+        task = task.model_copy(deep=True)
+
+        async def send():
+            if previous is not None:
+                await asyncio.wait([previous])
+            try:
+                await self.send_task_notification(task)
+            except Exception as e:
+                logger.error(f"发送任务 {task.id} 通知失败: {e}")
+
+        notification = asyncio.create_task(send())
+        self._notifications.add(notification)
+        notification.add_done_callback(self._notifications.discard)
+        return notification
+
     async def on_resubscribe_to_task(
         self, request: TaskResubscriptionRequest
     ) -> AsyncIterable[SendTaskStreamingResponse] | JSONRPCResponse:
@@ -433,9 +597,15 @@ class RagFlowTaskManager(TaskManager):
     async def set_push_notification_info(self, task_id: str, push_notification_config: PushNotificationConfig):
         """设置推送通知信息"""
         # 验证通知URL所有权
-        is_verified = await self.notification_sender_auth.verify_push_notification_url(push_notification_config.url)
+        is_verified = await self._verify_push_notification_url(push_notification_config)
         if not is_verified:
             return False
         
         await self.task_manager.set_push_notification_info(task_id, push_notification_config)
-        return True 
\ No newline at end of file
+        return True
+
+    async def _verify_push_notification_url(self, push_notification_config: Optional[PushNotificationConfig]) -> bool:
+        """验证通知URL所有权，未配置推送通知时视为通过"""
+        if push_notification_config is None:
+            return True
+        return await self.notification_sender_auth.verify_push_notification_url(push_notification_config.url) 
\ No newline at end of file
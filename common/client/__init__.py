@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 from .client import A2AClient
-from .card_resolver import A2ACardResolver
\ No newline at end of file
+from .card_resolver import A2ACardResolver
+from .multi_client import MultiAgentClient, FanOutMode, AgentResult
\ No newline at end of file
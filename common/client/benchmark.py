@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Compares request throughput of pooled A2AClient connections with one client per call.
+
+Usage:
+    python -m common.client.benchmark --url http://localhost:10003 --requests 2000 --concurrency 50
+
+Every request is a `tasks/get` for a random task id, which the server answers
+without touching an agent, so the numbers mostly reflect transport cost.
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+
+from common.client.client import A2AClient
+from common.types import GetTaskRequest
+
+
+async def _run(worker, total: int, concurrency: int) -> float:
+    """Runs `worker` `total` times with at most `concurrency` in flight, returns req/s."""
+    remaining = iter(range(total))
+
+    async def loop():
+        for _ in remaining:
+            await worker()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(loop() for _ in range(concurrency)))
+    return total / (time.perf_counter() - started)
+
+
+async def bench_per_call(url: str, total: int, concurrency: int) -> float:
+    """Previous behavior: a new httpx.AsyncClient (and connection) for every call."""
+
+    async def worker():
+        request = GetTaskRequest(params={"id": uuid.uuid4().hex})
+        async with httpx.AsyncClient() as client:
+            response = await client.post(url, json=request.model_dump(), timeout=30)
+            response.json()
+
+    return await _run(worker, total, concurrency)
+
+
+async def bench_pooled(url: str, total: int, concurrency: int, http2: bool) -> float:
+    limits = httpx.Limits(
+        max_connections=concurrency,
+        max_keepalive_connections=concurrency,
+        keepalive_expiry=30,
+    )
+    async with A2AClient(url=url, limits=limits, http2=http2) as client:
+
+        async def worker():
+            await client.get_task({"id": uuid.uuid4().hex})
+
+        return await _run(worker, total, concurrency)
+
+
+async def main(url: str, total: int, concurrency: int, http2: bool):
+    # Warm up the server so neither variant pays for first-request costs.
+    await bench_pooled(url, min(total, 50), min(concurrency, 5), http2)
+
+    per_call = await bench_per_call(url, total, concurrency)
+    pooled = await bench_pooled(url, total, concurrency, http2)
+
+    print(f"target:        {url}")
+    print(f"requests:      {total} (concurrency {concurrency})")
+    print(f"client/call:   {per_call:10.1f} req/s")
+    print(f"pooled:        {pooled:10.1f} req/s{' (http2)' if http2 else ''}")
+    print(f"speedup:       {pooled / per_call:10.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="A2AClient connection pool benchmark")
+    parser.add_argument("--url", default="http://localhost:10003/", help="A2A server JSON-RPC URL")
+    parser.add_argument("--requests", type=int, default=1000, help="requests per variant")
+    parser.add_argument("--concurrency", type=int, default=20, help="concurrent requests")
+    parser.add_argument("--http2", action="store_true", help="use HTTP/2 for the pooled client")
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.requests, args.concurrency, args.http2))
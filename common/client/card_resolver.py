@@ -1,23 +1,187 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import hashlib
+import logging
+import os
+import re
+import time
+from typing import Any, Optional
+
 import httpx
 from common.types import (
     AgentCard,
     A2AClientJSONError,
 )
+from common.client.http_pool import PooledClientLease
 import json
 
+logger = logging.getLogger(__name__)
+
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
 
 class A2ACardResolver:
-    def __init__(self, base_url, agent_card_path="/.well-known/agent.json"):
+    """Fetches agent cards with an in-memory and optional on-disk cache.
+
+    A cached card is returned without any request while it is fresh according
+    to the server's Cache-Control max-age. Once stale it is revalidated with
+    If-None-Match/If-Modified-Since, so an unchanged card costs one 304 reply.
+    The in-memory cache is shared by all resolvers of the process.
+
+    `get_agent_card_async` keeps a reference to the pooled connection for the
+    resolver's lifetime; use the resolver as an async context manager, or call
+    `aclose()`, to give it back.
+    """
+
+    _memory_cache: dict[str, dict[str, Any]] = {}
+
+    def __init__(
+        self,
+        base_url,
+        agent_card_path="/.well-known/agent.json",
+        cache_dir: Optional[str] = None,
+        use_cache: bool = True,
+    ):
         self.base_url = base_url.rstrip("/")
         self.agent_card_path = agent_card_path.lstrip("/")
+        self.cache_dir = cache_dir
+        self.use_cache = use_cache
+        self._lease = PooledClientLease(self.card_url)
+
+    async def __aenter__(self) -> "A2ACardResolver":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def aclose(self):
+        """Releases the resolver's reference to the shared connection pool."""
+        await self._lease.aclose()
+
+    @property
+    def card_url(self) -> str:
+        return self.base_url + "/" + self.agent_card_path
+
+    def get_agent_card(self, revalidate: bool = False, timeout: float = 30) -> AgentCard:
+        """Returns the agent card, using a blocking request when one is needed.
+
+        Args:
+            revalidate: Ask the server even if the cached card is still fresh.
+            timeout: Request timeout in seconds.
+        """
+        entry = self._load_entry()
+        if entry is not None and not revalidate and self._is_fresh(entry):
+            return AgentCard(**entry["card"])
+
+        with httpx.Client(timeout=timeout) as client:
+            response = client.get(self.card_url, headers=self._conditional_headers(entry))
+        return self._handle_response(response, entry)
+
+    async def get_agent_card_async(
+        self, revalidate: bool = False, timeout: float = 30
+    ) -> AgentCard:
+        """Async variant of `get_agent_card` using the shared connection pool."""
+        entry = self._load_entry()
+        if entry is not None and not revalidate and self._is_fresh(entry):
+            return AgentCard(**entry["card"])
+
+        response = await self._lease.client().get(
+            self.card_url, headers=self._conditional_headers(entry), timeout=timeout
+        )
+        return self._handle_response(response, entry)
+
+    def invalidate(self):
+        """Drops the cached card from memory and disk."""
+        self._memory_cache.pop(self.card_url, None)
+        path = self._cache_path()
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    @staticmethod
+    def _is_fresh(entry: dict[str, Any]) -> bool:
+        return time.time() < entry.get("expires_at", 0)
+
+    @staticmethod
+    def _conditional_headers(entry: Optional[dict[str, Any]]) -> dict[str, str]:
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    @staticmethod
+    def _expires_at(response: httpx.Response) -> Optional[float]:
+        """Freshness deadline from Cache-Control, None if the card must not be stored."""
+        cache_control = response.headers.get("cache-control", "").lower()
+        if "no-store" in cache_control:
+            return None
+        if "no-cache" in cache_control:
+            return 0
+        match = _MAX_AGE_RE.search(cache_control)
+        return time.time() + int(match.group(1)) if match else 0
+
+    def _handle_response(
+        self, response: httpx.Response, entry: Optional[dict[str, Any]]
+    ) -> AgentCard:
+        if response.status_code == 304 and entry is not None:
+            expires_at = self._expires_at(response)
+            entry["expires_at"] = expires_at or 0
+            self._store_entry(entry)
+            return AgentCard(**entry["card"])
+
+        response.raise_for_status()
+        try:
+            card_data = response.json()
+        except json.JSONDecodeError as e:
+            raise A2AClientJSONError(str(e)) from e
+        agent_card = AgentCard(**card_data)
+
+        expires_at = self._expires_at(response)
+        if expires_at is not None:
+            self._store_entry({
+                "card": card_data,
+                "etag": response.headers.get("etag"),
+                "last_modified": response.headers.get("last-modified"),
+                "expires_at": expires_at,
+            })
+        return agent_card
+
+    def _cache_path(self) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        name = hashlib.sha256(self.card_url.encode()).hexdigest()[:32]
+        return os.path.join(self.cache_dir, f"{name}.json")
+
+    def _load_entry(self) -> Optional[dict[str, Any]]:
+        if not self.use_cache:
+            return None
+        entry = self._memory_cache.get(self.card_url)
+        if entry is not None:
+            return entry
+
+        path = self._cache_path()
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    entry = json.load(f)
+                self._memory_cache[self.card_url] = entry
+                return entry
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Ignoring unreadable agent card cache {path}: {e}")
+        return None
+
+    def _store_entry(self, entry: dict[str, Any]):
+        if not self.use_cache:
+            return
+        self._memory_cache[self.card_url] = entry
 
-    def get_agent_card(self) -> AgentCard:
-        with httpx.Client() as client:
-            response = client.get(self.base_url + "/" + self.agent_card_path)
-            response.raise_for_status()
+        path = self._cache_path()
+        if path:
             try:
-                return AgentCard(**response.json())
-            except json.JSONDecodeError as e:
-                raise A2AClientJSONError(str(e)) from e
\ No newline at end of file
+                os.makedirs(self.cache_dir, exist_ok=True)
+                with open(path, "w", encoding="utf-8") as f:
+                    json.dump(entry, f, ensure_ascii=False)
+            except OSError as e:
+                logger.warning(f"Could not write agent card cache {path}: {e}")
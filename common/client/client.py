@@ -1,8 +1,8 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import httpx
-from httpx_sse import connect_sse
-from typing import Any, AsyncIterable
+from httpx_sse import aconnect_sse
+from typing import Any, AsyncIterable, Optional
 from common.types import (
     AgentCard,
     GetTaskRequest,
@@ -21,17 +21,57 @@ from common.types import (
     SendTaskStreamingRequest,
     SendTaskStreamingResponse,
 )
+from common.client.http_pool import PooledClientLease
 import json
 
+DEFAULT_TIMEOUT = 30
+# Streams stay open for as long as the agent works on the task, so only the gap
+# between two events is bounded rather than the whole response.
+DEFAULT_STREAM_TIMEOUT = httpx.Timeout(DEFAULT_TIMEOUT, read=300)
+
 
 class A2AClient:
-    def __init__(self, agent_card: AgentCard = None, url: str = None):
+    """JSON-RPC client for one A2A agent.
+
+    HTTP connections come from a pool shared by all clients talking to the same
+    host, so repeated calls (e.g. `get_task` polling) reuse keep-alive
+    connections. Use the client as an async context manager, or call `aclose()`,
+    to release its share of the pool.
+    """
+
+    def __init__(
+        self,
+        agent_card: AgentCard = None,
+        url: str = None,
+        timeout: float | httpx.Timeout = DEFAULT_TIMEOUT,
+        stream_timeout: float | httpx.Timeout = DEFAULT_STREAM_TIMEOUT,
+        limits: Optional[httpx.Limits] = None,
+        http2: bool = False,
+    ):
         if agent_card:
             self.url = agent_card.url
         elif url:
             self.url = url
         else:
             raise ValueError("Must provide either agent_card or url")
+        self.timeout = timeout
+        self.stream_timeout = stream_timeout
+        self.limits = limits
+        self.http2 = http2
+        self._lease = PooledClientLease(self.url, limits, http2)
+
+    async def __aenter__(self) -> "A2AClient":
+        self._get_client()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        return self._lease.client()
+
+    async def aclose(self):
+        await self._lease.aclose()
 
     async def send_task(self, payload: dict[str, Any]) -> SendTaskResponse:
         request = SendTaskRequest(params=payload)
@@ -41,31 +81,54 @@ class A2AClient:
         self, payload: dict[str, Any]
     ) -> AsyncIterable[SendTaskStreamingResponse]:
         request = SendTaskStreamingRequest(params=payload)
-        with httpx.Client(timeout=None) as client:
-            with connect_sse(
-                client, "POST", self.url, json=request.model_dump()
+        client = self._get_client()
+        # Leaving the generator early or cancelling the consuming task exits the
+        # context manager below, which closes the underlying response.
+        try:
+            async with aconnect_sse(
+                client,
+                "POST",
+                self.url,
+                json=request.model_dump(),
+                timeout=self.stream_timeout,
             ) as event_source:
-                try:
-                    for sse in event_source.iter_sse():
-                        yield SendTaskStreamingResponse(**json.loads(sse.data))
-                except json.JSONDecodeError as e:
-                    raise A2AClientJSONError(str(e)) from e
-                except httpx.RequestError as e:
-                    raise A2AClientHTTPError(400, str(e)) from e
+                response = event_source.response
+                content_type = response.headers.get("content-type", "")
+                if "text/event-stream" not in content_type:
+                    # Errors are answered with a plain JSON-RPC response.
+                    body = await response.aread()
+                    try:
+                        yield SendTaskStreamingResponse(**json.loads(body))
+                    except json.JSONDecodeError as e:
+                        if response.is_error:
+                            raise A2AClientHTTPError(
+                                response.status_code, body.decode(errors="replace")
+                            ) from e
+                        raise A2AClientJSONError(str(e)) from e
+                    return
+
+                async for sse in event_source.aiter_sse():
+                    yield SendTaskStreamingResponse(**json.loads(sse.data))
+        except json.JSONDecodeError as e:
+            raise A2AClientJSONError(str(e)) from e
+        except httpx.TimeoutException as e:
+            raise A2AClientHTTPError(408, str(e)) from e
+        except httpx.RequestError as e:
+            raise A2AClientHTTPError(400, str(e)) from e
 
     async def _send_request(self, request: JSONRPCRequest) -> dict[str, Any]:
-        async with httpx.AsyncClient() as client:
-            try:
-                # Image generation could take time, adding timeout
-                response = await client.post(
-                    self.url, json=request.model_dump(), timeout=30
-                )
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPStatusError as e:
-                raise A2AClientHTTPError(e.response.status_code, str(e)) from e
-            except json.JSONDecodeError as e:
-                raise A2AClientJSONError(str(e)) from e
+        client = self._get_client()
+        try:
+            # Image generation could take time, adding timeout
+            response = await client.post(
+                self.url, json=request.model_dump(), timeout=self.timeout
+            )
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            raise A2AClientHTTPError(e.response.status_code, str(e)) from e
+        except json.JSONDecodeError as e:
+            raise A2AClientJSONError(str(e)) from e
 
     async def get_task(self, payload: dict[str, Any]) -> GetTaskResponse:
         request = GetTaskRequest(params=payload)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Shared, pooled httpx.AsyncClient instances for A2A clients."""
+
+import asyncio
+import logging
+import weakref
+from typing import Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401  # optional, enables HTTP/2 in httpx
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMITS = httpx.Limits(
+    max_connections=100,
+    max_keepalive_connections=20,
+    keepalive_expiry=30,
+)
+
+PoolKey = tuple
+
+
+class HTTPClientPool:
+    """Registry of pooled httpx.AsyncClient instances shared per origin.
+
+    A2AClient instances that talk to the same scheme/host/port with the same
+    pool settings reuse one client and therefore one set of keep-alive
+    connections. Clients are reference counted and closed once the last user
+    releases them. httpx clients are bound to the event loop they first ran on,
+    so clients are kept per loop. Loops are held weakly: the clients of a loop
+    that has been garbage collected are dropped, and a new loop that happens to
+    get the same `id()` never sees them.
+    """
+
+    def __init__(self):
+        self._loops: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, dict[tuple, list]
+        ] = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def _make_key(url: str, limits: httpx.Limits, http2: bool) -> PoolKey:
+        parsed = httpx.URL(url)
+        return (
+            weakref.ref(asyncio.get_running_loop()),
+            parsed.scheme,
+            parsed.host,
+            parsed.port,
+            limits.max_connections,
+            limits.max_keepalive_connections,
+            limits.keepalive_expiry,
+            http2,
+        )
+
+    def acquire(
+        self,
+        url: str,
+        limits: Optional[httpx.Limits] = None,
+        http2: bool = False,
+    ) -> tuple[PoolKey, httpx.AsyncClient]:
+        """Returns the shared client for `url`, creating it on first use.
+
+        Must be called from within a running event loop.
+        """
+        limits = limits or DEFAULT_LIMITS
+        if http2 and not HTTP2_AVAILABLE:
+            logger.warning("HTTP/2 requested but the 'h2' package is not installed, using HTTP/1.1")
+            http2 = False
+
+        key = self._make_key(url, limits, http2)
+        clients = self._loops.setdefault(key[0](), {})
+        entry = clients.get(key[1:])
+        if entry is None or entry[0].is_closed:
+            entry = clients[key[1:]] = [httpx.AsyncClient(limits=limits, http2=http2), 0]
+        entry[1] += 1
+        return key, entry[0]
+
+    def _drop(self, key: PoolKey) -> Optional[httpx.AsyncClient]:
+        """Drops one reference; returns the client once its last reference is gone."""
+        loop = key[0]()
+        clients = self._loops.get(loop) if loop is not None else None
+        entry = clients.get(key[1:]) if clients else None
+        if entry is None:
+            return None
+        entry[1] -= 1
+        if entry[1] > 0:
+            return None
+        del clients[key[1:]]
+        return entry[0]
+
+    async def release(self, key: PoolKey):
+        client = self._drop(key)
+        if client is not None:
+            await client.aclose()
+
+    def release_nowait(self, key: PoolKey):
+        """Releases a reference acquired on another event loop.
+
+        The client can only be closed on its own loop: the close is scheduled
+        there if that loop is still running, otherwise the client is dropped
+        together with the finished loop.
+        """
+        client = self._drop(key)
+        loop = key[0]()
+        if client is not None and loop is not None and loop.is_running() and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+
+    async def aclose_all(self):
+        """Closes the clients of the running event loop."""
+        clients = self._loops.pop(asyncio.get_running_loop(), {})
+        for client, _ in clients.values():
+            await client.aclose()
+
+
+HTTP_CLIENT_POOL = HTTPClientPool()
+
+
+class PooledClientLease:
+    """One holder's reference to a shared client from `HTTP_CLIENT_POOL`.
+
+    The reference is taken on first use and kept until `aclose()`, so every
+    request of the holder reuses the pooled keep-alive connections. When the
+    holder is used from another event loop, the reference to the old loop's
+    client is given back before one is taken on the new loop.
+    """
+
+    def __init__(self, url: str, limits: Optional[httpx.Limits] = None, http2: bool = False):
+        self.url = url
+        self.limits = limits
+        self.http2 = http2
+        self._client: Optional[httpx.AsyncClient] = None
+        self._key: Optional[PoolKey] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            # A client acquired on another (finished) event loop cannot be reused
+            if self._key is not None:
+                HTTP_CLIENT_POOL.release_nowait(self._key)
+            self._key, self._client = HTTP_CLIENT_POOL.acquire(self.url, self.limits, self.http2)
+            self._loop = loop
+        return self._client
+
+    async def aclose(self):
+        if self._key is not None:
+            if self._loop is asyncio.get_running_loop():
+                await HTTP_CLIENT_POOL.release(self._key)
+            else:
+                HTTP_CLIENT_POOL.release_nowait(self._key)
+        self._client = None
+        self._key = None
+        self._loop = None
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Fan-out client that sends one task to several A2A agents concurrently."""
+
+import asyncio
+import logging
+import time
+from enum import Enum
+from typing import Any, AsyncIterable, Optional
+
+import httpx
+from pydantic import BaseModel
+
+from common.client.client import A2AClient
+from common.types import AgentCard, JSONRPCResponse, TaskStatusUpdateEvent
+
+logger = logging.getLogger(__name__)
+
+# Best-effort tasks/cancel sent to agents whose answer is no longer needed.
+CANCEL_TIMEOUT = 5
+
+
+class FanOutMode(str, Enum):
+    FIRST = "first"    # first successful answer wins, the rest are cancelled
+    ALL = "all"        # wait for every agent (or its timeout)
+    QUORUM = "quorum"  # stop once `quorum` agents answered successfully
+
+
+class AgentResult(BaseModel):
+    """Outcome of one agent's part of a fan-out call or one merged stream event."""
+
+    url: str
+    response: Optional[JSONRPCResponse] = None
+    error: Optional[str] = None
+    latency: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.response is not None and self.response.error is None
+
+
+class MultiAgentClient:
+    """Sends the same task to N agents concurrently and combines their answers.
+
+    Each agent gets its own timeout. Depending on the mode the call returns on
+    the first success, on a quorum of successes or once every agent finished;
+    requests that are still running at that point are cancelled locally and a
+    best-effort `tasks/cancel` is sent so the agent can stop working on them.
+    All agents share the pooled connections of `A2AClient`.
+    """
+
+    def __init__(
+        self,
+        agents: list[AgentCard | str],
+        per_agent_timeout: float | dict[str, float] = 30,
+        limits: Optional[httpx.Limits] = None,
+        http2: bool = False,
+        cancel_losers: bool = True,
+    ):
+        if not agents:
+            raise ValueError("Must provide at least one agent card or url")
+        self.clients: list[A2AClient] = []
+        for agent in agents:
+            if isinstance(agent, AgentCard):
+                client = A2AClient(agent_card=agent, limits=limits, http2=http2)
+            else:
+                client = A2AClient(url=agent, limits=limits, http2=http2)
+            self.clients.append(client)
+        self.per_agent_timeout = per_agent_timeout
+        self.cancel_losers = cancel_losers
+        self._cancel_tasks: set[asyncio.Task] = set()
+
+    async def __aenter__(self) -> "MultiAgentClient":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+    async def aclose(self):
+        if self._cancel_tasks:
+            await asyncio.gather(*self._cancel_tasks, return_exceptions=True)
+        for client in self.clients:
+            await client.aclose()
+
+    def _timeout_for(self, client: A2AClient) -> float:
+        if isinstance(self.per_agent_timeout, dict):
+            return self.per_agent_timeout.get(client.url, 30)
+        return self.per_agent_timeout
+
+    @staticmethod
+    def _required_successes(mode: FanOutMode, quorum: Optional[int], total: int) -> int:
+        if mode == FanOutMode.FIRST:
+            return 1
+        if mode == FanOutMode.QUORUM:
+            if quorum is None or not 0 < quorum <= total:
+                raise ValueError(f"quorum must be between 1 and {total}")
+            return quorum
+        return total
+
+    async def _call(self, client: A2AClient, payload: dict[str, Any]) -> AgentResult:
+        started = time.perf_counter()
+        try:
+            async with asyncio.timeout(self._timeout_for(client)):
+                response = await client.send_task(payload)
+            return AgentResult(
+                url=client.url, response=response, latency=time.perf_counter() - started
+            )
+        except TimeoutError:
+            error = "timeout"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        return AgentResult(url=client.url, error=error, latency=time.perf_counter() - started)
+
+    def _cancel_upstream(self, client: A2AClient, task_id: Optional[str]):
+        if not self.cancel_losers or not task_id:
+            return
+
+        async def cancel():
+            try:
+                async with asyncio.timeout(CANCEL_TIMEOUT):
+                    await client.cancel_task({"id": task_id})
+            except Exception as e:
+                logger.debug("tasks/cancel for %s on %s failed: %s", task_id, client.url, e)
+
+        task = asyncio.create_task(cancel())
+        self._cancel_tasks.add(task)
+        task.add_done_callback(self._cancel_tasks.discard)
+
+    async def _abandon(self, pending: dict[asyncio.Task, A2AClient], task_id: Optional[str]):
+        for task, client in pending.items():
+            task.cancel()
+            self._cancel_upstream(client, task_id)
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    async def send_task(
+        self,
+        payload: dict[str, Any],
+        mode: FanOutMode = FanOutMode.ALL,
+        quorum: Optional[int] = None,
+    ) -> list[AgentResult]:
+        """Sends `payload` as `tasks/send` to every agent.
+
+        Returns the results in completion order: only successes for FIRST and
+        QUORUM once enough arrived, otherwise every result including failures.
+        """
+        mode = FanOutMode(mode)
+        required = self._required_successes(mode, quorum, len(self.clients))
+        pending = {
+            asyncio.create_task(self._call(client, payload)): client
+            for client in self.clients
+        }
+        results: list[AgentResult] = []
+        successes = 0
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    pending.pop(task)
+                    result = task.result()
+                    results.append(result)
+                    successes += result.ok
+                if successes >= required:
+                    return [result for result in results if result.ok][:required]
+                if mode != FanOutMode.ALL and successes + len(pending) < required:
+                    # Not enough agents left to ever reach the required count.
+                    break
+            return results
+        finally:
+            if pending:
+                await self._abandon(pending, payload.get("id"))
+
+    async def send_task_streaming(
+        self,
+        payload: dict[str, Any],
+        mode: FanOutMode = FanOutMode.ALL,
+        quorum: Optional[int] = None,
+    ) -> AsyncIterable[AgentResult]:
+        """Sends `payload` as `tasks/sendSubscribe` to every agent and merges the streams.
+
+        Events are yielded as soon as any agent produces them. In FIRST mode the
+        first agent to deliver an event wins and the other streams are closed;
+        in QUORUM mode streaming stops once `quorum` agents sent their final event.
+        """
+        mode = FanOutMode(mode)
+        required = self._required_successes(mode, quorum, len(self.clients))
+        queue: asyncio.Queue[tuple[A2AClient, Optional[AgentResult]]] = asyncio.Queue()
+
+        async def produce(client: A2AClient):
+            started = time.perf_counter()
+            try:
+                async with asyncio.timeout(self._timeout_for(client)):
+                    async for response in client.send_task_streaming(payload):
+                        await queue.put((client, AgentResult(
+                            url=client.url,
+                            response=response,
+                            latency=time.perf_counter() - started,
+                        )))
+            except TimeoutError:
+                await queue.put((client, AgentResult(
+                    url=client.url, error="timeout", latency=time.perf_counter() - started
+                )))
+            except Exception as e:
+                await queue.put((client, AgentResult(
+                    url=client.url,
+                    error=str(e) or type(e).__name__,
+                    latency=time.perf_counter() - started,
+                )))
+            finally:
+                await queue.put((client, None))
+
+        producers = {client: asyncio.create_task(produce(client)) for client in self.clients}
+        winners: set[A2AClient] = set()
+        finished: set[A2AClient] = set()
+        failures: list[AgentResult] = []
+        try:
+            while len(finished) < len(producers):
+                client, result = await queue.get()
+                if result is None:
+                    finished.add(client)
+                    continue
+                if mode == FanOutMode.FIRST:
+                    if not winners and result.ok:
+                        winners.add(client)
+                        await self._abandon(
+                            {task: other for other, task in producers.items()
+                             if other is not client and other not in finished},
+                            payload.get("id"),
+                        )
+                        finished.update(other for other in producers if other is not client)
+                    elif client not in winners:
+                        if not winners:
+                            failures.append(result)
+                        continue
+                yield result
+                if (
+                    mode == FanOutMode.QUORUM
+                    and result.ok
+                    and isinstance(result.response.result, TaskStatusUpdateEvent)
+                    and result.response.result.final
+                ):
+                    winners.add(client)
+                    if len(winners) >= required:
+                        break
+
+            if mode == FanOutMode.FIRST and not winners:
+                # Nobody succeeded, report why each agent failed.
+                for failure in failures:
+                    yield failure
+        finally:
+            unfinished = {
+                task: client for client, task in producers.items() if not task.done()
+            }
+            if unfinished:
+                await self._abandon(unfinished, payload.get("id"))
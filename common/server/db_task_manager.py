@@ -26,11 +26,15 @@ from common.types import (
     SendTaskStreamingResponse, TaskStatusUpdateEvent, JSONRPCError,
     TaskPushNotificationConfig, InternalError
 )
-from common.server.task_manager import TaskManager
+from common.server.task_manager import (
+    TaskManager, TASK_STORE_DURATION, SSE_SUBSCRIBERS, SSE_QUEUE_DEPTH
+)
 from common.server.models import (
     Base, TaskTable, MessageTable, ArtifactTable, PushNotificationTable
 )
 from common.server.utils import new_not_implemented_error
+from common.utils.metrics import timed
+from common.utils.tracing import traced
 
 logger = logging.getLogger(__name__)
 
@@ -131,6 +135,8 @@ class DatabaseTaskManager(TaskManager):
         
         return task
         
+    @traced("task_store.on_get_task", backend="database")
+    @timed(TASK_STORE_DURATION, backend="database", operation="on_get_task")
     async def on_get_task(self, request: GetTaskRequest) -> GetTaskResponse:
         """
         获取任务信息
@@ -141,7 +147,7 @@ class DatabaseTaskManager(TaskManager):
         Returns:
             任务信息响应
         """
-        logger.info(f"获取任务 {request.params.id}")
+        logger.info("获取任务 %s", request.params.id)
         task_query_params: TaskQueryParams = request.params
         
         try:
@@ -168,6 +174,8 @@ class DatabaseTaskManager(TaskManager):
                 error=InternalError(message=f"获取任务时出错: {str(e)}")
             )
     
+    @traced("task_store.on_cancel_task", backend="database")
+    @timed(TASK_STORE_DURATION, backend="database", operation="on_cancel_task")
     async def on_cancel_task(self, request: CancelTaskRequest) -> CancelTaskResponse:
         """
         取消任务
@@ -178,7 +186,7 @@ class DatabaseTaskManager(TaskManager):
         Returns:
             取消任务响应
         """
-        logger.info(f"取消任务 {request.params.id}")
+        logger.info("取消任务 %s", request.params.id)
         task_id_params: TaskIdParams = request.params
         
         try:
@@ -217,6 +225,8 @@ class DatabaseTaskManager(TaskManager):
         # 抽象方法，由子类实现
         pass
     
+    @traced("task_store.set_push_notification_info", backend="database")
+    @timed(TASK_STORE_DURATION, backend="database", operation="set_push_notification_info")
     async def set_push_notification_info(self, task_id: str, notification_config: PushNotificationConfig):
         """
         设置任务推送通知信息
@@ -255,6 +265,8 @@ class DatabaseTaskManager(TaskManager):
                         )
                         session.add(new_notification)
     
+    @traced("task_store.get_push_notification_info", backend="database")
+    @timed(TASK_STORE_DURATION, backend="database", operation="get_push_notification_info")
     async def get_push_notification_info(self, task_id: str) -> PushNotificationConfig:
         """
         获取任务推送通知信息
@@ -289,6 +301,8 @@ class DatabaseTaskManager(TaskManager):
                 
                 return PushNotificationConfig.model_validate(notification_row.config)
     
+    @traced("task_store.has_push_notification_info", backend="database")
+    @timed(TASK_STORE_DURATION, backend="database", operation="has_push_notification_info")
     async def has_push_notification_info(self, task_id: str) -> bool:
         """
         检查任务是否有推送通知信息
@@ -322,7 +336,7 @@ class DatabaseTaskManager(TaskManager):
         Returns:
             设置推送通知响应
         """
-        logger.info(f"设置任务推送通知 {request.params.id}")
+        logger.info("设置任务推送通知 %s", request.params.id)
         task_notification_params: TaskPushNotificationConfig = request.params
         
         try:
@@ -353,7 +367,7 @@ class DatabaseTaskManager(TaskManager):
         Returns:
             获取推送通知响应
         """
-        logger.info(f"获取任务推送通知 {request.params.id}")
+        logger.info("获取任务推送通知 %s", request.params.id)
         task_params: TaskIdParams = request.params
         
         try:
@@ -375,6 +389,8 @@ class DatabaseTaskManager(TaskManager):
             )
         )
     
+    @traced("task_store.upsert_task", backend="database")
+    @timed(TASK_STORE_DURATION, backend="database", operation="upsert_task")
     async def upsert_task(self, task_send_params: TaskSendParams) -> Task:
         """
         创建或更新任务
@@ -385,7 +401,7 @@ class DatabaseTaskManager(TaskManager):
         Returns:
             更新后的任务对象
         """
-        logger.info(f"创建/更新任务 {task_send_params.id}")
+        logger.info("创建/更新任务 %s", task_send_params.id)
         
         async with self.lock:
             async with self.async_session() as session:
@@ -448,6 +464,8 @@ class DatabaseTaskManager(TaskManager):
         """
         return new_not_implemented_error(request.id)
     
+    @traced("task_store.update_store", backend="database")
+    @timed(TASK_STORE_DURATION, backend="database", operation="update_store")
     async def update_store(
         self, task_id: str, status: TaskStatus, artifacts: Optional[list[Artifact]]
     ) -> Task:
@@ -539,6 +557,7 @@ class DatabaseTaskManager(TaskManager):
             
             sse_event_queue = asyncio.Queue(maxsize=0)  # <=0表示无限
             self.task_sse_subscribers[task_id].append(sse_event_queue)
+            SSE_SUBSCRIBERS.inc()
             return sse_event_queue
     
     async def enqueue_events_for_sse(self, task_id: str, task_update_event):
@@ -556,6 +575,7 @@ class DatabaseTaskManager(TaskManager):
             current_subscribers = self.task_sse_subscribers[task_id]
             for subscriber in current_subscribers:
                 await subscriber.put(task_update_event)
+                SSE_QUEUE_DEPTH.observe(subscriber.qsize())
     
     async def dequeue_events_for_sse(
         self, request_id, task_id: str, sse_event_queue: asyncio.Queue
@@ -584,4 +604,5 @@ class DatabaseTaskManager(TaskManager):
         finally:
             async with self.subscriber_lock:
                 if task_id in self.task_sse_subscribers:
-                    self.task_sse_subscribers[task_id].remove(sse_event_queue) 
\ No newline at end of file
+                    self.task_sse_subscribers[task_id].remove(sse_event_queue) 
+                    SSE_SUBSCRIBERS.dec()
\ No newline at end of file
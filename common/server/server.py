@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 from starlette.applications import Starlette
-from starlette.responses import JSONResponse
+from starlette.responses import FileResponse, JSONResponse, Response
 from sse_starlette.sse import EventSourceResponse
 from starlette.requests import Request
 from common.types import (
@@ -18,16 +18,44 @@ from common.types import (
     AgentCard,
     TaskResubscriptionRequest,
     SendTaskStreamingRequest,
+    ServerBusyError,
 )
 from pydantic import ValidationError
+from email.utils import formatdate, parsedate_to_datetime
+import hashlib
 import json
+import math
+import time
 from typing import AsyncIterable, Any
 from common.server.task_manager import TaskManager
+from common.utils.metrics import REGISTRY, CONTENT_TYPE
+from common.utils.tracing import TRACER, SpanKind
+from common.utils.profiling import Profiler, ProfileInProgressError
+from common.utils.loop_monitor import EventLoopMonitor
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+REQUEST_DURATION = REGISTRY.histogram(
+    "a2a_request_duration_seconds",
+    "Time until the JSON-RPC response starts, by method",
+    ["method", "outcome"],
+)
+STREAM_DURATION = REGISTRY.histogram(
+    "a2a_stream_duration_seconds",
+    "Time until the last event of an SSE response, by method",
+    ["method", "outcome"],
+)
+
+
+# 卡片中随运行状态变化的字段（实测的metrics、实时排队情况）不参与ETag计算，
+# 客户端缓存的卡片只在静态内容变化时失效
+RUNTIME_CARD_FIELDS = {
+    "metrics": ("averageResponseTime", "successRate", "sampleSize"),
+    "limits": ("activeTasks", "queuedTasks", "rejectedTasks"),
+}
+
 
 class A2AServer:
     def __init__(
@@ -37,17 +65,45 @@ class A2AServer:
         endpoint="/",
         agent_card: AgentCard = None,
         task_manager: TaskManager = None,
+        agent_card_max_age: int = 300,
+        metrics_path: str | None = "/metrics",
+        card_metrics_interval: float = 60,
+        profiler: Profiler | None = None,
+        profiling_path: str = "/admin/profile",
+        admin_token: str | None = None,
+        loop_monitor: EventLoopMonitor | None = None,
     ):
         self.host = host
         self.port = port
         self.endpoint = endpoint
         self.task_manager = task_manager
         self.agent_card = agent_card
+        self.agent_card_max_age = agent_card_max_age
+        # 预序列化的代理卡片，避免每次发现请求都重新序列化
+        self._card_source: AgentCard | None = None
+        self._card_body: bytes = b""
+        self._card_etag: str = ""
+        self._card_last_modified: float = 0.0
+        # 卡片中metrics块的实时数据最多每card_metrics_interval秒更新一次
+        self.card_metrics_interval = card_metrics_interval
+        self._card_metrics_updated: float = 0.0
+        # 性能剖析需显式传入profiler才开启；管理端点要求admin_token作为Bearer令牌，未设置时不注册
+        self.profiler = profiler
+        self.admin_token = admin_token
+        # 事件循环延迟监控，随start_async启动和停止
+        self.loop_monitor = loop_monitor
         self.app = Starlette()
         self.app.add_route(self.endpoint, self._process_request, methods=["POST"])
         self.app.add_route(
             "/.well-known/agent.json", self._get_agent_card, methods=["GET"]
         )
+        if metrics_path:
+            self.app.add_route(metrics_path, self._get_metrics, methods=["GET"])
+        if profiler is not None:
+            if admin_token:
+                self.app.add_route(profiling_path, self._capture_profile, methods=["POST"])
+            else:
+                logger.warning("No admin_token set, not registering the profiling endpoint %s", profiling_path)
 
     def start(self):
         """同步启动服务器 - 兼容旧代码"""
@@ -74,47 +130,209 @@ class A2AServer:
         from uvicorn.config import Config
         from uvicorn.server import Server
         
+        # 收到SIGUSR2时采集一次性能剖析
+        if self.profiler is not None:
+            self.profiler.install_signal_handler()
+
         # 创建配置和服务器实例
         config = Config(app=self.app, host=self.host, port=self.port)
         server = Server(config=config)
         
+        if self.loop_monitor is not None:
+            self.loop_monitor.start()
+
         # 直接使用serve方法，避免嵌套的event loop
-        await server.serve()
+        try:
+            await server.serve()
+        finally:
+            if self.loop_monitor is not None:
+                await self.loop_monitor.stop()
 
-    def _get_agent_card(self, request: Request) -> JSONResponse:
-        return JSONResponse(self.agent_card.model_dump(exclude_none=True))
+    def refresh_agent_card(self):
+        """
+        重新序列化代理卡片，卡片内容变化后调用
+
+        ETag和Last-Modified只由卡片的静态部分决定（不含RUNTIME_CARD_FIELDS），因此是弱ETag：
+        运行数据更新后响应体随之更新，但带旧ETag的条件请求仍返回304
+        """
+        card = self.agent_card.model_dump(exclude_none=True)
+        self._card_body = self._serialize_card(card)
+        static_card = dict(card)
+        for block, fields in RUNTIME_CARD_FIELDS.items():
+            if isinstance(static_card.get(block), dict):
+                static_card[block] = {k: v for k, v in static_card[block].items() if k not in fields}
+        etag = f'W/"{hashlib.sha256(self._serialize_card(static_card)).hexdigest()[:32]}"'
+        if etag != self._card_etag:
+            self._card_etag = etag
+            self._card_last_modified = time.time()
+        self._card_source = self.agent_card
+
+    @staticmethod
+    def _serialize_card(card: dict[str, Any]) -> bytes:
+        return json.dumps(card, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def _is_card_not_modified(self, request: Request) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return "*" in tags or self._card_etag in tags
+
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since is not None:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(self._card_last_modified) <= since
+        return False
+
+    def _update_card_metrics(self):
+        """用tasks/send和tasks/sendSubscribe的实测数据更新卡片中的metrics块，
+        并合并任务管理器提供的实时limits（并发上限、排队情况等）"""
+        now = time.monotonic()
+        if now - self._card_metrics_updated < self.card_metrics_interval:
+            return
+        self._card_metrics_updated = now
+
+        changed = False
+        live_limits = self.task_manager.get_card_limits() if self.task_manager else None
+        if live_limits:
+            self.agent_card.limits = {**(self.agent_card.limits or {}), **live_limits}
+            changed = True
+
+        if self.agent_card.metrics is not None and self._collect_card_metrics():
+            changed = True
+        if changed:
+            self.refresh_agent_card()
+
+    def _collect_card_metrics(self) -> bool:
+        count, total = 0, 0.0
+        errors = 0
+        for histogram, method in (
+            (REQUEST_DURATION, "tasks/send"),
+            (STREAM_DURATION, "tasks/sendSubscribe"),
+        ):
+            for outcome in ("ok", "error"):
+                outcome_count, outcome_total = histogram.totals(method=method, outcome=outcome)
+                count += outcome_count
+                total += outcome_total
+                if outcome == "error":
+                    errors += outcome_count
+        if count == 0:
+            return False
+
+        self.agent_card.metrics = {
+            **(self.agent_card.metrics or {}),
+            "averageResponseTime": round(total / count * 1000, 1),  # 毫秒
+            "successRate": round((count - errors) / count, 4),
+            "sampleSize": count,
+        }
+        return True
+
+    def _get_agent_card(self, request: Request) -> Response:
+        if self._card_source is not self.agent_card:
+            self.refresh_agent_card()
+        self._update_card_metrics()
+
+        headers = {
+            "ETag": self._card_etag,
+            "Last-Modified": formatdate(self._card_last_modified, usegmt=True),
+            "Cache-Control": f"public, max-age={self.agent_card_max_age}",
+        }
+        if self._is_card_not_modified(request):
+            return Response(status_code=304, headers=headers)
+        return Response(self._card_body, media_type="application/json", headers=headers)
+
+    def _get_metrics(self, request: Request) -> Response:
+        return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+    async def _capture_profile(self, request: Request) -> Response:
+        """采集一次限时性能剖析
+
+        查询参数：seconds（时长）、mode（sample或cprofile）、memory（0关闭tracemalloc）、
+        format（json摘要；collapsed或pstats直接返回对应文件）
+        """
+        if request.headers.get("authorization") != f"Bearer {self.admin_token}":
+            return JSONResponse({"error": "unauthorized"}, status_code=401)
+
+        params = request.query_params
+        mode = params.get("mode", "sample")
+        output_format = params.get("format", "json")
+        artifact = {"json": None, "collapsed": "cpu", "pstats": "pstats"}.get(output_format, "")
+        if artifact == "" or (artifact == "cpu" and mode != "sample") or (
+            artifact == "pstats" and mode != "cprofile"
+        ):
+            return JSONResponse(
+                {"error": f"format {output_format} is not available for mode {mode}"},
+                status_code=400,
+            )
 
-    async def _process_request(self, request: Request):
         try:
-            body = await request.json()
-            json_rpc_request = A2ARequest.validate_python(body)
-
-            if isinstance(json_rpc_request, GetTaskRequest):
-                result = await self.task_manager.on_get_task(json_rpc_request)
-            elif isinstance(json_rpc_request, SendTaskRequest):
-                result = await self.task_manager.on_send_task(json_rpc_request)
-            elif isinstance(json_rpc_request, SendTaskStreamingRequest):
-                result = await self.task_manager.on_send_task_subscribe(
-                    json_rpc_request
-                )
-            elif isinstance(json_rpc_request, CancelTaskRequest):
-                result = await self.task_manager.on_cancel_task(json_rpc_request)
-            elif isinstance(json_rpc_request, SetTaskPushNotificationRequest):
-                result = await self.task_manager.on_set_task_push_notification(json_rpc_request)
-            elif isinstance(json_rpc_request, GetTaskPushNotificationRequest):
-                result = await self.task_manager.on_get_task_push_notification(json_rpc_request)
-            elif isinstance(json_rpc_request, TaskResubscriptionRequest):
-                result = await self.task_manager.on_resubscribe_to_task(
-                    json_rpc_request
-                )
-            else:
-                logger.warning(f"Unexpected request type: {type(json_rpc_request)}")
-                raise ValueError(f"Unexpected request type: {type(request)}")
+            summary = await self.profiler.capture(
+                seconds=params.get("seconds"),
+                mode=mode,
+                memory=params.get("memory", "1") not in ("0", "false"),
+            )
+        except ProfileInProgressError as e:
+            return JSONResponse({"error": str(e)}, status_code=409)
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+
+        if artifact is not None:
+            return FileResponse(summary["files"][artifact])
+        return JSONResponse(summary)
+
+    async def _process_request(self, request: Request):
+        started = time.perf_counter()
+        method = "unknown"
+        # 上游调用方传入traceparent时，本次请求的span挂在其链路下
+        with TRACER.span(
+            "a2a.request",
+            SpanKind.SERVER,
+            {"rpc.system": "jsonrpc"},
+            parent=TRACER.extract(request.headers),
+        ) as span:
+            try:
+                body = await request.json()
+                with TRACER.span("a2a.validate"):
+                    json_rpc_request = A2ARequest.validate_python(body)
+                method = json_rpc_request.method
+                span.update_name(f"a2a {method}")
+                span.set_attribute("rpc.method", method)
+                span.set_attribute("a2a.task_id", getattr(json_rpc_request.params, "id", None))
+
+                if isinstance(json_rpc_request, GetTaskRequest):
+                    result = await self.task_manager.on_get_task(json_rpc_request)
+                elif isinstance(json_rpc_request, SendTaskRequest):
+                    result = await self.task_manager.on_send_task(json_rpc_request)
+                elif isinstance(json_rpc_request, SendTaskStreamingRequest):
+                    result = await self.task_manager.on_send_task_subscribe(
+                        json_rpc_request
+                    )
+                elif isinstance(json_rpc_request, CancelTaskRequest):
+                    result = await self.task_manager.on_cancel_task(json_rpc_request)
+                elif isinstance(json_rpc_request, SetTaskPushNotificationRequest):
+                    result = await self.task_manager.on_set_task_push_notification(json_rpc_request)
+                elif isinstance(json_rpc_request, GetTaskPushNotificationRequest):
+                    result = await self.task_manager.on_get_task_push_notification(json_rpc_request)
+                elif isinstance(json_rpc_request, TaskResubscriptionRequest):
+                    result = await self.task_manager.on_resubscribe_to_task(
+                        json_rpc_request
+                    )
+                else:
+                    logger.warning(f"Unexpected request type: {type(json_rpc_request)}")
+                    raise ValueError(f"Unexpected request type: {type(request)}")
 
-            return self._create_response(result)
+                outcome = "error" if getattr(result, "error", None) is not None else "ok"
+                REQUEST_DURATION.labels(method, outcome).observe(time.perf_counter() - started)
+                if outcome == "error":
+                    span.set_status(False, result.error.message)
+                return self._create_response(result, method, started)
 
-        except Exception as e:
-            return self._handle_exception(e)
+            except Exception as e:
+                REQUEST_DURATION.labels(method, "error").observe(time.perf_counter() - started)
+                span.record_exception(e)
+                return self._handle_exception(e)
 
     def _handle_exception(self, e: Exception) -> JSONResponse:
         if isinstance(e, json.decoder.JSONDecodeError):
@@ -128,16 +346,35 @@ class A2AServer:
         response = JSONRPCResponse(id=None, error=json_rpc_error)
         return JSONResponse(response.model_dump(exclude_none=True), status_code=400)
 
-    def _create_response(self, result: Any) -> JSONResponse | EventSourceResponse:
+    def _create_response(
+        self, result: Any, method: str = "unknown", started: float | None = None
+    ) -> JSONResponse | EventSourceResponse:
         if isinstance(result, AsyncIterable):
 
             async def event_generator(result) -> AsyncIterable[dict[str, str]]:
-                async for item in result:
-                    yield {"data": item.model_dump_json(exclude_none=True)}
+                failed = False
+                completed = False
+                try:
+                    async for item in result:
+                        failed = failed or item.error is not None
+                        yield {"data": item.model_dump_json(exclude_none=True)}
+                    completed = True
+                finally:
+                    if started is not None:
+                        # 客户端提前断开记为cancelled，不计入失败
+                        outcome = "error" if failed else "ok" if completed else "cancelled"
+                        STREAM_DURATION.labels(method, outcome).observe(
+                            time.perf_counter() - started
+                        )
 
             return EventSourceResponse(event_generator(result))
         elif isinstance(result, JSONRPCResponse):
-            return JSONResponse(result.model_dump(exclude_none=True))
+            headers = None
+            if result.error is not None and result.error.code == ServerBusyError().code:
+                # 过载拒绝时提示客户端多久后重试
+                retry_after = (result.error.data or {}).get("retryAfter", 1)
+                headers = {"Retry-After": str(max(1, math.ceil(retry_after)))}
+            return JSONResponse(result.model_dump(exclude_none=True), headers=headers)
         else:
             logger.error(f"Unexpected result type: {type(result)}")
             raise ValueError(f"Unexpected result type: {type(result)}")
\ No newline at end of file
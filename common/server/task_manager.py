@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 from abc import ABC, abstractmethod
-from typing import Union, AsyncIterable, List
+from typing import Any, Union, AsyncIterable, List
 from common.types import Task
 from common.types import (
     JSONRPCResponse,
@@ -34,11 +34,25 @@ from common.types import (
     InternalError,
 )
 from common.server.utils import new_not_implemented_error
+from common.utils.metrics import REGISTRY, timed
+from common.utils.tracing import traced
 import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+TASK_STORE_DURATION = REGISTRY.histogram(
+    "a2a_task_store_duration_seconds",
+    "Latency of task store operations",
+    ["backend", "operation"],
+)
+SSE_SUBSCRIBERS = REGISTRY.gauge("a2a_sse_subscribers", "Open SSE subscriber queues")
+SSE_QUEUE_DEPTH = REGISTRY.histogram(
+    "a2a_sse_queue_depth",
+    "Depth of a subscriber queue right after an event was enqueued",
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 1000),
+)
+
 class TaskManager(ABC):
     @abstractmethod
     async def on_get_task(self, request: GetTaskRequest) -> GetTaskResponse:
@@ -76,6 +90,10 @@ class TaskManager(ABC):
     ) -> Union[AsyncIterable[SendTaskResponse], JSONRPCResponse]:
         pass
 
+    def get_card_limits(self) -> dict[str, Any] | None:
+        """Live limits merged into the agent card's `limits` block, if any."""
+        return None
+
 
 class InMemoryTaskManager(TaskManager):
     def __init__(self):
@@ -85,8 +103,10 @@ class InMemoryTaskManager(TaskManager):
         self.task_sse_subscribers: dict[str, List[asyncio.Queue]] = {}
         self.subscriber_lock = asyncio.Lock()
 
+    @traced("task_store.on_get_task", backend="memory")
+    @timed(TASK_STORE_DURATION, backend="memory", operation="on_get_task")
     async def on_get_task(self, request: GetTaskRequest) -> GetTaskResponse:
-        logger.info(f"Getting task {request.params.id}")
+        logger.info("Getting task %s", request.params.id)
         task_query_params: TaskQueryParams = request.params
 
         async with self.lock:
@@ -100,8 +120,10 @@ class InMemoryTaskManager(TaskManager):
 
         return GetTaskResponse(id=request.id, result=task_result)
 
+    @traced("task_store.on_cancel_task", backend="memory")
+    @timed(TASK_STORE_DURATION, backend="memory", operation="on_cancel_task")
     async def on_cancel_task(self, request: CancelTaskRequest) -> CancelTaskResponse:
-        logger.info(f"Cancelling task {request.params.id}")
+        logger.info("Cancelling task %s", request.params.id)
         task_id_params: TaskIdParams = request.params
 
         async with self.lock:
@@ -121,6 +143,8 @@ class InMemoryTaskManager(TaskManager):
     ) -> Union[AsyncIterable[SendTaskStreamingResponse], JSONRPCResponse]:
         pass
 
+    @traced("task_store.set_push_notification_info", backend="memory")
+    @timed(TASK_STORE_DURATION, backend="memory", operation="set_push_notification_info")
     async def set_push_notification_info(self, task_id: str, notification_config: PushNotificationConfig):
         async with self.lock:
             task = self.tasks.get(task_id)
@@ -131,6 +155,8 @@ class InMemoryTaskManager(TaskManager):
 
         return
     
+    @traced("task_store.get_push_notification_info", backend="memory")
+    @timed(TASK_STORE_DURATION, backend="memory", operation="get_push_notification_info")
     async def get_push_notification_info(self, task_id: str) -> PushNotificationConfig:
         async with self.lock:
             task = self.tasks.get(task_id)
@@ -141,6 +167,8 @@ class InMemoryTaskManager(TaskManager):
             
         return
     
+    @traced("task_store.has_push_notification_info", backend="memory")
+    @timed(TASK_STORE_DURATION, backend="memory", operation="has_push_notification_info")
     async def has_push_notification_info(self, task_id: str) -> bool:
         async with self.lock:
             return task_id in self.push_notification_infos
@@ -149,7 +177,7 @@ class InMemoryTaskManager(TaskManager):
     async def on_set_task_push_notification(
         self, request: SetTaskPushNotificationRequest
     ) -> SetTaskPushNotificationResponse:
-        logger.info(f"Setting task push notification {request.params.id}")
+        logger.info("Setting task push notification %s", request.params.id)
         task_notification_params: TaskPushNotificationConfig = request.params
 
         try:
@@ -168,7 +196,7 @@ class InMemoryTaskManager(TaskManager):
     async def on_get_task_push_notification(
         self, request: GetTaskPushNotificationRequest
     ) -> GetTaskPushNotificationResponse:
-        logger.info(f"Getting task push notification {request.params.id}")
+        logger.info("Getting task push notification %s", request.params.id)
         task_params: TaskIdParams = request.params
 
         try:
@@ -184,8 +212,10 @@ class InMemoryTaskManager(TaskManager):
         
         return GetTaskPushNotificationResponse(id=request.id, result=TaskPushNotificationConfig(id=task_params.id, pushNotificationConfig=notification_info))
 
+    @traced("task_store.upsert_task", backend="memory")
+    @timed(TASK_STORE_DURATION, backend="memory", operation="upsert_task")
     async def upsert_task(self, task_send_params: TaskSendParams) -> Task:
-        logger.info(f"Upserting task {task_send_params.id}")
+        logger.info("Upserting task %s", task_send_params.id)
         async with self.lock:
             task = self.tasks.get(task_send_params.id)
             if task is None:
@@ -207,6 +237,8 @@ class InMemoryTaskManager(TaskManager):
     ) -> Union[AsyncIterable[SendTaskStreamingResponse], JSONRPCResponse]:
         return new_not_implemented_error(request.id)
 
+    @traced("task_store.update_store", backend="memory")
+    @timed(TASK_STORE_DURATION, backend="memory", operation="update_store")
     async def update_store(
         self, task_id: str, status: TaskStatus, artifacts: list[Artifact]
     ) -> Task:
@@ -248,6 +280,7 @@ class InMemoryTaskManager(TaskManager):
 
             sse_event_queue = asyncio.Queue(maxsize=0) # <=0 is unlimited
             self.task_sse_subscribers[task_id].append(sse_event_queue)
+            SSE_SUBSCRIBERS.inc()
             return sse_event_queue
 
     async def enqueue_events_for_sse(self, task_id, task_update_event):
@@ -258,6 +291,7 @@ class InMemoryTaskManager(TaskManager):
             current_subscribers = self.task_sse_subscribers[task_id]
             for subscriber in current_subscribers:
                 await subscriber.put(task_update_event)
+                SSE_QUEUE_DEPTH.observe(subscriber.qsize())
 
     async def dequeue_events_for_sse(
         self, request_id, task_id, sse_event_queue: asyncio.Queue
@@ -275,4 +309,5 @@ class InMemoryTaskManager(TaskManager):
         finally:
             async with self.subscriber_lock:
                 if task_id in self.task_sse_subscribers:
-                    self.task_sse_subscribers[task_id].remove(sse_event_queue)
\ No newline at end of file
+                    self.task_sse_subscribers[task_id].remove(sse_event_queue)
+                    SSE_SUBSCRIBERS.dec()
\ No newline at end of file
@@ -304,6 +304,12 @@ class ContentTypeNotSupportedError(JSONRPCError):
     data: None = None
 
 
+class ServerBusyError(JSONRPCError):
+    code: int = -32050
+    message: str = "Server is busy, retry later"
+    data: Any | None = None
+
+
 class AgentProvider(BaseModel):
     organization: str
     url: str | None = None
@@ -342,6 +348,10 @@ class AgentCard(BaseModel):
     defaultInputModes: List[str] = ["text"]
     defaultOutputModes: List[str] = ["text"]
     skills: List[AgentSkill]
+    metrics: dict[str, Any] | None = None
+    limits: dict[str, Any] | None = None
+    pricing: dict[str, Any] | None = None
+    metadata: dict[str, Any] | None = None
 
 
 class A2AClientError(Exception):
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Admission control for upstream work.
+
+`AdmissionController` bounds how many tasks run at once, globally and per
+session. Requests over a limit wait in a bounded FIFO queue for at most
+`queue_timeout` seconds; when the queue is full or the wait times out they are
+rejected with `OverloadedError` straight away, so a burst turns into fast,
+retryable rejections instead of a pile of upstream 429s.
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Optional
+
+from common.utils.metrics import REGISTRY
+
+ADMISSION_ACTIVE = REGISTRY.gauge("a2a_admission_active", "Tasks holding an admission slot")
+ADMISSION_QUEUED = REGISTRY.gauge("a2a_admission_queued", "Tasks waiting for an admission slot")
+ADMISSION_REJECTED = REGISTRY.counter(
+    "a2a_admission_rejected", "Tasks rejected by admission control", ["reason"]
+)
+ADMISSION_WAIT = REGISTRY.histogram(
+    "a2a_admission_wait_seconds",
+    "Time admitted tasks spent waiting for a slot",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+
+
+class OverloadedError(Exception):
+    """Raised when a task is rejected; `reason` is "queue_full" or "timeout"."""
+
+    def __init__(self, reason: str, scope: str, retry_after: float = 1.0):
+        self.reason = reason
+        self.scope = scope
+        self.retry_after = retry_after
+        super().__init__(f"{scope} admission rejected: {reason}")
+
+
+class _Slots:
+    """Counting semaphore with a bounded FIFO wait queue."""
+
+    def __init__(self, limit: int, max_waiters: int):
+        self.limit = limit
+        self.max_waiters = max_waiters
+        self.active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def idle(self) -> bool:
+        return self.active == 0 and not self._waiters
+
+    async def acquire(self, timeout: float, scope: str):
+        if self.limit <= 0 or (self.active < self.limit and not self._waiters):
+            self.active += 1
+            return
+        if len(self._waiters) >= self.max_waiters:
+            raise OverloadedError("queue_full", scope)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        ADMISSION_QUEUED.inc()
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except BaseException as e:
+            # The slot may have been handed over just before the timeout or
+            # cancellation; pass it on rather than leaking it.
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            if isinstance(e, asyncio.TimeoutError):
+                raise OverloadedError("timeout", scope) from None
+            raise
+        finally:
+            ADMISSION_QUEUED.dec()
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+
+    def release(self):
+        # Hand the slot straight to the next waiter, so active stays unchanged.
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class AdmissionController:
+    """Global and per-session concurrency limits with a bounded wait queue.
+
+    A limit of 0 disables that limit. Must be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 32,
+        max_queued: int = 64,
+        max_per_session: int = 1,
+        max_queued_per_session: int = 4,
+        queue_timeout: float = 30.0,
+        retry_after: float = 1.0,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.max_per_session = max_per_session
+        self.max_queued_per_session = max_queued_per_session
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.rejected = 0
+        self._global = _Slots(max_concurrent, max_queued)
+        self._sessions: dict[str, _Slots] = {}
+
+    @property
+    def active(self) -> int:
+        return self._global.active
+
+    @property
+    def queued(self) -> int:
+        return self._global.waiting + sum(s.waiting for s in self._sessions.values())
+
+    async def acquire(self, session_id: Optional[str] = None) -> Callable[[], None]:
+        """Takes a global slot, and a session slot if `session_id` is given.
+
+        Returns the function that gives the slots back; it may be called from
+        another task (e.g. a background streaming task) and only once counts.
+        Raises OverloadedError if the task is rejected.
+        """
+        started = time.perf_counter()
+        session = None
+        if session_id and self.max_per_session > 0:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _Slots(
+                    self.max_per_session, self.max_queued_per_session
+                )
+        try:
+            if session is not None:
+                await session.acquire(self.queue_timeout, "session")
+            try:
+                remaining = max(0.0, self.queue_timeout - (time.perf_counter() - started))
+                await self._global.acquire(remaining, "global")
+            except BaseException:
+                if session is not None:
+                    session.release()
+                raise
+        except OverloadedError as e:
+            e.retry_after = self.retry_after
+            self.rejected += 1
+            ADMISSION_REJECTED.labels(reason=f"{e.scope}_{e.reason}").inc()
+            self._forget(session_id, session)
+            raise
+        except BaseException:
+            self._forget(session_id, session)
+            raise
+
+        ADMISSION_WAIT.observe(time.perf_counter() - started)
+        ADMISSION_ACTIVE.inc()
+        released = False
+
+        def release():
+            nonlocal released
+            if released:
+                return
+            released = True
+            ADMISSION_ACTIVE.dec()
+            self._global.release()
+            if session is not None:
+                session.release()
+                self._forget(session_id, session)
+
+        return release
+
+    @asynccontextmanager
+    async def admit(self, session_id: Optional[str] = None):
+        """Context manager form of `acquire`."""
+        release = await self.acquire(session_id)
+        try:
+            yield
+        finally:
+            release()
+
+    def _forget(self, session_id: Optional[str], session: Optional[_Slots]):
+        if session is not None and session.idle and self._sessions.get(session_id) is session:
+            del self._sessions[session_id]
+
+    def card_limits(self) -> dict[str, Any]:
+        """Limits and current queue state for the agent card's `limits` block."""
+        return {
+            "maxConcurrentTasks": self.max_concurrent or None,
+            "maxQueuedTasks": self.max_queued if self.max_concurrent else None,
+            "maxConcurrentTasksPerSession": self.max_per_session or None,
+            "queueTimeoutSeconds": self.queue_timeout,
+            "retryAfterSeconds": self.retry_after,
+            "activeTasks": self.active,
+            "queuedTasks": self.queued,
+            "rejectedTasks": self.rejected,
+        }
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Non-blocking logging setup for the agent servers.
+
+`configure_logging()` attaches a single `QueueHandler` to the root logger, so
+a log call on the event loop only filters the record and puts it on a queue.
+A `QueueListener` thread then formats it and writes it to the console and to a
+size-rotated file, with JSON lines in the file by default. Two filters run
+before a record is queued:
+
+- `RateLimitFilter`: a token bucket per call site (file and line) for the
+  module prefixes given in `LOG_RATE_LIMITS`, which drops hot-path INFO/DEBUG
+  messages over the limit and reports how many were suppressed on the next
+  one let through. It is off unless configured, so no record is dropped by
+  default;
+- `TraceContextFilter`: stamps the current trace and span ids on the record.
+
+If the queue is full, records are dropped and counted instead of blocking.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Mapping, Optional
+
+from common.utils.tracing import TRACER
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+_STANDARD_ATTRS = frozenset(
+    logging.LogRecord("", 0, "", 0, "", None, None).__dict__
+) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line.
+
+    Attributes passed through `extra=` are included as top-level fields.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+            "thread": record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per call site for records below `max_level`.
+
+    `rates` maps logger name prefixes to messages per second; the longest
+    matching prefix wins and "" sets a default for every other logger.
+    Loggers without a matching prefix, and rates of 0, are not limited.
+    The burst size is one second's worth of messages, at least 1.
+    """
+
+    def __init__(self, rates: Mapping[str, float], max_level: int = logging.INFO):
+        super().__init__()
+        self.rates = dict(rates)
+        self.max_level = max_level
+        self._prefixes = sorted(self.rates, key=len, reverse=True)
+        self._buckets: dict[tuple[str, int], list[float]] = {}
+        self._suppressed: dict[tuple[str, int], int] = {}
+        self._lock = threading.Lock()
+
+    def _rate_for(self, name: str) -> float:
+        for prefix in self._prefixes:
+            if not prefix or name == prefix or name.startswith(prefix + "."):
+                return self.rates[prefix]
+        return 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.max_level:
+            return True
+        rate = self._rate_for(record.name)
+        if rate <= 0:
+            return True
+
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        burst = max(rate, 1.0)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [burst, now]
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if tokens < 1:
+                bucket[0] = tokens
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return False
+            bucket[0] = tokens - 1
+            suppressed = self._suppressed.pop(key, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class TraceContextFilter(logging.Filter):
+    """Adds `trace_id` and `span_id` of the current span, when tracing is on."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        span = TRACER.current_span()
+        if span is not None:
+            record.trace_id = span.context.trace_id
+            record.span_id = span.context.span_id
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args into the message and pre-render the traceback, but leave
+        # the final formatting to the writer thread's handlers.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _EXCEPTION_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_EXCEPTION_FORMATTER = logging.Formatter()
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def parse_rate_limits(spec: str) -> dict[str, float]:
+    """Parses "prefix=rate,..." (a bare number sets the default rate)."""
+    rates: dict[str, float] = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        prefix, _, rate = item.rpartition("=")
+        rates[prefix.strip()] = float(rate)
+    return rates
+
+
+def configure_logging(
+    log_file: Optional[str] = None,
+    level: Optional[str] = None,
+    file_format: Optional[str] = None,
+    max_bytes: Optional[int] = None,
+    backup_count: Optional[int] = None,
+    rate_limits: Optional[Mapping[str, float]] = None,
+    queue_size: int = 10000,
+    force: bool = False,
+) -> Optional[logging.handlers.QueueListener]:
+    """Routes all logging through a queue and a background writer thread.
+
+    Like `logging.basicConfig`, this does nothing if the root logger already
+    has handlers, unless `force` is set. Unset arguments are read from the
+    environment:
+
+    LOG_LEVEL           root level (default INFO)
+    LOG_FORMAT          file format, "json" (default) or "text"
+    LOG_MAX_BYTES       rotate the file at this size (default 20 MB, 0 disables)
+    LOG_BACKUP_COUNT    rotated files to keep (default 5)
+    LOG_RATE_LIMITS     INFO/DEBUG messages per second and call site for the
+                        given logger prefixes, e.g. "agents.ragflow.agent=5"
+                        (default empty: no limiting; a bare number applies
+                        to all loggers)
+    """
+    global _listener
+    root = logging.getLogger()
+    if root.handlers and not force:
+        return None
+    shutdown_logging()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+
+    level = level or os.environ.get("LOG_LEVEL", "INFO")
+    file_format = file_format or os.environ.get("LOG_FORMAT", "json")
+    if max_bytes is None:
+        max_bytes = int(os.environ.get("LOG_MAX_BYTES", 20 * 1024 * 1024))
+    if backup_count is None:
+        backup_count = int(os.environ.get("LOG_BACKUP_COUNT", 5))
+    if rate_limits is None:
+        rate_limits = parse_rate_limits(os.environ.get("LOG_RATE_LIMITS", ""))
+
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(TEXT_FORMAT))
+    handlers: list[logging.Handler] = [console]
+    if log_file:
+        directory = os.path.dirname(str(log_file))
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+        file_handler.setFormatter(
+            JsonFormatter() if file_format == "json" else logging.Formatter(TEXT_FORMAT)
+        )
+        handlers.append(file_handler)
+
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    if rate_limits:
+        queue_handler.addFilter(RateLimitFilter(rate_limits))
+    queue_handler.addFilter(TraceContextFilter())
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(
+        queue_handler.queue, *handlers, respect_handler_level=True
+    )
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """Stops the writer thread after it has flushed the queued records."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Event loop lag monitor and blocking-call watchdog.
+
+A heartbeat task sleeps for `interval` and records how late it woke up in
+`a2a_event_loop_lag_seconds`. A watchdog thread checks the heartbeat; when the
+loop has not run for `threshold` seconds, the loop is blocked by a synchronous
+call and the watchdog logs the loop thread's current stack, i.e. the stack of
+the blocking callback while it is still running.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from common.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = REGISTRY.histogram(
+    "a2a_event_loop_lag_seconds",
+    "Delay between when the loop heartbeat was due and when it ran",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+LOOP_STALLS = REGISTRY.counter(
+    "a2a_event_loop_stalls", "Times the event loop was blocked for longer than the threshold"
+)
+
+
+class EventLoopMonitor:
+    """Measures event loop lag and logs stacks of callbacks that block the loop."""
+
+    def __init__(self, interval: float = 0.1, threshold: float = 0.1, stack_limit: int = 30):
+        self.interval = interval
+        self.threshold = threshold
+        self.stack_limit = stack_limit
+        self.max_lag = 0.0
+        self._last_beat = 0.0
+        self._stall_reported = False
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        """Starts monitoring the running event loop. Must be called from the loop."""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopped.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._watchdog.join()
+        self._watchdog = None
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            LOOP_LAG.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if self._stall_reported:
+                self._stall_reported = False
+                logger.warning("Event loop was blocked for %.3fs", lag)
+            self._last_beat = now
+
+    def _watch(self):
+        check_every = min(self.interval, self.threshold) / 2
+        while not self._stopped.wait(check_every):
+            blocked_for = time.monotonic() - self._last_beat - self.interval
+            if blocked_for < self.threshold or self._stall_reported:
+                continue
+            self._stall_reported = True
+            LOOP_STALLS.inc()
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame, limit=self.stack_limit))
+            del frame
+            logger.warning(
+                "Event loop blocked for more than %.3fs, loop thread stack:\n%s",
+                blocked_for,
+                stack,
+            )
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""On-demand profiling of a running server.
+
+`Profiler.capture()` records, for a bounded time window:
+
+- a CPU profile of the event loop thread, either sampled stacks in collapsed
+  format (input for flamegraph.pl / speedscope) or a cProfile pstats file;
+- an asyncio task profile: where tasks are suspended, sampled periodically and
+  written in collapsed format, which shows what requests are waiting on;
+- a tracemalloc snapshot of allocations made during the window that are still
+  alive at the end, with the top allocation sites by line.
+
+Captures are triggered through `A2AServer`'s admin route or SIGUSR2 (see
+`install_signal_handler`), and their artifacts are written to `output_dir`.
+"""
+
+import asyncio
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+MODES = ("sample", "cprofile")
+
+
+@functools.lru_cache(maxsize=4096)
+def _short_path(filename: str) -> str:
+    for path in sorted(sys.path, key=len, reverse=True):
+        if path and filename.startswith(path + os.sep):
+            return filename[len(path) + 1:]
+    return filename
+
+
+def _frame_label(code) -> str:
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse_frame(frame) -> str:
+    """Collapses a thread stack into root-first `a;b;c` form."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels)
+
+
+def _collapse_task(task: asyncio.Task) -> Optional[str]:
+    """Follows a task's await chain from its coroutine down to the innermost await."""
+    labels = []
+    awaitable = task.get_coro()
+    while awaitable is not None and len(labels) < 128:
+        frame = (
+            getattr(awaitable, "cr_frame", None)
+            or getattr(awaitable, "ag_frame", None)
+            or getattr(awaitable, "gi_frame", None)
+        )
+        if frame is None:
+            if isinstance(awaitable, asyncio.Future):
+                labels.append(type(awaitable).__name__)
+            break
+        labels.append(_frame_label(frame.f_code))
+        awaitable = (
+            getattr(awaitable, "cr_await", None)
+            or getattr(awaitable, "ag_await", None)
+            or getattr(awaitable, "gi_yieldfrom", None)
+        )
+    return ";".join(labels) if labels else None
+
+
+def _render_collapsed(counts: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+class _StackSampler(threading.Thread):
+    """Samples one thread's stack every `interval` seconds from a daemon thread."""
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.counts[_collapse_frame(frame)] += 1
+                self.samples += 1
+                del frame
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _log_task_error(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Profile capture failed: %s", task.exception())
+
+
+class ProfileInProgressError(RuntimeError):
+    pass
+
+
+class Profiler:
+    """Time-bounded CPU, asyncio task and memory profiler; one capture at a time."""
+
+    def __init__(
+        self,
+        output_dir: str = "log/profiles",
+        default_seconds: float = 10,
+        max_seconds: float = 120,
+        sample_interval: float = 0.005,
+        task_sample_interval: float = 0.05,
+        tracemalloc_frames: int = 10,
+        top: int = 30,
+    ):
+        self.output_dir = output_dir
+        self.default_seconds = default_seconds
+        self.max_seconds = max_seconds
+        self.sample_interval = sample_interval
+        self.task_sample_interval = task_sample_interval
+        self.tracemalloc_frames = tracemalloc_frames
+        self.top = top
+        self._running = False
+        self._signal_task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    async def capture(
+        self,
+        seconds: Optional[float] = None,
+        mode: str = "sample",
+        memory: bool = True,
+    ) -> dict[str, Any]:
+        """Profiles the current event loop for `seconds` and writes the artifacts.
+
+        Returns a JSON-serializable summary with the artifact paths, the hottest
+        stacks and the top allocation sites. Raises ProfileInProgressError if a
+        capture is already running and ValueError for invalid arguments.
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        seconds = self.default_seconds if seconds is None else float(seconds)
+        if not 0 < seconds <= self.max_seconds:
+            raise ValueError(f"seconds must be in (0, {self.max_seconds}]")
+        if self._running:
+            raise ProfileInProgressError("A profile capture is already running")
+
+        self._running = True
+        try:
+            return await self._capture(seconds, mode, memory)
+        finally:
+            self._running = False
+
+    async def _capture(self, seconds: float, mode: str, memory: bool) -> dict[str, Any]:
+        directory = os.path.join(
+            self.output_dir,
+            time.strftime("%Y%m%d-%H%M%S") + f"{time.time() % 1:.3f}"[1:] + f"-{os.getpid()}",
+        )
+        os.makedirs(directory, exist_ok=True)
+        files: dict[str, str] = {}
+        summary: dict[str, Any] = {"seconds": seconds, "mode": mode, "directory": directory}
+
+        sampler = None
+        profile = None
+        if mode == "sample":
+            sampler = _StackSampler(threading.get_ident(), self.sample_interval)
+            sampler.start()
+        else:
+            profile = cProfile.Profile()
+            profile.enable()
+
+        started_tracemalloc = False
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start(self.tracemalloc_frames)
+            started_tracemalloc = True
+
+        task_counts: Counter = Counter()
+        current = asyncio.current_task()
+        deadline = time.monotonic() + seconds
+        try:
+            while (remaining := deadline - time.monotonic()) > 0:
+                await asyncio.sleep(min(self.task_sample_interval, remaining))
+                for task in asyncio.all_tasks():
+                    if task is not current:
+                        stack = _collapse_task(task)
+                        if stack:
+                            task_counts[stack] += 1
+        except BaseException:
+            if started_tracemalloc:
+                tracemalloc.stop()
+            raise
+        finally:
+            if sampler is not None:
+                sampler.stop()
+            if profile is not None:
+                profile.disable()
+
+        if sampler is not None:
+            files["cpu"] = self._write(directory, "cpu.collapsed", _render_collapsed(sampler.counts))
+            summary["samples"] = sampler.samples
+            summary["top_stacks"] = [
+                {"stack": stack.rsplit(";", 3)[-3:], "samples": count}
+                for stack, count in sampler.counts.most_common(self.top)
+            ]
+        else:
+            files["pstats"] = os.path.join(directory, "cpu.pstats")
+            profile.dump_stats(files["pstats"])
+            text = io.StringIO()
+            pstats.Stats(profile, stream=text).sort_stats("cumulative").print_stats(self.top)
+            files["pstats_text"] = self._write(directory, "cpu.txt", text.getvalue())
+
+        files["tasks"] = self._write(directory, "tasks.collapsed", _render_collapsed(task_counts))
+        summary["top_task_stacks"] = [
+            {"stack": stack.rsplit(";", 3)[-3:], "samples": count}
+            for stack, count in task_counts.most_common(self.top)
+        ]
+
+        if memory:
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ))
+            if started_tracemalloc:
+                tracemalloc.stop()
+            files["tracemalloc"] = os.path.join(directory, "memory.tracemalloc")
+            snapshot.dump(files["tracemalloc"])
+            stats = snapshot.statistics("lineno")[: self.top]
+            files["tracemalloc_text"] = self._write(
+                directory, "memory.txt", "".join(f"{stat}\n" for stat in stats)
+            )
+            summary["top_allocations"] = [
+                {"location": str(stat.traceback[0]), "size": stat.size, "count": stat.count}
+                for stat in stats
+            ]
+
+        summary["files"] = files
+        logger.info("Profile captured (%s, %.1fs): %s", mode, seconds, directory)
+        return summary
+
+    @staticmethod
+    def _write(directory: str, name: str, content: str) -> str:
+        path = os.path.join(directory, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return path
+
+    def install_signal_handler(self, signum: int = getattr(signal, "SIGUSR2", 0)) -> bool:
+        """Captures a default-length profile whenever the process receives `signum`.
+
+        Must be called from the running event loop. Returns False where signal
+        handlers on the loop are unsupported (e.g. Windows).
+        """
+        loop = asyncio.get_running_loop()
+
+        def on_signal():
+            if self._running:
+                logger.warning("Ignoring profiling signal, a capture is already running")
+                return
+            logger.info("Profiling signal received, capturing %.1fs", self.default_seconds)
+            self._signal_task = loop.create_task(self.capture())
+            self._signal_task.add_done_callback(_log_task_error)
+
+        try:
+            loop.add_signal_handler(signum, on_signal)
+        except (NotImplementedError, RuntimeError, ValueError):
+            logger.warning("Signal-triggered profiling is not supported on this platform")
+            return False
+        return True
@@ -4,34 +4,54 @@ from jwcrypto import jwk
 import uuid
 from starlette.responses import JSONResponse
 from starlette.requests import Request
-from typing import Any
+from typing import Any, Optional
 
 import jwt
 import time
 import json
 import hashlib
 import httpx
+import asyncio
 import logging
 
-from jwt import PyJWK, PyJWKClient
+from jwt import PyJWK, PyJWKSet, PyJWKClientError
+
+from common.utils.metrics import REGISTRY
+from common.utils.tracing import TRACER, SpanKind
 
 logger = logging.getLogger(__name__)
 AUTH_HEADER_PREFIX = 'Bearer '
 
+PUSH_NOTIFICATIONS = REGISTRY.counter(
+    "a2a_push_notifications", "Push notifications sent, by outcome", ["outcome"]
+)
+PUSH_NOTIFICATION_DURATION = REGISTRY.histogram(
+    "a2a_push_notification_duration_seconds", "Latency of push notification delivery"
+)
+
 class PushNotificationAuth:
-    def _calculate_request_body_sha256(self, data: dict[str, Any]):
-        """Calculates the SHA256 hash of a request body.
+    @staticmethod
+    def _serialize_request_body(data: dict[str, Any]) -> bytes:
+        """Serializes a request body into the canonical bytes that get signed and sent.
 
         This logic needs to be same for both the agent who signs the payload and the client verifier.
         """
-        body_str = json.dumps(
+        return json.dumps(
             data,
             ensure_ascii=False,
             allow_nan=False,
             indent=None,
             separators=(",", ":"),
-        )
-        return hashlib.sha256(body_str.encode()).hexdigest()
+        ).encode()
+
+    @staticmethod
+    def _calculate_raw_body_sha256(body: bytes) -> str:
+        """Calculates the SHA256 hash of the raw request body bytes."""
+        return hashlib.sha256(body).hexdigest()
+
+    def _calculate_request_body_sha256(self, data: dict[str, Any]):
+        """Calculates the SHA256 hash of a request body."""
+        return self._calculate_raw_body_sha256(self._serialize_request_body(data))
 
 class PushNotificationSenderAuth(PushNotificationAuth):
     def __init__(self):
@@ -50,7 +70,7 @@ class PushNotificationSenderAuth(PushNotificationAuth):
                 response.raise_for_status()
                 is_verified = response.text == validation_token
 
-                logger.info(f"Verified push-notification URL: {url} => {is_verified}")            
+                logger.info("Verified push-notification URL: %s => %s", url, is_verified)            
                 return is_verified                
             except Exception as e:
                 logger.warning(f"Error during sending push-notification for URL {url}: {e}")
@@ -75,56 +95,185 @@ class PushNotificationSenderAuth(PushNotificationAuth):
         Payload is signed with private key and it ensures the integrity of payload for client.
         Including iat prevents from replay attack.
         """
-        
+        return self._generate_jwt_for_body(self._serialize_request_body(data))
+
+    def _generate_jwt_for_body(self, body: bytes):
+        """Signs the digest of already serialized body bytes, see `_generate_jwt`."""
         iat = int(time.time())
 
         return jwt.encode(
-            {"iat": iat, "request_body_sha256": self._calculate_request_body_sha256(data)},
+            {"iat": iat, "request_body_sha256": self._calculate_raw_body_sha256(body)},
             key=self.private_key_jwk,
             headers={"kid": self.private_key_jwk.key_id},
             algorithm="RS256"
         )
 
     async def send_push_notification(self, url: str, data: dict[str, Any]):
-        jwt_token = self._generate_jwt(data)
-        headers = {'Authorization': f"Bearer {jwt_token}"}
-        async with httpx.AsyncClient(timeout=10) as client: 
+        # Serialize once and send exactly the bytes that were hashed, so the
+        # receiver can verify the digest over the raw body without re-encoding.
+        body = self._serialize_request_body(data)
+        jwt_token = self._generate_jwt_for_body(body)
+        headers = {
+            'Authorization': f"Bearer {jwt_token}",
+            'Content-Type': "application/json",
+        }
+        started = time.perf_counter()
+        with TRACER.span(
+            "push_notification.send", SpanKind.CLIENT, {"http.url": url}
+        ) as span:
+            TRACER.inject(headers, span)
+            async with httpx.AsyncClient(timeout=10) as client:
+                try:
+                    response = await client.post(
+                        url,
+                        content=body,
+                        headers=headers
+                    )
+                    span.set_attribute("http.status_code", response.status_code)
+                    response.raise_for_status()
+                    PUSH_NOTIFICATIONS.labels(outcome="sent").inc()
+                    logger.info("Push-notification sent for URL: %s", url)
+                except httpx.HTTPStatusError as e:
+                    PUSH_NOTIFICATIONS.labels(outcome="rejected").inc()
+                    span.set_status(False, str(e))
+                    logger.warning(f"Error during sending push-notification for URL {url}: {e}")
+                except Exception as e:
+                    PUSH_NOTIFICATIONS.labels(outcome="failed").inc()
+                    span.record_exception(e)
+                    logger.warning(f"Error during sending push-notification for URL {url}: {e}")
+                finally:
+                    PUSH_NOTIFICATION_DURATION.observe(time.perf_counter() - started)
+
+class JWKSCache:
+    """Async, kid-indexed cache of a remote JWKS document.
+
+    Keys are fetched with a non-blocking client and refreshed in the background, so
+    verification never waits on the network for a known kid. A token signed with an
+    unknown kid (e.g. after the sender rotated its key) triggers an immediate refetch,
+    rate limited to one per `min_refetch_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        jwks_url: str,
+        refresh_interval: float = 300,
+        min_refetch_interval: float = 30,
+        timeout: float = 10,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.jwks_url = jwks_url
+        self.refresh_interval = refresh_interval
+        self.min_refetch_interval = min_refetch_interval
+        self.timeout = timeout
+        self.transport = transport
+        self.keys: dict[str, PyJWK] = {}
+        self._last_fetch: float = 0.0
+        self._fetch_lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Fetches the key set once and starts the background refresh loop."""
+        await self.refresh()
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
             try:
-                response = await client.post(
-                    url,
-                    json=data,
-                    headers=headers
-                )
-                response.raise_for_status()
-                logger.info(f"Push-notification sent for URL: {url}")                            
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    async def refresh(self):
+        """Fetches the JWKS document and swaps in the new key index."""
+        async with self._fetch_lock:
+            await self._fetch()
+
+    async def _fetch(self):
+        self._last_fetch = time.monotonic()
+        async with httpx.AsyncClient(timeout=self.timeout, transport=self.transport) as client:
+            response = await client.get(self.jwks_url)
+            response.raise_for_status()
+            jwk_set = PyJWKSet.from_dict(response.json())
+
+        # Replace the whole dict at once; readers never see a partial index.
+        self.keys = {key.key_id: key for key in jwk_set.keys if key.key_id}
+        logger.debug("Loaded %d signing keys from %s", len(self.keys), self.jwks_url)
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
             except Exception as e:
-                logger.warning(f"Error during sending push-notification for URL {url}: {e}")
+                # Keep serving the previously loaded keys until the next attempt.
+                logger.warning(f"Error while refreshing JWKS from {self.jwks_url}: {e}")
+
+    async def get_signing_key(self, kid: str) -> PyJWK:
+        key = self.keys.get(kid)
+        if key is not None:
+            return key
+
+        async with self._fetch_lock:
+            # Another waiter may already have fetched the key set.
+            key = self.keys.get(kid)
+            if key is None and time.monotonic() - self._last_fetch >= self.min_refetch_interval:
+                await self._fetch()
+                key = self.keys.get(kid)
+
+        if key is None:
+            raise PyJWKClientError(f'Unable to find a signing key that matches: "{kid}"')
+        return key
 
 class PushNotificationReceiverAuth(PushNotificationAuth):
     def __init__(self):
         self.public_keys_jwks = []
-        self.jwks_client = None
+        self.jwks_cache: Optional[JWKSCache] = None
 
-    async def load_jwks(self, jwks_url: str):
-        self.jwks_client = PyJWKClient(jwks_url)
+    async def load_jwks(
+        self,
+        jwks_url: str,
+        refresh_interval: float = 300,
+        min_refetch_interval: float = 30,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        if self.jwks_cache is not None:
+            await self.jwks_cache.close()
+        self.jwks_cache = JWKSCache(
+            jwks_url,
+            refresh_interval=refresh_interval,
+            min_refetch_interval=min_refetch_interval,
+            transport=transport,
+        )
+        await self.jwks_cache.start()
+
+    async def close(self):
+        if self.jwks_cache is not None:
+            await self.jwks_cache.close()
     
     async def verify_push_notification(self, request: Request) -> bool:
         auth_header = request.headers.get("Authorization")
         if not auth_header or not auth_header.startswith(AUTH_HEADER_PREFIX):
-            print("Invalid authorization header")
+            logger.warning("Invalid authorization header")
+            return False
+        if self.jwks_cache is None:
+            logger.warning("No JWKS loaded, call load_jwks() before verifying push notifications")
             return False
         
         token = auth_header[len(AUTH_HEADER_PREFIX):]
-        signing_key = self.jwks_client.get_signing_key_from_jwt(token)
+        kid = jwt.get_unverified_header(token).get("kid")
+        signing_key = await self.jwks_cache.get_signing_key(kid)
 
         decode_token = jwt.decode(
             token,
-            signing_key,
+            signing_key.key,
             options={"require": ["iat", "request_body_sha256"]},
             algorithms=["RS256"],
         )
 
-        actual_body_sha256 = self._calculate_request_body_sha256(await request.json())
+        actual_body_sha256 = self._calculate_raw_body_sha256(await request.body())
         if actual_body_sha256 != decode_token["request_body_sha256"]:
             # Payload signature does not match the digest in signed token.
             raise ValueError("Invalid request body")
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Single-flight deduplication of identical in-flight calls.
+
+`SingleFlight.do(key, fn)` runs `fn()` once for all callers that ask for the
+same key while a call is in flight; every caller gets the same result (or
+exception). `SingleFlight.stream(key, factory)` does the same for async
+generators: one upstream generator is consumed by a background task and its
+items are fanned out to every subscriber.
+
+Streams are assumed to yield cumulative snapshots (each item supersedes the
+previous one, as with the accumulated answers of a RagFlow completion), so a
+subscriber that joins late or falls behind receives the latest item instead
+of a backlog. The last item is always delivered.
+
+The shared work keeps running while at least one caller is waiting for it and
+is cancelled when the last one goes away. Must be used from a single event
+loop.
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable, Tuple
+
+from common.utils.metrics import REGISTRY
+
+SINGLE_FLIGHT_REQUESTS = REGISTRY.counter(
+    "single_flight_requests",
+    "Calls by role: leader (started the shared call) or follower (joined one)",
+    ["name", "kind", "role"],
+)
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _Stream:
+    def __init__(self):
+        self.task: asyncio.Task | None = None
+        self.subscribers = 0
+        self.item: Any = None
+        self.seq = 0
+        self.done = False
+        self.error: BaseException | None = None
+        self._changed = asyncio.get_running_loop().create_future()
+
+    def publish(self, item: Any):
+        self.item = item
+        self.seq += 1
+        self._notify()
+
+    def finish(self, error: BaseException | None = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    def _notify(self):
+        if not self._changed.done():
+            self._changed.set_result(None)
+        self._changed = asyncio.get_running_loop().create_future()
+
+    async def wait(self):
+        # Shielded so that a cancelled subscriber does not cancel the shared future
+        await asyncio.shield(self._changed)
+
+
+class SingleFlight:
+    def __init__(self, name: str = "default"):
+        self.name = name
+        self._calls: dict[Hashable, _Call] = {}
+        self._streams: dict[Hashable, _Stream] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Returns `(result, shared)`; `shared` is True if another caller started the call."""
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            call = self._calls[key] = _Call(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(lambda _, key=key, call=call: self._forget(self._calls, key, call))
+        SINGLE_FLIGHT_REQUESTS.labels(self.name, "call", "follower" if shared else "leader").inc()
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+    async def stream(
+        self, key: Hashable, factory: Callable[[], AsyncIterator[Any]]
+    ) -> AsyncIterator[Tuple[Any, bool]]:
+        """Yields `(item, shared)` from the one upstream generator for `key`."""
+        state = self._streams.get(key)
+        shared = state is not None
+        if state is None:
+            state = self._streams[key] = _Stream()
+            state.task = asyncio.ensure_future(self._pump(key, state, factory))
+        SINGLE_FLIGHT_REQUESTS.labels(self.name, "stream", "follower" if shared else "leader").inc()
+
+        state.subscribers += 1
+        seen = 0
+        try:
+            while True:
+                if state.seq > seen:
+                    seen = state.seq
+                    yield state.item, shared
+                    continue
+                if state.done:
+                    if state.error is not None:
+                        raise state.error
+                    return
+                await state.wait()
+        finally:
+            state.subscribers -= 1
+            if state.subscribers == 0 and not state.done:
+                state.task.cancel()
+
+    async def _pump(self, key: Hashable, state: _Stream, factory: Callable[[], AsyncIterator[Any]]):
+        source = factory()
+        try:
+            async for item in source:
+                state.publish(item)
+            state.finish()
+        except asyncio.CancelledError:
+            state.finish(asyncio.CancelledError())
+            raise
+        except Exception as e:
+            state.finish(e)
+        finally:
+            self._forget(self._streams, key, state)
+            await source.aclose()
+
+    @staticmethod
+    def _forget(registry: dict, key: Hashable, value: Any):
+        # A finished flight must not be joined by new callers
+        if registry.get(key) is value:
+            del registry[key]
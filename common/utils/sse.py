@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Incremental decoder for `text/event-stream` responses.
+
+`SSEDecoder` follows the WHATWG event stream format: it is fed raw byte chunks
+as they arrive and returns the events completed by each chunk. It handles
+`\\r\\n`, `\\r` and `\\n` line endings (also split across chunks), multi-line
+`data:` fields, comments, `event:`, `id:` and `retry:`, and UTF-8 sequences
+split across chunks. Bytes are scanned once: a partial line carried over
+to the next chunk is not searched again for a line ending.
+
+    decoder = SSEDecoder()
+    async for chunk in response.aiter_bytes():
+        for event in decoder.feed(chunk):
+            payload = json_loads(event.data)
+    for event in decoder.flush():
+        ...
+
+With `raw_data=True` the `data` of each event is left as UTF-8 bytes, for
+callers that only look into part of large payloads (`json_loads` takes bytes
+too).
+
+`json_loads` uses orjson when it is installed and falls back to the standard
+library otherwise.
+"""
+
+import json
+from typing import List, Optional, Union
+
+try:
+    import orjson  # optional, several times faster on large payloads
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def json_loads(data):
+    """Decodes JSON from str or bytes; raises ValueError on invalid input."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class ServerSentEvent:
+    __slots__ = ("event", "data", "id", "retry")
+
+    def __init__(self, event: str = "message", data: Union[str, bytes] = "", id: str = "",
+                 retry: Optional[int] = None):
+        self.event = event
+        self.data = data
+        self.id = id
+        self.retry = retry
+
+    def json(self):
+        return json_loads(self.data)
+
+    def __eq__(self, other):
+        if not isinstance(other, ServerSentEvent):
+            return NotImplemented
+        return (self.event, self.data, self.id, self.retry) == (other.event, other.data, other.id, other.retry)
+
+    def __repr__(self):
+        return f"ServerSentEvent(event={self.event!r}, data={self.data!r}, id={self.id!r}, retry={self.retry!r})"
+
+
+class SSEDecoder:
+    def __init__(self, raw_data: bool = False):
+        self.raw_data = raw_data
+        self._buffer = bytearray()
+        self._scanned = 0          # bytes of the buffer already known to hold no line ending
+        self._started = False      # whether the leading BOM check has been done
+        self._data: list = []
+        self._event = ""
+        self._has_data = False
+        self.last_event_id = ""
+        self.retry: Optional[int] = None
+
+    def feed(self, chunk: bytes) -> List[ServerSentEvent]:
+        """Adds a chunk and returns the events it completed."""
+        buffer = self._buffer
+        buffer += chunk
+        if not self._started:
+            if len(buffer) < 3 and b"\xef\xbb\xbf".startswith(bytes(buffer)):
+                return []
+            self._started = True
+            if buffer.startswith(b"\xef\xbb\xbf"):
+                del buffer[:3]
+
+        events: List[ServerSentEvent] = []
+        end = len(buffer)
+        has_cr = buffer.find(b"\r", self._scanned) >= 0
+        pos = 0
+        search = self._scanned
+        while True:
+            lf = buffer.find(b"\n", search)
+            cr = buffer.find(b"\r", search, lf if lf >= 0 else end) if has_cr else -1
+            if cr >= 0:
+                if cr + 1 == end:
+                    # A trailing \r may be the first half of \r\n
+                    break
+                line_end, next_pos = cr, cr + 2 if buffer[cr + 1] == 0x0A else cr + 1
+            elif lf >= 0:
+                line_end, next_pos = lf, lf + 1
+            else:
+                break
+            self._process_line(buffer, pos, line_end, events)
+            pos = search = next_pos
+
+        if pos:
+            del buffer[:pos]
+        self._scanned = len(buffer) - 1 if buffer.endswith(b"\r") else len(buffer)
+        return events
+
+    def flush(self) -> List[ServerSentEvent]:
+        """Ends the stream, returning an event left without a closing blank line.
+
+        The format says such an event is discarded; it is dispatched instead
+        because some servers close the stream right after the last `data:`.
+        """
+        events: List[ServerSentEvent] = []
+        if self._buffer:
+            end = len(self._buffer) - 1 if self._buffer.endswith(b"\r") else len(self._buffer)
+            self._process_line(self._buffer, 0, end, events)
+            self._buffer.clear()
+        self._scanned = 0
+        self._dispatch(events)
+        return events
+
+    def _process_line(self, buffer: bytearray, start: int, end: int, events: List[ServerSentEvent]):
+        if start == end:
+            self._dispatch(events)
+            return
+        # Fast path for the common "data: ..." line
+        if buffer.startswith(b"data:", start, end):
+            value_start = start + 6 if end > start + 5 and buffer[start + 5] == 0x20 else start + 5
+            value = buffer[value_start:end]
+            self._data.append(bytes(value) if self.raw_data else value.decode("utf-8", "replace"))
+            self._has_data = True
+            return
+        if buffer[start] == 0x3A:  # ":" starts a comment
+            return
+
+        line = buffer[start:end].decode("utf-8", "replace")
+        field, colon, value = line.partition(":")
+        if colon and value.startswith(" "):
+            value = value[1:]
+        if field == "data":
+            self._data.append(value.encode("utf-8") if self.raw_data else value)
+            self._has_data = True
+        elif field == "event":
+            self._event = value
+        elif field == "id":
+            if "\0" not in value:
+                self.last_event_id = value
+        elif field == "retry":
+            if value and value.isascii() and value.isdigit():
+                self.retry = int(value)
+
+    def _dispatch(self, events: List[ServerSentEvent]):
+        if not self._has_data:
+            self._event = ""
+            return
+        if len(self._data) == 1:
+            data = self._data[0]
+        else:
+            data = (b"\n" if self.raw_data else "\n").join(self._data)
+        events.append(ServerSentEvent(self._event or "message", data, self.last_event_id, self.retry))
+        self._data = []
+        self._event = ""
+        self._has_data = False
@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Lightweight tracing with W3C trace context and OTLP/JSON export.
+
+Tracing is disabled until `TRACER.configure()` (or `configure_tracing_from_env()`)
+installs an exporter; until then every span is a shared no-op object, so the
+instrumentation left in the hot paths costs a function call and an attribute
+check. Finished spans are handed to a background thread that batches them and
+writes OTLP/JSON, either to a local file or to an OpenTelemetry collector's
+OTLP/HTTP endpoint.
+"""
+
+import atexit
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Mapping, MutableMapping, NamedTuple, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_HEADER = "traceparent"
+INSTRUMENTATION_SCOPE = "kbs_agent_a2a"
+
+
+class SpanKind(IntEnum):
+    """OTLP span kinds."""
+
+    INTERNAL = 1
+    SERVER = 2
+    CLIENT = 3
+
+
+class SpanContext(NamedTuple):
+    trace_id: str
+    span_id: str
+    sampled: bool = True
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[SpanContext]:
+    """Parses a W3C `traceparent` header, returns None if it is missing or invalid."""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) < 4:
+        return None
+    version, trace_id, span_id, flags = parts[:4]
+    try:
+        if len(version) != 2 or version == "ff" or len(flags) != 2:
+            return None
+        if len(trace_id) != 32 or int(trace_id, 16) == 0:
+            return None
+        if len(span_id) != 16 or int(span_id, 16) == 0:
+            return None
+        sampled = bool(int(flags, 16) & 1)
+    except ValueError:
+        return None
+    return SpanContext(trace_id.lower(), span_id.lower(), sampled)
+
+
+def _attribute_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _attributes(attributes: Mapping[str, Any]) -> list[dict[str, Any]]:
+    return [{"key": key, "value": _attribute_value(value)} for key, value in attributes.items()]
+
+
+class Span:
+    """A span being recorded. Use `Tracer.span()` rather than creating it directly."""
+
+    def __init__(
+        self,
+        tracer: "Tracer",
+        name: str,
+        context: SpanContext,
+        parent_span_id: Optional[str],
+        kind: SpanKind,
+        attributes: Optional[Mapping[str, Any]],
+    ):
+        self._tracer = tracer
+        self.name = name
+        self.context = context
+        self.parent_span_id = parent_span_id
+        self.kind = kind
+        self.attributes: dict[str, Any] = dict(attributes or {})
+        self.events: list[dict[str, Any]] = []
+        self.status_code = 0  # UNSET
+        self.status_message = ""
+        self.start_time_ns = time.time_ns()
+        self.end_time_ns: Optional[int] = None
+
+    @property
+    def recording(self) -> bool:
+        return self.end_time_ns is None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.context.trace_id}-{self.context.span_id}-{'01' if self.context.sampled else '00'}"
+
+    def update_name(self, name: str):
+        self.name = name
+
+    def set_attribute(self, key: str, value: Any):
+        if value is not None:
+            self.attributes[key] = value
+
+    def add_event(self, name: str, attributes: Optional[Mapping[str, Any]] = None):
+        self.events.append({
+            "timeUnixNano": str(time.time_ns()),
+            "name": name,
+            "attributes": _attributes(attributes or {}),
+        })
+
+    def set_status(self, ok: bool, message: str = ""):
+        self.status_code = 1 if ok else 2
+        self.status_message = message
+
+    def record_exception(self, exc: BaseException):
+        self.add_event("exception", {
+            "exception.type": type(exc).__name__,
+            "exception.message": str(exc),
+        })
+        self.set_status(False, str(exc) or type(exc).__name__)
+
+    def end(self):
+        if self.end_time_ns is not None:
+            return
+        self.end_time_ns = time.time_ns()
+        if self.context.sampled:
+            self._tracer._on_end(self)
+
+    def to_otlp(self) -> dict[str, Any]:
+        span = {
+            "traceId": self.context.trace_id,
+            "spanId": self.context.span_id,
+            "name": self.name,
+            "kind": int(self.kind),
+            "startTimeUnixNano": str(self.start_time_ns),
+            "endTimeUnixNano": str(self.end_time_ns or time.time_ns()),
+            "attributes": _attributes(self.attributes),
+            "events": self.events,
+            "status": {"code": self.status_code, "message": self.status_message},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+class _NoopSpan:
+    """Stand-in used while tracing is disabled; every method does nothing."""
+
+    recording = False
+    traceparent = None
+    context = None
+
+    def update_name(self, name: str):
+        pass
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def add_event(self, name: str, attributes: Optional[Mapping[str, Any]] = None):
+        pass
+
+    def set_status(self, ok: bool, message: str = ""):
+        pass
+
+    def record_exception(self, exc: BaseException):
+        pass
+
+    def end(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class _SpanScope:
+    """Context manager that makes a span current and ends it on exit."""
+
+    __slots__ = ("span", "_token", "_end")
+
+    def __init__(self, span: Span, end: bool = True):
+        self.span = span
+        self._end = end
+        self._token = None
+
+    def __enter__(self) -> Span:
+        self._token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _current_span.reset(self._token)
+        if exc_value is not None:
+            self.span.record_exception(exc_value)
+        if self._end:
+            self.span.end()
+        return False
+
+
+class FileSpanExporter:
+    """Appends one OTLP/JSON ExportTraceServiceRequest per batch to a file (JSON lines)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, payload: dict[str, Any]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(payload, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def shutdown(self):
+        pass
+
+
+class OTLPHttpSpanExporter:
+    """Posts OTLP/JSON to an OpenTelemetry collector (`<endpoint>/v1/traces`)."""
+
+    def __init__(self, endpoint: str, headers: Optional[Mapping[str, str]] = None, timeout: float = 10):
+        endpoint = endpoint.rstrip("/")
+        self.url = endpoint if endpoint.endswith("/v1/traces") else endpoint + "/v1/traces"
+        self.client = httpx.Client(timeout=timeout, headers=dict(headers or {}))
+
+    def export(self, payload: dict[str, Any]):
+        response = self.client.post(self.url, json=payload)
+        response.raise_for_status()
+
+    def shutdown(self):
+        self.client.close()
+
+
+class BatchSpanProcessor:
+    """Queues finished spans and exports them in batches from a daemon thread.
+
+    Spans are dropped (and counted) when the queue is full, so a slow or
+    unreachable collector never blocks request handling.
+    """
+
+    def __init__(
+        self,
+        exporter,
+        resource_attributes: Mapping[str, Any],
+        max_queue_size: int = 4096,
+        max_batch_size: int = 512,
+        schedule_delay: float = 2.0,
+    ):
+        self.exporter = exporter
+        self.resource_attributes = dict(resource_attributes)
+        self.max_batch_size = max_batch_size
+        self.schedule_delay = schedule_delay
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def on_end(self, span: Span):
+        try:
+            self._queue.put_nowait(span.to_otlp())
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self) -> list[dict[str, Any]]:
+        batch = []
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _export(self, batch: list[dict[str, Any]]):
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": _attributes(self.resource_attributes)},
+                "scopeSpans": [{"scope": {"name": INSTRUMENTATION_SCOPE}, "spans": batch}],
+            }]
+        }
+        try:
+            self.exporter.export(payload)
+        except Exception as e:
+            logger.warning("Exporting %d spans failed: %s", len(batch), e)
+
+    def _run(self):
+        while not self._stopped.wait(self.schedule_delay):
+            while batch := self._drain():
+                self._export(batch)
+
+    def shutdown(self):
+        self._stopped.set()
+        self._thread.join(timeout=self.schedule_delay + 5)
+        while batch := self._drain():
+            self._export(batch)
+        self.exporter.shutdown()
+
+
+class Tracer:
+    def __init__(self):
+        self.processor: Optional[BatchSpanProcessor] = None
+        self.sample_ratio = 1.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.processor is not None
+
+    def configure(
+        self,
+        exporter,
+        service_name: str = "kbs-agent-a2a",
+        sample_ratio: float = 1.0,
+        resource_attributes: Optional[Mapping[str, Any]] = None,
+        **processor_options,
+    ):
+        """Enables tracing with `exporter` (FileSpanExporter or OTLPHttpSpanExporter)."""
+        self.shutdown()
+        self.sample_ratio = sample_ratio
+        self.processor = BatchSpanProcessor(
+            exporter,
+            {"service.name": service_name, **(resource_attributes or {})},
+            **processor_options,
+        )
+
+    def shutdown(self):
+        """Flushes queued spans and disables tracing."""
+        processor, self.processor = self.processor, None
+        if processor is not None:
+            processor.shutdown()
+
+    def _on_end(self, span: Span):
+        processor = self.processor
+        if processor is not None:
+            processor.on_end(span)
+
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+
+    def start_span(
+        self,
+        name: str,
+        kind: SpanKind = SpanKind.INTERNAL,
+        attributes: Optional[Mapping[str, Any]] = None,
+        parent: Optional[SpanContext] = None,
+    ) -> Span | _NoopSpan:
+        """Starts a span without making it current; the caller must call `end()`.
+
+        The parent is `parent` if given, otherwise the current span. Useful for
+        async generators, which must not change the consumer's current span.
+        """
+        if self.processor is None:
+            return NOOP_SPAN
+        if parent is None:
+            current = _current_span.get()
+            parent = current.context if current is not None else None
+
+        if parent is not None:
+            context = SpanContext(parent.trace_id, _new_span_id(), parent.sampled)
+            parent_span_id = parent.span_id
+        else:
+            sampled = self.sample_ratio >= 1 or random.random() < self.sample_ratio
+            context = SpanContext(_new_trace_id(), _new_span_id(), sampled)
+            parent_span_id = None
+        return Span(self, name, context, parent_span_id, kind, attributes)
+
+    def span(
+        self,
+        name: str,
+        kind: SpanKind = SpanKind.INTERNAL,
+        attributes: Optional[Mapping[str, Any]] = None,
+        parent: Optional[SpanContext] = None,
+    ):
+        """Context manager that starts a span, makes it current and ends it on exit."""
+        if self.processor is None:
+            return NOOP_SPAN
+        return _SpanScope(self.start_span(name, kind, attributes, parent))
+
+    def use_span(self, span: Span | _NoopSpan):
+        """Makes an already started span current without ending it on exit."""
+        if isinstance(span, _NoopSpan):
+            return NOOP_SPAN
+        return _SpanScope(span, end=False)
+
+    def inject(
+        self, headers: MutableMapping[str, str], span: Optional[Span | _NoopSpan] = None
+    ) -> MutableMapping[str, str]:
+        """Adds the `traceparent` header for `span` (default: the current span)."""
+        if span is None:
+            span = _current_span.get()
+        if span is not None and span.traceparent:
+            headers[TRACEPARENT_HEADER] = span.traceparent
+        return headers
+
+    @staticmethod
+    def extract(headers: Mapping[str, str]) -> Optional[SpanContext]:
+        """Reads the remote parent from incoming request headers."""
+        return parse_traceparent(headers.get(TRACEPARENT_HEADER))
+
+
+def _new_trace_id() -> str:
+    return f"{random.getrandbits(128) or 1:032x}"
+
+
+def _new_span_id() -> str:
+    return f"{random.getrandbits(64) or 1:016x}"
+
+
+TRACER = Tracer()
+atexit.register(TRACER.shutdown)
+
+
+def traced(name: str, kind: SpanKind = SpanKind.INTERNAL, **attributes):
+    """Decorator that runs an async function inside a span."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if TRACER.processor is None:
+                return await func(*args, **kwargs)
+            with TRACER.span(name, kind, attributes):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def configure_tracing_from_env() -> bool:
+    """Enables tracing from environment variables, returns whether it is enabled.
+
+    TRACING_EXPORTER        "file" or "otlp"; anything else leaves tracing disabled
+    TRACING_FILE            output file for the file exporter (default log/traces.jsonl)
+    OTEL_EXPORTER_OTLP_ENDPOINT  collector base URL (default http://localhost:4318)
+    OTEL_SERVICE_NAME       service.name resource attribute (default kbs-agent-a2a)
+    TRACING_SAMPLE_RATIO    fraction of new traces to record (default 1.0)
+    """
+    exporter_name = os.environ.get("TRACING_EXPORTER", "").lower()
+    if exporter_name == "file":
+        exporter = FileSpanExporter(os.environ.get("TRACING_FILE", "log/traces.jsonl"))
+    elif exporter_name == "otlp":
+        exporter = OTLPHttpSpanExporter(
+            os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318")
+        )
+    else:
+        return False
+
+    TRACER.configure(
+        exporter,
+        service_name=os.environ.get("OTEL_SERVICE_NAME", "kbs-agent-a2a"),
+        sample_ratio=float(os.environ.get("TRACING_SAMPLE_RATIO", "1.0")),
+    )
+    logger.info("Tracing enabled, exporting spans via %s", exporter_name)
+    return True
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Shared health state for calls to one upstream service.
+
+`UpstreamHealth` combines three mechanisms that only work when every request
+to the upstream shares them:
+
+- a circuit breaker: after `failure_threshold` consecutive failures the
+  circuit opens and calls fail fast with `CircuitOpenError`; after
+  `reset_timeout` one probe request is let through (half-open) and its result
+  closes or reopens the circuit;
+- a retry budget: retries may add at most `retry_ratio` extra load on top of
+  the requests seen in the last `budget_window` seconds (plus a small
+  `min_retries_per_second` allowance), so an outage cannot multiply traffic;
+- decorrelated jitter backoff, which spreads retries of concurrent requests
+  instead of retrying in lockstep, stretched to honor `Retry-After`.
+
+Time and jitter come from the injectable `clock` (default `time.monotonic`)
+and `rng` (a `random.Random`), so tests can drive them deterministically.
+
+Typical use, once per logical request::
+
+    retry = health.start_request()
+    while True:
+        health.check()                        # raises CircuitOpenError
+        response = await send()
+        if response.status_code in RETRYABLE_STATUS:
+            health.record_failure(response.status_code)
+            delay = retry.next_delay(parse_retry_after(response.headers.get("Retry-After")))
+            if delay is None:
+                break                         # attempts or budget exhausted
+            await asyncio.sleep(delay)
+            continue
+        health.record_success()
+        break
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+from common.utils.metrics import REGISTRY
+
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+CIRCUIT_STATE = REGISTRY.gauge(
+    "upstream_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ["upstream"]
+)
+CIRCUIT_REJECTED = REGISTRY.counter(
+    "upstream_circuit_rejected", "Calls rejected because the circuit was open", ["upstream"]
+)
+RETRY_DECISIONS = REGISTRY.counter(
+    "upstream_retry_decisions",
+    "Retry decisions: retried, failover, attempts_exhausted or budget_exhausted",
+    ["upstream", "decision"],
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised by `UpstreamHealth.check()` while the circuit is open."""
+
+    def __init__(self, upstream: str, retry_after: float):
+        self.upstream = upstream
+        self.retry_after = retry_after
+        super().__init__(f"Circuit for {upstream} is open, retry in {retry_after:.1f}s")
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parses a Retry-After header (delta seconds or HTTP date) into seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryBudget:
+    """Allows retries up to `ratio` of recent requests plus a per-second floor."""
+
+    def __init__(
+        self,
+        ratio: float = 0.1,
+        min_per_second: float = 1.0,
+        window: float = 10.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window = window
+        self.clock = clock
+        self._requests: deque[float] = deque()
+        self._retries: deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        cutoff = now - self.window
+        for events in (self._requests, self._retries):
+            while events and events[0] < cutoff:
+                events.popleft()
+
+    def record_request(self):
+        now = self.clock()
+        with self._lock:
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_withdraw(self) -> bool:
+        now = self.clock()
+        with self._lock:
+            self._trim(now)
+            allowed = self.min_per_second * self.window + self.ratio * len(self._requests)
+            if len(self._retries) >= allowed:
+                return False
+            self._retries.append(now)
+            return True
+
+
+class RetryState:
+    """Per-request attempt counter and backoff, created by `start_request()`."""
+
+    def __init__(self, health: "UpstreamHealth"):
+        self.health = health
+        self.attempt = 1
+        self.delay = health.base_delay
+
+    def next_delay(self, retry_after: Optional[float] = None, failover: bool = False) -> Optional[float]:
+        """Returns how long to sleep before the next attempt, or None to give up.
+
+        With `failover` the next attempt goes to another healthy host and is
+        sent right away; it still counts against the attempts and the budget.
+        """
+        health = self.health
+        if self.attempt >= health.max_attempts:
+            RETRY_DECISIONS.labels(health.name, "attempts_exhausted").inc()
+            return None
+        if not health.budget.try_withdraw():
+            RETRY_DECISIONS.labels(health.name, "budget_exhausted").inc()
+            return None
+
+        self.attempt += 1
+        if failover:
+            RETRY_DECISIONS.labels(health.name, "failover").inc()
+            return 0.0
+        # Decorrelated jitter: uniform between the base and three times the last delay
+        self.delay = min(health.max_delay, health.rng.uniform(health.base_delay, self.delay * 3))
+        delay = self.delay
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, health.max_retry_after))
+        RETRY_DECISIONS.labels(health.name, "retried").inc()
+        return delay
+
+
+class UpstreamHealth:
+    def __init__(
+        self,
+        name: str,
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 10.0,
+        max_retry_after: float = 30.0,
+        retry_ratio: float = 0.1,
+        min_retries_per_second: float = 1.0,
+        budget_window: float = 10.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 10.0,
+        budget: Optional[RetryBudget] = None,
+        clock: Callable[[], float] = time.monotonic,
+        rng: Optional[random.Random] = None,
+    ):
+        self.name = name
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.rng = rng or random.Random()
+        # Hosts of one service may share a budget (see UpstreamPool)
+        self.budget = budget or RetryBudget(retry_ratio, min_retries_per_second, budget_window, clock)
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.labels(name).set(0)
+
+    def _set_state(self, state: str):
+        self.state = state
+        CIRCUIT_STATE.labels(self.name).set(_STATE_VALUES[state])
+
+    def start_request(self) -> RetryState:
+        """Counts a new logical request towards the retry budget."""
+        self.budget.record_request()
+        return RetryState(self)
+
+    def check(self):
+        """Raises CircuitOpenError unless a call may be sent now.
+
+        In the half-open state only one probe is in flight at a time; a probe
+        that never reports back is replaced after `reset_timeout`.
+        """
+        now = self.clock()
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN:
+                remaining = self._opened_at + self.reset_timeout - now
+                if remaining > 0:
+                    CIRCUIT_REJECTED.labels(self.name).inc()
+                    raise CircuitOpenError(self.name, remaining)
+                self._set_state(HALF_OPEN)
+                self._probe_started = None
+            if self._probe_started is not None and now - self._probe_started < self.reset_timeout:
+                CIRCUIT_REJECTED.labels(self.name).inc()
+                raise CircuitOpenError(self.name, self.reset_timeout - (now - self._probe_started))
+            self._probe_started = now
+
+    def open_for(self) -> float:
+        """Seconds until `check()` would let a call through, without claiming a probe."""
+        now = self.clock()
+        with self._lock:
+            if self.state == OPEN:
+                return max(0.0, self._opened_at + self.reset_timeout - now)
+            if self.state == HALF_OPEN and self._probe_started is not None:
+                return max(0.0, self.reset_timeout - (now - self._probe_started))
+            return 0.0
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            if self.state != CLOSED:
+                self._probe_started = None
+                self._set_state(CLOSED)
+
+    def record_failure(self, status_code: Optional[int] = None):
+        """Records a failed call; 429 responses never trip the breaker.
+
+        A 429 means the upstream is alive but shedding load, which backoff and
+        Retry-After already handle.
+        """
+        if status_code == 429:
+            with self._lock:
+                if self.state == HALF_OPEN:
+                    self._probe_started = None
+            return
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or (
+                self.state == CLOSED and self.consecutive_failures >= self.failure_threshold
+            ):
+                self._opened_at = self.clock()
+                self._probe_started = None
+                self._set_state(OPEN)
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutiveFailures": self.consecutive_failures,
+        }
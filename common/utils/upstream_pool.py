@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Client-side load balancing across the hosts of one upstream service.
+
+`UpstreamPool` spreads calls over several base URLs with smooth weighted
+round-robin (the nginx algorithm: hosts are interleaved in proportion to
+their weights rather than sent in bursts) and checks hosts passively: every
+host has its own `UpstreamHealth` circuit breaker, so a host that keeps
+failing is skipped until its breaker lets a probe through. All hosts share
+one retry budget, and the pool offers the same `start_request()` interface as
+`UpstreamHealth`, so a retry can move to another host::
+
+    retry = pool.start_request()
+    tried = []
+    while True:
+        endpoint = pool.select(exclude=tried)     # raises CircuitOpenError
+        started = time.perf_counter()
+        try:
+            response = await send(endpoint.url)
+        except httpx.ConnectError:
+            pool.record_failure(endpoint)
+            tried.append(endpoint)
+            delay = retry.next_delay(failover=pool.has_alternative(tried))
+            ...
+        pool.record_success(endpoint, time.perf_counter() - started)
+
+Hosts are given as a list or a comma-separated string; `url;weight=N` sets a
+weight (default 1).
+"""
+
+import random
+import time
+from typing import Callable, List, Optional, Sequence, Tuple, Union
+
+from common.utils.metrics import REGISTRY
+from common.utils.upstream_health import (
+    CIRCUIT_REJECTED,
+    CircuitOpenError,
+    RetryBudget,
+    RetryState,
+    UpstreamHealth,
+)
+
+ENDPOINT_REQUESTS = REGISTRY.counter(
+    "upstream_endpoint_requests", "Calls per upstream host by outcome: ok or error", ["upstream", "endpoint", "outcome"]
+)
+ENDPOINT_LATENCY = REGISTRY.histogram(
+    "upstream_endpoint_latency_seconds",
+    "Time until a successful response from an upstream host (response headers for streams)",
+    ["upstream", "endpoint"],
+)
+
+_EWMA_ALPHA = 0.3
+
+
+def parse_endpoints(spec: Union[str, Sequence[str]]) -> List[Tuple[str, int]]:
+    """Parses `"http://a:9380,http://b:9380;weight=2"` into `[(url, weight), ...]`."""
+    items = spec.split(",") if isinstance(spec, str) else spec
+    endpoints = []
+    for item in items:
+        url, _, params = item.strip().partition(";")
+        url = url.strip().rstrip("/")
+        if not url:
+            continue
+        weight = 1
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip() == "weight":
+                weight = int(value)
+            elif key.strip():
+                raise ValueError(f"Unknown upstream parameter {key.strip()!r} in {item.strip()!r}")
+        if weight < 1:
+            raise ValueError(f"Upstream weight must be at least 1: {item.strip()!r}")
+        endpoints.append((url, weight))
+    return endpoints
+
+
+class UpstreamEndpoint:
+    """One host of the pool with its breaker and running stats."""
+
+    def __init__(self, url: str, weight: int, health: UpstreamHealth):
+        self.url = url
+        self.weight = weight
+        self.health = health
+        self.current_weight = 0
+        self.requests = 0
+        self.failures = 0
+        self.latency_ewma: Optional[float] = None
+
+    def snapshot(self) -> dict:
+        return {
+            "url": self.url,
+            "weight": self.weight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "latencyEwma": self.latency_ewma,
+            **self.health.snapshot(),
+        }
+
+
+class UpstreamPool:
+    def __init__(
+        self,
+        name: str,
+        urls: Union[str, Sequence[str]],
+        max_attempts: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 10.0,
+        max_retry_after: float = 30.0,
+        retry_ratio: float = 0.1,
+        min_retries_per_second: float = 1.0,
+        budget_window: float = 10.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 10.0,
+        clock: Callable[[], float] = time.monotonic,
+        rng: Optional[random.Random] = None,
+    ):
+        endpoints = parse_endpoints(urls)
+        if not endpoints:
+            raise ValueError(f"No upstream URLs given for {name}")
+        self.name = name
+        # Read by RetryState, which treats the pool like a single UpstreamHealth
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.rng = rng or random.Random()
+        self.budget = RetryBudget(retry_ratio, min_retries_per_second, budget_window, clock)
+
+        # A single host keeps the pool name, so its breaker metrics look as before
+        single = len(endpoints) == 1
+        self.endpoints = [
+            UpstreamEndpoint(url, weight, UpstreamHealth(
+                name if single else f"{name}@{url}",
+                failure_threshold=failure_threshold,
+                reset_timeout=reset_timeout,
+                budget=self.budget,
+                clock=clock,
+                rng=self.rng,
+            ))
+            for url, weight in endpoints
+        ]
+
+    def start_request(self) -> RetryState:
+        """Counts a new logical request towards the shared retry budget."""
+        self.budget.record_request()
+        return RetryState(self)
+
+    def select(self, exclude: Sequence[UpstreamEndpoint] = ()) -> UpstreamEndpoint:
+        """Picks the next host, preferring ones not in `exclude`.
+
+        Raises CircuitOpenError when every host's breaker is open.
+        """
+        if len(self.endpoints) == 1:
+            endpoint = self.endpoints[0]
+            endpoint.health.check()
+            return endpoint
+
+        waits = [(endpoint, endpoint.health.open_for()) for endpoint in self.endpoints]
+        available = [endpoint for endpoint, wait in waits if wait == 0]
+        candidates = [endpoint for endpoint in available if endpoint not in exclude] or available
+        if not candidates:
+            CIRCUIT_REJECTED.labels(self.name).inc()
+            raise CircuitOpenError(self.name, min(wait for _, wait in waits))
+
+        total = 0
+        for endpoint in candidates:
+            endpoint.current_weight += endpoint.weight
+            total += endpoint.weight
+        best = max(candidates, key=lambda endpoint: endpoint.current_weight)
+        best.current_weight -= total
+        # Claims the half-open probe if the host is recovering
+        best.health.check()
+        return best
+
+    def has_alternative(self, exclude: Sequence[UpstreamEndpoint]) -> bool:
+        """Whether a host outside `exclude` could take a call right now."""
+        return any(
+            endpoint not in exclude and endpoint.health.open_for() == 0 for endpoint in self.endpoints
+        )
+
+    def record_success(self, endpoint: UpstreamEndpoint, latency: Optional[float] = None):
+        endpoint.health.record_success()
+        endpoint.requests += 1
+        ENDPOINT_REQUESTS.labels(self.name, endpoint.url, "ok").inc()
+        if latency is not None:
+            ENDPOINT_LATENCY.labels(self.name, endpoint.url).observe(latency)
+            if endpoint.latency_ewma is None:
+                endpoint.latency_ewma = latency
+            else:
+                endpoint.latency_ewma += _EWMA_ALPHA * (latency - endpoint.latency_ewma)
+
+    def record_failure(self, endpoint: UpstreamEndpoint, status_code: Optional[int] = None):
+        endpoint.health.record_failure(status_code)
+        endpoint.requests += 1
+        endpoint.failures += 1
+        ENDPOINT_REQUESTS.labels(self.name, endpoint.url, "error").inc()
+
+    def snapshot(self) -> List[dict]:
+        return [endpoint.snapshot() for endpoint in self.endpoints]
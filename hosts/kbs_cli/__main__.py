@@ -1,12 +1,14 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import asyncio
 import click
 import sys
 import os
 import json
 import uuid
 import requests
+import httpx
 import time
 import traceback
 from rich.console import Console
@@ -14,6 +16,7 @@ from rich.panel import Panel
 from rich.markdown import Markdown
 from rich.table import Table
 from rich.progress import Progress
+from rich.live import Live
 
 # 添加项目根目录到Python路径
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -21,7 +24,15 @@ project_root = os.path.abspath(os.path.join(current_dir, "../.."))  # 只需上
 if project_root not in sys.path:
     sys.path.insert(0, project_root)  # 直接添加项目根目录
 
-from common.types import TaskState
+from common.types import (
+    TaskState,
+    A2AClientError,
+    A2AClientJSONError,
+    TaskArtifactUpdateEvent,
+    TaskStatusUpdateEvent,
+)
+from common.client import A2AClient, A2ACardResolver
+from hosts.kbs_cli.bench import BenchRunner, compare, load_result, save_result
 
 console = Console()
 
@@ -34,27 +45,25 @@ DEFAULT_TIMEOUT = 120  # 默认超时时间（秒）
 MAX_RETRIES = 3        # 最大重试次数
 
 def get_agent_card(base_url, timeout=30):
-    """获取代理卡片"""
-    url = f"{base_url.rstrip('/')}/.well-known/agent.json"
+    """获取代理卡片（带缓存，重试时仅做条件请求）"""
+    resolver = A2ACardResolver(base_url)
     
     try:
-        console.print(f"[dim]获取代理卡片: {url}[/dim]")
-        response = session.get(url, timeout=timeout)
-        
-        if response.status_code == 200:
-            console.print("[green]获取代理卡片成功[/green]")
-            return response.json()
-        else:
-            console.print(f"[bold red]获取代理卡片失败: HTTP {response.status_code}[/bold red]")
-            console.print(f"[dim]{response.text[:200]}...[/dim]")
-            return None
-    except requests.ConnectionError as e:
+        console.print(f"[dim]获取代理卡片: {resolver.card_url}[/dim]")
+        agent_card = resolver.get_agent_card(revalidate=True, timeout=timeout)
+        console.print("[green]获取代理卡片成功[/green]")
+        return agent_card.model_dump(exclude_none=True)
+    except httpx.HTTPStatusError as e:
+        console.print(f"[bold red]获取代理卡片失败: HTTP {e.response.status_code}[/bold red]")
+        console.print(f"[dim]{e.response.text[:200]}...[/dim]")
+        return None
+    except httpx.ConnectError as e:
         console.print(f"[bold red]连接错误: {str(e)}[/bold red]")
         return None
-    except requests.Timeout as e:
+    except httpx.TimeoutException as e:
         console.print(f"[bold red]请求超时: {str(e)}[/bold red]")
         return None
-    except requests.RequestException as e:
+    except (httpx.HTTPError, A2AClientJSONError) as e:
         console.print(f"[bold red]请求异常: {str(e)}[/bold red]")
         return None
 
@@ -123,6 +132,15 @@ def send_rpc_request(base_url, method, params, timeout=DEFAULT_TIMEOUT, retries=
     
     return None
 
+def display_references(references):
+    """显示知识库引用"""
+    if references and references.get('chunks'):
+        chunks = references.get('chunks', [])
+        console.print("[bold cyan]知识库引用:[/bold cyan]")
+        for i, chunk in enumerate(chunks, 1):
+            console.print(f"[bold]{i}.[/bold] {chunk.get('content', '')[:150]}...")
+            console.print(f"   [dim]来源: {chunk.get('source', '未知')}[/dim]")
+
 def display_response(response, prompt):
     """显示RagFlow响应"""
     if not response:
@@ -158,14 +176,7 @@ def display_response(response, prompt):
                                           title="RagFlow回答", 
                                           border_style="green"))
                     elif part.get('type') == 'data':
-                        data = part.get('data', {})
-                        references = data.get('references', {})
-                        if references and references.get('chunks'):
-                            chunks = references.get('chunks', [])
-                            console.print("[bold cyan]知识库引用:[/bold cyan]")
-                            for i, chunk in enumerate(chunks, 1):
-                                console.print(f"[bold]{i}.[/bold] {chunk.get('content', '')[:150]}...")
-                                console.print(f"   [dim]来源: {chunk.get('source', '未知')}[/dim]")
+                        display_references(part.get('data', {}).get('references', {}))
         elif status.get('message'):
             message = status.get('message', {})
             if message.get('parts'):
@@ -182,6 +193,61 @@ def display_response(response, prompt):
         console.print(f"[dim]{json.dumps(response, ensure_ascii=False, indent=2)}[/dim]")
         console.print(traceback.format_exc())
 
+async def stream_answer(client, params, prompt):
+    """通过tasks/sendSubscribe流式获取回答，SSE事件到达时增量渲染
+    
+    Returns:
+        是否收到了最终事件
+    """
+    console.print(f"[bold cyan]问题:[/bold cyan] {prompt}")
+    started = time.perf_counter()
+    first_event_at = None
+    text = ""
+    title = "RagFlow回答"
+    border_style = "green"
+    references = None
+    finished = False
+
+    def render():
+        return Panel(Markdown(text or "..."), title=title, border_style=border_style)
+
+    with Live(render(), console=console, refresh_per_second=12, transient=False) as live:
+        async for response in client.send_task_streaming(params):
+            if first_event_at is None:
+                first_event_at = time.perf_counter()
+
+            if response.error:
+                console.print(f"[bold red]错误: [{response.error.code}] {response.error.message}[/bold red]")
+                return False
+
+            event = response.result
+            if isinstance(event, TaskArtifactUpdateEvent):
+                for part in event.artifact.parts:
+                    if part.type == "text":
+                        # 构件可能分块追加，否则为完整内容
+                        text = text + part.text if event.artifact.append else part.text
+                    elif part.type == "data":
+                        references = part.data.get("references")
+            elif isinstance(event, TaskStatusUpdateEvent):
+                state = event.status.state
+                if event.status.message:
+                    # 状态消息携带当前完整回答（快照）
+                    texts = [part.text for part in event.status.message.parts if part.type == "text"]
+                    if texts:
+                        text = "".join(texts)
+                if state not in (TaskState.WORKING, TaskState.COMPLETED, TaskState.SUBMITTED):
+                    title = f"消息 [{state.value}]"
+                    border_style = "yellow"
+                finished = finished or event.final
+
+            live.update(render())
+
+    elapsed = time.perf_counter() - started
+    if first_event_at is not None:
+        console.print(f"[dim]首个事件 {first_event_at - started:.2f} 秒，总耗时 {elapsed:.2f} 秒[/dim]")
+    display_references(references)
+    return finished
+
 def check_server_status(ragflow):
     """检查服务器状态"""
     console.print("[bold]检查RagFlow服务器状态...[/bold]")
@@ -208,32 +274,39 @@ def check_server_status(ragflow):
         
     return agent_card
 
-def run_client(ragflow, session_id, timeout=DEFAULT_TIMEOUT):
-    """运行RagFlow客户端 - 基于A2A协议 (同步版)"""
-    try:
-        console.print(f"[bold]RagFlow客户端[/bold]")
-        console.print(f"[bold]连接到:[/bold] {ragflow}")
-        
-        # 检查服务器状态
-        agent_card = check_server_status(ragflow)
-        if not agent_card:
-            return
-        
-        # 显示代理信息
-        display_agent_info(agent_card)
-        
-        # 代理URL
-        agent_url = agent_card.get('url').rstrip('/')
-        console.print(f"[bold]使用代理URL:[/bold] {agent_url}")
-        
-        # 会话ID
-        client_session_id = session_id or str(uuid.uuid4())
-        console.print(f"[bold]会话ID:[/bold] {client_session_id}")
-        
+async def run_client_async(ragflow, session_id, timeout=DEFAULT_TIMEOUT, stream=True):
+    """运行RagFlow客户端 - 基于A2A协议 (异步版)"""
+    console.print(f"[bold]RagFlow客户端[/bold]")
+    console.print(f"[bold]连接到:[/bold] {ragflow}")
+    
+    # 检查服务器状态
+    agent_card = await asyncio.to_thread(check_server_status, ragflow)
+    if not agent_card:
+        return
+    
+    # 显示代理信息
+    display_agent_info(agent_card)
+    
+    # 代理URL
+    agent_url = agent_card.get('url').rstrip('/')
+    console.print(f"[bold]使用代理URL:[/bold] {agent_url}")
+
+    # 代理不支持流式时回退到阻塞的tasks/send
+    if stream and not agent_card.get('capabilities', {}).get('streaming', False):
+        console.print("[yellow]代理不支持流式响应，使用非流式模式[/yellow]")
+        stream = False
+    console.print(f"[bold]响应模式:[/bold] {'流式' if stream else '非流式'}")
+    
+    # 会话ID
+    client_session_id = session_id or str(uuid.uuid4())
+    console.print(f"[bold]会话ID:[/bold] {client_session_id}")
+    
+    stream_timeout = httpx.Timeout(30, read=timeout)
+    async with A2AClient(url=agent_url, stream_timeout=stream_timeout) as client:
         # 对话循环
         while True:
             console.print("\n[bold cyan]请输入问题 (:q 退出):[/bold cyan]")
-            question = input().strip()
+            question = (await asyncio.to_thread(input)).strip()
             
             if not question:
                 continue
@@ -259,11 +332,21 @@ def run_client(ragflow, session_id, timeout=DEFAULT_TIMEOUT):
                     ]
                 }
             }
+
+            if stream:
+                try:
+                    if not await stream_answer(client, params, question):
+                        console.print("[bold yellow]流式响应未正常结束[/bold yellow]")
+                except A2AClientError as e:
+                    console.print(f"[bold red]流式请求失败: {str(e)}[/bold red]")
+                    console.print("[bold yellow]提示：请尝试更简短的问题，或稍后再试[/bold yellow]")
+                continue
             
             # 发送请求 - 使用更长的超时时间和自动重试
             console.print("[bold]正在发送问题...[/bold]")
             with console.status("[bold green]等待回答中...[/bold green]"):
-                response = send_rpc_request(
+                response = await asyncio.to_thread(
+                    send_rpc_request,
                     agent_url, 
                     "tasks/send", 
                     params, 
@@ -277,26 +360,122 @@ def run_client(ragflow, session_id, timeout=DEFAULT_TIMEOUT):
                 console.print("[bold red]无法获取回答[/bold red]")
                 console.print("[bold yellow]提示：请尝试更简短的问题，或稍后再试[/bold yellow]")
                 console.print("[bold yellow]服务器可能正在处理其他请求，或远程API暂时不可用[/bold yellow]")
-    
+
+def run_client(ragflow, session_id, timeout=DEFAULT_TIMEOUT, stream=True):
+    """运行RagFlow客户端"""
+    try:
+        asyncio.run(run_client_async(ragflow, session_id, timeout, stream))
     except KeyboardInterrupt:
         console.print("\n[bold]已中断，感谢使用RagFlow客户端[/bold]")
     except Exception as e:
         console.print(f"[bold red]客户端错误: {str(e)}[/bold red]")
         console.print(traceback.format_exc())
 
-@click.command()
+@click.group(invoke_without_command=True)
 @click.option("--ragflow", default="http://localhost:10003", help="RagFlow代理服务地址")
 @click.option("--session", default=None, help="会话ID，不指定则自动生成")
-@click.option("--timeout", default=DEFAULT_TIMEOUT, help="请求超时时间(秒)")
-def cli(ragflow, session, timeout):
+@click.option("--timeout", default=DEFAULT_TIMEOUT, help="请求超时时间(秒)，流式模式下为两个事件之间的最长间隔")
+@click.option("--stream/--no-stream", default=True, help="启用/禁用流式模式，代理不支持流式时自动回退")
+@click.pass_context
+def cli(ctx, ragflow, session, timeout, stream):
     """RagFlow知识库客户端 - 基于A2A协议 (高容错版)"""
+    if ctx.invoked_subcommand is not None:
+        return
     try:
-        run_client(ragflow, session, timeout)
+        run_client(ragflow, session, timeout, stream)
     except KeyboardInterrupt:
         console.print("\n[bold]已中断RagFlow客户端[/bold]")
     except Exception as e:
         console.print(f"[bold red]出错了: {str(e)}[/bold red]")
         console.print(traceback.format_exc())
 
+def display_bench_result(result, comparison=None):
+    """显示基准测试结果"""
+    def fmt(value):
+        return "-" if value is None else f"{value * 1000:.1f}"
+
+    table = Table(title=f"基准测试结果（{result['elapsed']:.1f} 秒，延迟单位 ms）")
+    for column in ("类型", "请求", "错误", "req/s", "p50", "p95", "p99", "首事件p50", "首事件p95"):
+        table.add_column(column, justify="right")
+    for op, stats in result["summary"].items():
+        table.add_row(
+            op,
+            str(stats["requests"]),
+            str(stats["errors"]),
+            f"{stats['rps']:.1f}",
+            fmt(stats["latency"]["p50"]),
+            fmt(stats["latency"]["p95"]),
+            fmt(stats["latency"]["p99"]),
+            fmt(stats["first_event"]["p50"]),
+            fmt(stats["first_event"]["p95"]),
+        )
+    console.print(table)
+
+    errors = result["summary"]["total"]["error_types"]
+    if errors:
+        console.print("[bold red]错误类型:[/bold red]")
+        for error, count in sorted(errors.items(), key=lambda item: -item[1]):
+            console.print(f"  {count} × {error}")
+
+    if comparison:
+        table = Table(title="与基线对比")
+        for column in ("请求类型", "指标", "基线", "当前", "变化"):
+            table.add_column(column, justify="right")
+        for row in comparison:
+            # 吞吐量越高越好，延迟越低越好
+            worse = row["change"] < 0 if row["metric"] == "rps" else row["change"] > 0
+            style = "red" if worse and abs(row["change"]) > 0.05 else "green"
+            value = (lambda v: f"{v:.1f}") if row["metric"] == "rps" else fmt
+            table.add_row(
+                row["op"],
+                row["metric"],
+                value(row["baseline"]),
+                value(row["current"]),
+                f"[{style}]{row['change']:+.1%}[/{style}]",
+            )
+        console.print(table)
+
+@cli.command()
+@click.option("--url", "url", default=None, help="目标A2A服务地址，默认使用--ragflow")
+@click.option("--sessions", "-c", default=10, help="并发会话数")
+@click.option("--duration", "-d", default=30.0, help="压测时长(秒)")
+@click.option("--requests", "-n", "requests_per_session", default=None, type=int, help="每个会话的请求数，设置后忽略--duration")
+@click.option("--ramp-up", default=0.0, help="在该时间(秒)内逐步启动所有会话")
+@click.option("--think-time", default=0.0, help="同一会话两次请求之间的平均思考时间(秒)")
+@click.option("--mix", default="send=1,stream=1,get=1", help="请求比例，如 send=1,stream=2,get=1")
+@click.option("--question", "questions", multiple=True, help="压测使用的问题，可多次指定")
+@click.option("--output", "-o", default=None, help="将结果导出为JSON文件")
+@click.option("--baseline", default=None, help="与之前导出的JSON结果对比")
+@click.pass_context
+def bench(ctx, url, sessions, duration, requests_per_session, ramp_up, think_time, mix, questions, output, baseline):
+    """对A2A服务器进行并发压测，报告延迟分位数与吞吐量"""
+    target = (url or ctx.parent.params["ragflow"]).rstrip("/") + "/"
+    try:
+        runner = BenchRunner(
+            url=target,
+            sessions=sessions,
+            duration=duration,
+            requests_per_session=requests_per_session,
+            ramp_up=ramp_up,
+            think_time=think_time,
+            mix=mix,
+            questions=list(questions) or None,
+            timeout=ctx.parent.params["timeout"],
+        )
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+    console.print(f"[bold]压测目标:[/bold] {target}")
+    console.print(f"[bold]并发会话:[/bold] {sessions}  [bold]请求比例:[/bold] {runner.mix}")
+    with console.status("[bold green]压测进行中...[/bold green]"):
+        result = asyncio.run(runner.run())
+
+    comparison = compare(result, load_result(baseline)) if baseline else None
+    display_bench_result(result, comparison)
+
+    if output:
+        save_result(result, output)
+        console.print(f"[green]结果已导出到 {output}[/green]")
+
 if __name__ == "__main__":
     cli() 
\ No newline at end of file
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+kbs_cli bench: A2A服务器负载生成与基准测试
+
+启动N个并发会话，按配置的比例发送tasks/send、tasks/sendSubscribe和tasks/get，
+统计延迟分位数（p50/p95/p99）、首个事件时间、错误数和吞吐量，并可导出为JSON用于回归对比。
+"""
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from common.client import A2AClient
+
+OPERATIONS = ("send", "stream", "get")
+
+
+class Sample:
+    """单次请求的测量结果"""
+
+    __slots__ = ("op", "started", "latency", "first_event", "ok", "error")
+
+    def __init__(self, op: str, started: float):
+        self.op = op
+        self.started = started
+        self.latency: float = 0.0
+        self.first_event: Optional[float] = None
+        self.ok = False
+        self.error: Optional[str] = None
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """最近秩法计算分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """解析请求比例，如 "send=1,stream=1,get=2" """
+    weights = {}
+    for item in mix.split(","):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"未知的请求类型: {name}，可选 {', '.join(OPERATIONS)}")
+        weights[name] = float(weight or 1)
+    if not weights or sum(weights.values()) <= 0:
+        raise ValueError("请求比例不能为空")
+    return weights
+
+
+class BenchRunner:
+    """并发会话负载生成器"""
+
+    def __init__(
+        self,
+        url: str,
+        sessions: int = 10,
+        duration: float = 30.0,
+        requests_per_session: Optional[int] = None,
+        ramp_up: float = 0.0,
+        think_time: float = 0.0,
+        mix: str = "send=1,stream=1,get=1",
+        questions: Optional[List[str]] = None,
+        timeout: float = 120.0,
+    ):
+        self.url = url
+        self.sessions = sessions
+        self.duration = duration
+        self.requests_per_session = requests_per_session
+        self.ramp_up = ramp_up
+        self.think_time = think_time
+        self.mix = parse_mix(mix)
+        self.questions = questions or ["你好，请介绍一下知识库的内容"]
+        self.timeout = timeout
+        self.samples: List[Sample] = []
+
+    def config(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "sessions": self.sessions,
+            "duration": self.duration,
+            "requests_per_session": self.requests_per_session,
+            "ramp_up": self.ramp_up,
+            "think_time": self.think_time,
+            "mix": self.mix,
+            "timeout": self.timeout,
+        }
+
+    def _params(self, session_id: str) -> Dict[str, Any]:
+        return {
+            "id": str(uuid.uuid4()),
+            "sessionId": session_id,
+            "message": {
+                "role": "user",
+                "parts": [{"type": "text", "text": random.choice(self.questions)}],
+            },
+        }
+
+    async def _send(self, client: A2AClient, sample: Sample, params: Dict[str, Any]):
+        response = await client.send_task(params)
+        if response.error:
+            sample.error = f"[{response.error.code}] {response.error.message}"
+        else:
+            sample.ok = True
+
+    async def _stream(self, client: A2AClient, sample: Sample, params: Dict[str, Any]):
+        async for response in client.send_task_streaming(params):
+            if sample.first_event is None:
+                sample.first_event = time.perf_counter() - sample.started
+            if response.error:
+                sample.error = f"[{response.error.code}] {response.error.message}"
+                return
+            if getattr(response.result, "final", False):
+                sample.ok = True
+                return
+        sample.error = "stream ended without final event"
+
+    async def _get(self, client: A2AClient, sample: Sample, task_id: str):
+        response = await client.get_task({"id": task_id, "historyLength": 1})
+        if response.error:
+            sample.error = f"[{response.error.code}] {response.error.message}"
+        else:
+            sample.ok = True
+
+    async def _session(self, client: A2AClient, index: int, deadline: float):
+        if self.ramp_up > 0 and self.sessions > 1:
+            await asyncio.sleep(self.ramp_up * index / self.sessions)
+
+        session_id = str(uuid.uuid4())
+        last_task_id: Optional[str] = None
+        ops, weights = zip(*self.mix.items())
+        count = 0
+
+        while time.perf_counter() < deadline:
+            if self.requests_per_session is not None and count >= self.requests_per_session:
+                break
+            count += 1
+
+            op = random.choices(ops, weights)[0]
+            # 会话中还没有任务时，tasks/get先退化为tasks/send
+            if op == "get" and last_task_id is None:
+                op = "send"
+
+            sample = Sample(op, time.perf_counter())
+            try:
+                async with asyncio.timeout(self.timeout):
+                    if op == "get":
+                        await self._get(client, sample, last_task_id)
+                    else:
+                        params = self._params(session_id)
+                        last_task_id = params["id"]
+                        if op == "send":
+                            await self._send(client, sample, params)
+                        else:
+                            await self._stream(client, sample, params)
+            except TimeoutError:
+                sample.error = "timeout"
+            except Exception as e:
+                sample.error = str(e) or type(e).__name__
+            sample.latency = time.perf_counter() - sample.started
+            self.samples.append(sample)
+
+            if self.think_time > 0:
+                # 在思考时间上加±50%抖动，避免所有会话同步
+                await asyncio.sleep(self.think_time * random.uniform(0.5, 1.5))
+
+    async def run(self) -> Dict[str, Any]:
+        limits = httpx.Limits(
+            max_connections=self.sessions * 2,
+            max_keepalive_connections=self.sessions * 2,
+        )
+        stream_timeout = httpx.Timeout(30, read=self.timeout)
+        started_at = time.time()
+        started = time.perf_counter()
+        deadline = started + (self.duration if self.requests_per_session is None else math.inf)
+
+        async with A2AClient(
+            url=self.url, timeout=self.timeout, stream_timeout=stream_timeout, limits=limits
+        ) as client:
+            await asyncio.gather(
+                *(self._session(client, i, deadline) for i in range(self.sessions))
+            )
+
+        elapsed = time.perf_counter() - started
+        return {
+            "config": self.config(),
+            "started_at": started_at,
+            "elapsed": elapsed,
+            "summary": summarize(self.samples, elapsed),
+        }
+
+
+def _stats(samples: List[Sample], elapsed: float) -> Dict[str, Any]:
+    latencies = [s.latency for s in samples if s.ok]
+    first_events = [s.first_event for s in samples if s.first_event is not None]
+    errors: Dict[str, int] = {}
+    for s in samples:
+        if not s.ok:
+            errors[s.error or "unknown"] = errors.get(s.error or "unknown", 0) + 1
+    return {
+        "requests": len(samples),
+        "errors": len(samples) - len(latencies),
+        "error_types": errors,
+        "rps": len(samples) / elapsed if elapsed > 0 else 0.0,
+        "latency": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+        },
+        "first_event": {
+            "p50": percentile(first_events, 50),
+            "p95": percentile(first_events, 95),
+            "p99": percentile(first_events, 99),
+        },
+    }
+
+
+def summarize(samples: List[Sample], elapsed: float) -> Dict[str, Any]:
+    """按请求类型及总体汇总统计"""
+    summary = {"total": _stats(samples, elapsed)}
+    for op in OPERATIONS:
+        op_samples = [s for s in samples if s.op == op]
+        if op_samples:
+            summary[op] = _stats(op_samples, elapsed)
+    return summary
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """与基线结果对比，返回各指标的相对变化"""
+    rows = []
+    for op, stats in result["summary"].items():
+        base = baseline.get("summary", {}).get(op)
+        if not base:
+            continue
+        for metric, current, previous in (
+            ("rps", stats["rps"], base["rps"]),
+            ("p50", stats["latency"]["p50"], base["latency"]["p50"]),
+            ("p95", stats["latency"]["p95"], base["latency"]["p95"]),
+            ("p99", stats["latency"]["p99"], base["latency"]["p99"]),
+        ):
+            if current is None or not previous:
+                continue
+            rows.append({
+                "op": op,
+                "metric": metric,
+                "baseline": previous,
+                "current": current,
+                "change": (current - previous) / previous,
+            })
+    return rows
+
+
+def save_result(result: Dict[str, Any], path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+def load_result(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
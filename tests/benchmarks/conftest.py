@@ -0,0 +1,45 @@
+"""Shared fixtures for the A2A hot-path benchmarks.
+
+pytest-benchmark measures synchronous callables, so coroutines are driven
+through a dedicated event loop with `loop.run_until_complete`.
+"""
+
+import asyncio
+import logging
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from common.server.db_task_manager import DatabaseTaskManager
+from tests.benchmarks.helpers import EchoTaskManager
+
+
+@pytest.fixture(autouse=True)
+def _quiet_logging():
+    # The hot paths log at INFO; keep handler I/O out of the measurements.
+    logging.disable(logging.INFO)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    # Run the aclose() of async generators left behind by early exits (e.g.
+    # httpx's nested aiter_text/aiter_raw) before closing, as asyncio.run does.
+    loop.run_until_complete(loop.shutdown_asyncgens())
+    loop.close()
+
+
+@pytest.fixture(params=["memory", "database"])
+def task_manager(request, loop, tmp_path):
+    if request.param == "memory":
+        yield EchoTaskManager()
+        return
+
+    manager = DatabaseTaskManager(f"sqlite+aiosqlite:///{tmp_path / 'tasks.db'}")
+    loop.run_until_complete(manager.initialize())
+    yield manager
+    loop.run_until_complete(manager.engine.dispose())
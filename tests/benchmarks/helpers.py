@@ -0,0 +1,94 @@
+"""Request builders, a minimal task manager and seeding helpers for the benchmarks."""
+
+import uuid
+from typing import AsyncIterable, Union
+
+from common.server.db_task_manager import DatabaseTaskManager
+from common.server.models import MessageTable, TaskTable
+from common.server.task_manager import InMemoryTaskManager
+from common.types import (
+    JSONRPCResponse,
+    Message,
+    SendTaskRequest,
+    SendTaskResponse,
+    SendTaskStreamingRequest,
+    SendTaskStreamingResponse,
+    Task,
+    TaskSendParams,
+    TaskState,
+    TaskStatus,
+    TaskStatusUpdateEvent,
+    TextPart,
+)
+
+HISTORY_SIZES = [1, 100, 1000]
+
+
+def make_message(text: str = "What does the knowledge base say about A2A?", role: str = "user") -> Message:
+    return Message(role=role, parts=[TextPart(text=text)])
+
+
+def make_send_params(task_id: str | None = None, session_id: str = "bench-session") -> TaskSendParams:
+    return TaskSendParams(
+        id=task_id or uuid.uuid4().hex,
+        sessionId=session_id,
+        message=make_message(),
+    )
+
+
+class EchoTaskManager(InMemoryTaskManager):
+    """Minimal concrete task manager that completes every task immediately."""
+
+    async def _complete(self, params: TaskSendParams) -> Task:
+        await self.upsert_task(params)
+        return await self.update_store(
+            params.id,
+            TaskStatus(state=TaskState.COMPLETED, message=make_message("done", role="agent")),
+            None,
+        )
+
+    async def on_send_task(self, request: SendTaskRequest) -> SendTaskResponse:
+        task = await self._complete(request.params)
+        return SendTaskResponse(id=request.id, result=task)
+
+    async def on_send_task_subscribe(
+        self, request: SendTaskStreamingRequest
+    ) -> Union[AsyncIterable[SendTaskStreamingResponse], JSONRPCResponse]:
+        task = await self._complete(request.params)
+
+        async def stream():
+            # A single final event, like an agent that answers in one chunk
+            yield SendTaskStreamingResponse(
+                id=request.id, result=TaskStatusUpdateEvent(id=task.id, status=task.status, final=True)
+            )
+
+        return stream()
+
+
+async def seed_memory(manager: InMemoryTaskManager, task_id: str, history: int):
+    await manager.upsert_task(make_send_params(task_id))
+    task = manager.tasks[task_id]
+    task.history.extend(make_message() for _ in range(history - 1))
+
+
+async def seed_database(manager: DatabaseTaskManager, task_id: str, history: int):
+    # Insert rows directly; going through upsert_task would be O(n^2) in history.
+    params = make_send_params(task_id)
+    task = Task(
+        id=task_id,
+        sessionId=params.sessionId,
+        status=TaskStatus(state=TaskState.SUBMITTED),
+        history=[params.message],
+    )
+    async with manager.async_session() as session:
+        async with session.begin():
+            session.add(TaskTable.create_from_task(task))
+            for _ in range(history):
+                session.add(MessageTable.create_from_message(task_id, params.message))
+
+
+def seed(loop, manager, task_id: str, history: int):
+    if isinstance(manager, DatabaseTaskManager):
+        loop.run_until_complete(seed_database(manager, task_id, history))
+    else:
+        loop.run_until_complete(seed_memory(manager, task_id, history))
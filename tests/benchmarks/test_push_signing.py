@@ -0,0 +1,37 @@
+"""Benchmarks for signing push notification payloads."""
+
+import jwt
+import pytest
+
+from common.utils.push_notification_auth import PushNotificationSenderAuth
+
+
+@pytest.fixture(scope="module")
+def sender_auth():
+    auth = PushNotificationSenderAuth()
+    auth.generate_jwk()
+    return auth
+
+
+def make_payload(size: int) -> dict:
+    return {
+        "id": "task-1",
+        "sessionId": "session-1",
+        "status": {
+            "state": "completed",
+            "message": {"role": "agent", "parts": [{"type": "text", "text": "答" * size}]},
+        },
+    }
+
+
+@pytest.mark.parametrize("size", [100, 10_000])
+def test_sign_push_notification(benchmark, sender_auth, size):
+    payload = make_payload(size)
+
+    def sign():
+        body = sender_auth._serialize_request_body(payload)
+        return body, sender_auth._generate_jwt_for_body(body)
+
+    body, token = benchmark(sign)
+    claims = jwt.decode(token, options={"verify_signature": False})
+    assert claims["request_body_sha256"] == sender_auth._calculate_raw_body_sha256(body)
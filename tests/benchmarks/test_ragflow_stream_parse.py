@@ -0,0 +1,92 @@
+"""Benchmarks for parsing RagFlow completion streams with large references.
+
+`lines` is the previous approach (`aiter_lines()` and `json.loads` on every
+`data:` line); `agent` is `RagFlowAgent._parse_stream`, which decodes raw
+bytes incrementally, skips events superseded within the same read and
+decodes only the newest reference.
+"""
+
+import json
+from contextlib import aclosing
+
+import httpx
+import pytest
+
+EVENTS = 50
+
+
+def make_stream(reference_chunks: int, chunk_size: int = 1000) -> bytes:
+    reference = {
+        "total": reference_chunks,
+        "chunks": [
+            {"id": f"chunk-{i}", "content": "知识库内容 " * (chunk_size // 6), "document_name": f"doc-{i}.pdf"}
+            for i in range(reference_chunks)
+        ],
+    }
+    answer = ""
+    lines = []
+    for i in range(EVENTS):
+        answer += f"token{i} "
+        data = {"answer": answer, "reference": reference, "session_id": "bench", "id": str(i)}
+        lines.append(f"data:{json.dumps({'code': 0, 'data': data}, ensure_ascii=False)}\n\n")
+    lines.append(f"data:{json.dumps({'code': 0, 'data': True})}\n\n")
+    return "".join(lines).encode("utf-8")
+
+
+def make_response(payload: bytes, read_size: int) -> httpx.Response:
+    async def chunks():
+        for start in range(0, len(payload), read_size):
+            yield payload[start:start + read_size]
+
+    return httpx.Response(200, content=chunks())
+
+
+async def parse_lines(response: httpx.Response):
+    answer, references = "", None
+    async with aclosing(response.aiter_lines()) as lines:
+        async for line in lines:
+            if not line.startswith("data:"):
+                continue
+            data = json.loads(line[5:].strip())
+            if data.get("data") is True:
+                break
+            result = data.get("data", {})
+            answer = result.get("answer", answer)
+            if result.get("reference"):
+                references = result["reference"]
+    return answer, references
+
+
+async def parse_agent(agent, response: httpx.Response):
+    final = None
+    async for item in agent._parse_stream(response, 0.0):
+        if item["is_task_complete"]:
+            final = item["content"], item["references"]
+    return final
+
+
+@pytest.fixture
+def agent(monkeypatch, tmp_path):
+    monkeypatch.setenv("RAGFLOW_API_KEY", "bench")
+    monkeypatch.setenv("RAGFLOW_API_URL", "http://ragflow.invalid")
+    monkeypatch.setenv("SESSION_DB_URL", f"sqlite:///{tmp_path / 'sessions.db'}")
+    from agents.ragflow.agent import RagFlowAgent
+
+    return RagFlowAgent(chat_id="bench")
+
+
+@pytest.mark.parametrize("parser", ["lines", "agent"])
+@pytest.mark.parametrize("read_size", [4096, 65536])
+@pytest.mark.parametrize("reference_chunks", [0, 20])
+def test_ragflow_stream_parse(benchmark, loop, agent, parser, read_size, reference_chunks):
+    payload = make_stream(reference_chunks)
+
+    def run():
+        response = make_response(payload, read_size)
+        if parser == "lines":
+            return loop.run_until_complete(parse_lines(response))
+        return loop.run_until_complete(parse_agent(agent, response))
+
+    answer, references = benchmark(run)
+    assert answer.startswith("token0 ") and answer.endswith(f"token{EVENTS - 1} ")
+    assert len((references or {}).get("chunks", [])) == reference_chunks
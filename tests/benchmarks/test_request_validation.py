@@ -0,0 +1,46 @@
+"""Benchmarks for JSON-RPC request validation via the A2ARequest union."""
+
+import pytest
+from pydantic import ValidationError
+
+from common.types import A2ARequest
+
+SEND = {
+    "jsonrpc": "2.0",
+    "id": 1,
+    "method": "tasks/send",
+    "params": {
+        "id": "task-1",
+        "sessionId": "session-1",
+        "message": {"role": "user", "parts": [{"type": "text", "text": "hello " * 50}]},
+        "acceptedOutputModes": ["text", "text/plain"],
+        "pushNotification": {"url": "https://example.com/notify", "token": "secret"},
+    },
+}
+
+REQUESTS = {
+    "send": SEND,
+    "send_subscribe": {**SEND, "method": "tasks/sendSubscribe"},
+    "get": {"jsonrpc": "2.0", "id": 2, "method": "tasks/get", "params": {"id": "task-1", "historyLength": 10}},
+    "cancel": {"jsonrpc": "2.0", "id": 3, "method": "tasks/cancel", "params": {"id": "task-1"}},
+}
+
+
+@pytest.mark.parametrize("method", list(REQUESTS))
+def test_validate_request(benchmark, method):
+    body = REQUESTS[method]
+    request = benchmark(A2ARequest.validate_python, body)
+    assert request.method == body["method"]
+
+
+def test_validate_invalid_request(benchmark):
+    body = {"jsonrpc": "2.0", "id": 4, "method": "tasks/unknown", "params": {}}
+
+    def validate():
+        try:
+            A2ARequest.validate_python(body)
+        except ValidationError:
+            return True
+        return False
+
+    assert benchmark(validate)
@@ -0,0 +1,77 @@
+"""Benchmarks for A2AServer._process_request parsing, dispatch and serialization."""
+
+import itertools
+import json
+
+import pytest
+from starlette.requests import Request
+
+from common.server.server import A2AServer
+from common.types import SendTaskStreamingRequest, TaskState
+from tests.benchmarks.helpers import EchoTaskManager, make_send_params, seed
+
+
+def make_request(body: bytes) -> Request:
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/",
+        "headers": [(b"content-type", b"application/json")],
+    }
+    return Request(scope, receive)
+
+
+@pytest.fixture
+def server():
+    return A2AServer(task_manager=EchoTaskManager())
+
+
+@pytest.mark.parametrize("history", [1, 100])
+def test_dispatch_get_task(benchmark, loop, server, history):
+    seed(loop, server.task_manager, "task-1", history)
+    body = json.dumps({
+        "jsonrpc": "2.0", "id": 1, "method": "tasks/get",
+        "params": {"id": "task-1", "historyLength": history},
+    }).encode()
+
+    response = benchmark(lambda: loop.run_until_complete(server._process_request(make_request(body))))
+    assert response.status_code == 200
+    assert len(json.loads(response.body)["result"]["history"]) == history
+
+
+def test_dispatch_send_task(benchmark, loop, server):
+    counter = itertools.count()
+
+    def dispatch():
+        # A fresh task id per round keeps the work constant instead of growing one history.
+        body = json.dumps({
+            "jsonrpc": "2.0", "id": 1, "method": "tasks/send",
+            "params": {
+                "id": f"task-{next(counter)}", "sessionId": "session-1",
+                "message": {"role": "user", "parts": [{"type": "text", "text": "hello"}]},
+            },
+        }).encode()
+        return loop.run_until_complete(server._process_request(make_request(body)))
+
+    response = benchmark(dispatch)
+    assert response.status_code == 200
+
+
+def test_send_task_subscribe(benchmark, loop, server):
+    counter = itertools.count()
+
+    async def subscribe():
+        request = SendTaskStreamingRequest(params=make_send_params(f"task-{next(counter)}"))
+        return [event async for event in await server.task_manager.on_send_task_subscribe(request)]
+
+    events = benchmark(lambda: loop.run_until_complete(subscribe()))
+    assert [event.result.final for event in events] == [True]
+    assert events[0].result.status.state == TaskState.COMPLETED
+
+
+def test_dispatch_parse_error(benchmark, loop, server):
+    response = benchmark(lambda: loop.run_until_complete(server._process_request(make_request(b"{not json"))))
+    assert response.status_code == 400
@@ -0,0 +1,53 @@
+"""Benchmarks for delivering task events to many SSE subscribers."""
+
+import pytest
+
+from common.types import (
+    Artifact,
+    TaskArtifactUpdateEvent,
+    TaskState,
+    TaskStatus,
+    TaskStatusUpdateEvent,
+    TextPart,
+)
+from tests.benchmarks.helpers import make_message
+
+EVENTS_PER_TASK = 20
+
+
+def make_events(task_id: str):
+    events = [
+        TaskStatusUpdateEvent(
+            id=task_id,
+            status=TaskStatus(state=TaskState.WORKING, message=make_message("token " * i, role="agent")),
+            final=False,
+        )
+        for i in range(EVENTS_PER_TASK - 2)
+    ]
+    events.append(TaskArtifactUpdateEvent(id=task_id, artifact=Artifact(parts=[TextPart(text="answer")], index=0)))
+    events.append(TaskStatusUpdateEvent(id=task_id, status=TaskStatus(state=TaskState.COMPLETED), final=True))
+    return events
+
+
+async def fan_out(manager, task_id: str, subscribers: int, events) -> int:
+    queues = [await manager.setup_sse_consumer(task_id) for _ in range(subscribers)]
+    streams = [manager.dequeue_events_for_sse(1, task_id, queue) for queue in queues]
+    for event in events:
+        await manager.enqueue_events_for_sse(task_id, event)
+
+    received = 0
+    for stream in streams:
+        async for _ in stream:
+            received += 1
+    return received
+
+
+@pytest.mark.parametrize("subscribers", [1, 10, 100])
+def test_sse_fan_out(benchmark, loop, task_manager, subscribers):
+    events = make_events("task-1")
+
+    received = benchmark(
+        lambda: loop.run_until_complete(fan_out(task_manager, "task-1", subscribers, events))
+    )
+    assert received == subscribers * len(events)
+    assert task_manager.task_sse_subscribers["task-1"] == []
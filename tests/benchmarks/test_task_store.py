@@ -0,0 +1,48 @@
+"""Benchmarks for task storage in the in-memory and database task managers."""
+
+import itertools
+
+import pytest
+
+from common.types import Artifact, GetTaskRequest, TaskState, TaskStatus, TextPart
+from tests.benchmarks.helpers import HISTORY_SIZES, make_message, make_send_params, seed
+
+
+def test_upsert_new_task(benchmark, loop, task_manager):
+    counter = itertools.count()
+
+    def upsert():
+        return loop.run_until_complete(task_manager.upsert_task(make_send_params(f"task-{next(counter)}")))
+
+    task = benchmark(upsert)
+    assert len(task.history) == 1
+
+
+@pytest.mark.parametrize("history", HISTORY_SIZES)
+def test_upsert_existing_task(benchmark, loop, task_manager, history):
+    seed(loop, task_manager, "task-1", history)
+    params = make_send_params("task-1")
+
+    task = benchmark(lambda: loop.run_until_complete(task_manager.upsert_task(params)))
+    assert len(task.history) > history
+
+
+@pytest.mark.parametrize("history", HISTORY_SIZES)
+def test_update_store(benchmark, loop, task_manager, history):
+    seed(loop, task_manager, "task-1", history)
+    status = TaskStatus(state=TaskState.WORKING, message=make_message("partial answer", role="agent"))
+    artifacts = [Artifact(parts=[TextPart(text="answer")], index=0)]
+
+    task = benchmark(
+        lambda: loop.run_until_complete(task_manager.update_store("task-1", status, artifacts))
+    )
+    assert task.status.state == TaskState.WORKING
+
+
+@pytest.mark.parametrize("history", HISTORY_SIZES)
+def test_get_task(benchmark, loop, task_manager, history):
+    seed(loop, task_manager, "task-1", history)
+    request = GetTaskRequest(params={"id": "task-1", "historyLength": history})
+
+    response = benchmark(lambda: loop.run_until_complete(task_manager.on_get_task(request)))
+    assert len(response.result.history) == history
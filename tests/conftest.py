@@ -0,0 +1,62 @@
+"""Baseline handling for the benchmark suite.
+
+`--save-baseline` stores the current run under tests/benchmarks/.baselines and
+`--check-baseline[=FIELD:LIMIT]` compares against the latest stored baseline,
+failing on regressions beyond the limit (default median:20%). Asking for the
+check without a stored baseline is a usage error, so a CI job cannot pass
+without comparing anything.
+"""
+
+from pathlib import Path
+
+import pytest
+
+BASELINE_DIR = Path(__file__).parent / "benchmarks" / ".baselines"
+BASELINE_NAME = "baseline"
+DEFAULT_REGRESSION_LIMIT = "median:20%"
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("benchmark baseline")
+    group.addoption(
+        "--save-baseline",
+        action="store_true",
+        help=f"store this benchmark run as the baseline in {BASELINE_DIR}",
+    )
+    group.addoption(
+        "--check-baseline",
+        nargs="?",
+        const=DEFAULT_REGRESSION_LIMIT,
+        default=None,
+        metavar="FIELD:LIMIT",
+        help=f"fail if a benchmark regressed against the stored baseline (default {DEFAULT_REGRESSION_LIMIT})",
+    )
+
+
+def latest_baseline() -> Path | None:
+    baselines = sorted(BASELINE_DIR.glob(f"*/*_{BASELINE_NAME}.json"), key=lambda path: path.name)
+    return baselines[-1] if baselines else None
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config):
+    save = config.getoption("save_baseline")
+    check = config.getoption("check_baseline")
+    if not (save or check):
+        return
+    if not hasattr(config.option, "benchmark_storage"):
+        raise pytest.UsageError("--save-baseline/--check-baseline require pytest-benchmark")
+
+    from pytest_benchmark.utils import parse_compare_fail
+
+    config.option.benchmark_storage = f"file://{BASELINE_DIR}"
+    if save:
+        config.option.benchmark_save = BASELINE_NAME
+    if check:
+        baseline = latest_baseline()
+        if baseline is None:
+            raise pytest.UsageError(
+                f"--check-baseline: no stored benchmark baseline in {BASELINE_DIR}, run with --save-baseline first"
+            )
+        config.option.benchmark_compare = str(baseline)
+        config.option.benchmark_compare_fail = [parse_compare_fail(check)]
@@ -0,0 +1,43 @@
+"""Helpers for running RagFlowAgent against the in-process mock RagFlow server."""
+
+import httpx
+
+from agents.ragflow.agent import RagFlowAgent
+
+
+class RecordingTransport(httpx.ASGITransport):
+    """ASGI transport to the mock server that records every request."""
+
+    def __init__(self, app):
+        super().__init__(app=app)
+        self.requests: list[tuple[str, str]] = []
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append((request.method, request.url.path))
+        return await super().handle_async_request(request)
+
+    def count(self, method: str, suffix: str) -> int:
+        return sum(1 for m, path in self.requests if m == method and path.endswith(suffix))
+
+    def session_posts(self) -> int:
+        return self.count("POST", "/sessions")
+
+    def completions(self) -> int:
+        return self.count("POST", "/completions")
+
+
+def setup_ragflow_env(monkeypatch, tmp_path):
+    monkeypatch.setenv("RAGFLOW_API_KEY", "test-key")
+    monkeypatch.setenv("RAGFLOW_API_URL", "http://ragflow.test")
+    monkeypatch.setenv("SESSION_DB_URL", f"sqlite:///{tmp_path / 'sessions.db'}")
+
+
+def make_ragflow_agent(
+    mock_app, transport: RecordingTransport = None, **kwargs
+) -> tuple[RagFlowAgent, RecordingTransport]:
+    """Creates an agent whose HTTP client talks to `mock_app`; call from the test's event loop."""
+    kwargs.setdefault("chat_id", "mock")
+    agent = RagFlowAgent(**kwargs)
+    transport = transport or RecordingTransport(mock_app)
+    agent._client = httpx.AsyncClient(transport=transport)
+    return agent, transport
@@ -0,0 +1,161 @@
+"""Tests for admission control and the ServerBusyError response it produces."""
+
+import asyncio
+
+import httpx
+import pytest
+
+from agents.ragflow.task_manager import RagFlowTaskManager
+from common.server.server import A2AServer
+from common.server.task_manager import InMemoryTaskManager
+from common.types import AgentCapabilities, AgentCard, ServerBusyError
+from common.utils.admission import AdmissionController, OverloadedError, _Slots
+
+
+def test_slots_reject_when_the_queue_is_full():
+    async def main():
+        slots = _Slots(limit=1, max_waiters=1)
+        await slots.acquire(1, "global")
+        waiter = asyncio.create_task(slots.acquire(1, "global"))
+        await asyncio.sleep(0)
+        with pytest.raises(OverloadedError) as error:
+            await slots.acquire(1, "global")
+        assert (error.value.reason, error.value.scope) == ("queue_full", "global")
+        slots.release()
+        await waiter
+        assert slots.active == 1
+
+    asyncio.run(main())
+
+
+def test_slots_reject_after_the_wait_timeout():
+    async def main():
+        slots = _Slots(limit=1, max_waiters=4)
+        await slots.acquire(1, "session")
+        with pytest.raises(OverloadedError) as error:
+            await slots.acquire(0.01, "session")
+        assert error.value.reason == "timeout"
+        assert slots.waiting == 0
+        slots.release()
+        assert slots.idle
+
+    asyncio.run(main())
+
+
+def test_slots_are_handed_to_waiters_in_fifo_order():
+    async def main():
+        slots = _Slots(limit=1, max_waiters=10)
+        await slots.acquire(1, "global")
+        order = []
+
+        async def wait(name):
+            await slots.acquire(1, "global")
+            order.append(name)
+
+        waiters = [asyncio.create_task(wait(name)) for name in "abc"]
+        await asyncio.sleep(0)
+        # A newcomer queues behind the waiters even though a slot is being freed
+        slots.release()
+        late = asyncio.create_task(wait("late"))
+        for _ in range(3):
+            await asyncio.sleep(0)
+            # The slot passes straight on, so active never drops
+            assert slots.active == 1
+            slots.release()
+        await asyncio.gather(*waiters, late)
+        assert order == ["a", "b", "c", "late"]
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_does_not_leak_a_handed_over_slot():
+    async def main():
+        slots = _Slots(limit=1, max_waiters=10)
+        await slots.acquire(1, "global")
+        first = asyncio.create_task(slots.acquire(1, "global"))
+        second = asyncio.create_task(slots.acquire(1, "global"))
+        await asyncio.sleep(0)
+        # Hand the slot to the first waiter, then cancel it before it runs
+        slots.release()
+        first.cancel()
+        await second
+        assert slots.active == 1 and slots.waiting == 0
+
+    asyncio.run(main())
+
+
+def test_controller_limits_each_session_and_releases_once():
+    async def main():
+        admission = AdmissionController(max_concurrent=4, max_per_session=1, max_queued_per_session=0)
+        release = await admission.acquire("s1")
+        with pytest.raises(OverloadedError) as error:
+            await admission.acquire("s1")
+        assert (error.value.scope, error.value.reason) == ("session", "queue_full")
+        assert error.value.retry_after == admission.retry_after
+        other = await admission.acquire("s2")
+        assert admission.active == 2
+
+        release()
+        release()
+        other()
+        assert admission.active == 0
+        assert admission.rejected == 1
+        assert admission._sessions == {}
+
+    asyncio.run(main())
+
+
+class BlockingAgent:
+    def __init__(self):
+        self.release = asyncio.Event()
+
+    async def invoke(self, query, session_id):
+        await self.release.wait()
+        return {"is_task_complete": True, "require_user_input": False, "content": "done", "references": None}
+
+
+class Store(InMemoryTaskManager):
+    async def on_send_task(self, request):
+        raise NotImplementedError
+
+    async def on_send_task_subscribe(self, request):
+        raise NotImplementedError
+
+
+def send_task(task_id: str, session_id: str) -> dict:
+    return {
+        "jsonrpc": "2.0",
+        "id": task_id,
+        "method": "tasks/send",
+        "params": {
+            "id": task_id,
+            "sessionId": session_id,
+            "message": {"role": "user", "parts": [{"type": "text", "text": "hello"}]},
+        },
+    }
+
+
+def test_rejected_task_gets_server_busy_error_with_retry_after():
+    async def main():
+        agent = BlockingAgent()
+        admission = AdmissionController(max_concurrent=1, max_queued=0, retry_after=2.5)
+        task_manager = RagFlowTaskManager(Store(), agent, None, admission=admission)
+        card = AgentCard(name="test", url="http://test/", version="1", capabilities=AgentCapabilities(), skills=[])
+        server = A2AServer(agent_card=card, task_manager=task_manager)
+
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            running = asyncio.create_task(client.post("/", json=send_task("t1", "s1")))
+            while admission.active == 0:
+                await asyncio.sleep(0.01)
+            busy = await client.post("/", json=send_task("t2", "s2"))
+            agent.release.set()
+            done = await running
+        return busy, done
+
+    busy, done = asyncio.run(main())
+    body = busy.json()
+    assert body["error"]["code"] == ServerBusyError().code == -32050
+    assert body["error"]["data"] == {"reason": "global_queue_full", "retryAfter": 2.5}
+    assert busy.headers["Retry-After"] == "3"
+    assert done.json()["result"]["status"]["state"] == "completed"
@@ -0,0 +1,123 @@
+"""Tests for agent card serving (ETag, 304) and the caching card resolver."""
+
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+import uvicorn
+from starlette.testclient import TestClient
+
+from common.client.card_resolver import A2ACardResolver
+from common.client.http_pool import HTTP_CLIENT_POOL
+from common.server.server import A2AServer
+from common.server.task_manager import InMemoryTaskManager
+from common.types import AgentCapabilities, AgentCard
+
+
+class LiveLimitsTaskManager(InMemoryTaskManager):
+    def __init__(self):
+        super().__init__()
+        self.active = 0
+
+    async def on_send_task(self, request):
+        raise NotImplementedError
+
+    async def on_send_task_subscribe(self, request):
+        raise NotImplementedError
+
+    def get_card_limits(self):
+        return {"maxConcurrentTasks": 8, "activeTasks": self.active, "queuedTasks": 0}
+
+
+def make_card(description: str = "test agent") -> AgentCard:
+    return AgentCard(
+        name="test",
+        description=description,
+        url="http://127.0.0.1/",
+        version="1",
+        capabilities=AgentCapabilities(),
+        skills=[],
+        metrics={"uptime": "99%"},
+    )
+
+
+@pytest.fixture
+def server():
+    return A2AServer(agent_card=make_card(), task_manager=LiveLimitsTaskManager(), card_metrics_interval=0)
+
+
+def test_runtime_stats_update_the_body_but_not_the_etag(server):
+    client = TestClient(server.app)
+    first = client.get("/.well-known/agent.json")
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"')
+    assert first.json()["limits"]["activeTasks"] == 0
+
+    server.task_manager.active = 5
+    second = client.get("/.well-known/agent.json")
+    assert second.headers["etag"] == etag
+    assert second.json()["limits"]["activeTasks"] == 5
+    assert second.json()["metrics"]["uptime"] == "99%"
+
+    revalidated = client.get("/.well-known/agent.json", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+
+
+def test_static_changes_update_the_etag(server):
+    client = TestClient(server.app)
+    etag = client.get("/.well-known/agent.json").headers["etag"]
+
+    server.agent_card = make_card("changed description")
+    response = client.get("/.well-known/agent.json", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["description"] == "changed description"
+
+
+@pytest.fixture
+def card_url(server):
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    uv = uvicorn.Server(uvicorn.Config(server.app, log_level="error"))
+    thread = threading.Thread(target=uv.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not uv.started:
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{sock.getsockname()[1]}"
+    uv.should_exit = True
+    thread.join()
+
+
+def pooled_refs() -> list[int]:
+    return [refs for clients in HTTP_CLIENT_POOL._loops.values() for _, refs in clients.values()]
+
+
+def test_resolver_keeps_one_pooled_client_until_closed(card_url):
+    async def main():
+        async with A2ACardResolver(card_url, use_cache=False) as resolver:
+            await resolver.get_agent_card_async()
+            client = resolver._lease.client()
+            await resolver.get_agent_card_async(revalidate=True)
+            assert resolver._lease.client() is client
+            assert not client.is_closed
+            assert pooled_refs() == [1]
+        assert client.is_closed
+        assert pooled_refs() == []
+
+    asyncio.run(main())
+
+
+def test_resolver_revalidation_is_answered_with_304_when_only_stats_changed(card_url, server):
+    async def main():
+        async with A2ACardResolver(card_url) as resolver:
+            card = await resolver.get_agent_card_async()
+            server.task_manager.active = 3
+            # A 200 would carry the new stats; a 304 keeps the cached card
+            revalidated = await resolver.get_agent_card_async(revalidate=True)
+            assert revalidated == card
+            assert revalidated.limits["activeTasks"] == 0
+            resolver.invalidate()
+
+    asyncio.run(main())
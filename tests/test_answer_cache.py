@@ -0,0 +1,131 @@
+"""Tests for the RagFlow answer cache: exact and similarity lookups, expiry and invalidation."""
+
+import asyncio
+import types
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+
+from agents.ragflow import answer_cache as answer_cache_module
+from agents.ragflow.answer_cache import AnswerCache
+
+SCOPE = "chat:kb"
+
+
+class ManualClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = ManualClock()
+    monkeypatch.setattr(answer_cache_module, "time", types.SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def test_exact_match_ignores_case_width_punctuation_and_spacing():
+    cache = AnswerCache()
+    cache.put(SCOPE, "What is A2A?", "A protocol", {"chunks": [1]})
+
+    hit = cache.get(SCOPE, "  what   is a2a ")
+    assert hit is not None
+    assert hit.to_result() == {
+        "is_task_complete": True,
+        "require_user_input": False,
+        "content": "A protocol",
+        "references": {"chunks": [1]},
+    }
+    assert cache.get(SCOPE, "ＷＨＡＴ　ＩＳ　Ａ２Ａ？") is hit
+    assert cache.get(SCOPE, "What is HTTP?") is None
+    # Scopes are isolated
+    assert cache.get("chat:other", "What is A2A?") is None
+
+
+def test_similarity_match_requires_the_threshold():
+    cache = AnswerCache(similarity_threshold=0.8)
+    cache.put(SCOPE, "如何配置RagFlow的知识库检索参数", "answer")
+
+    # Jaccard similarity of the trigrams: 0.89, 0.55 and 0
+    assert cache.get(SCOPE, "请问如何配置RagFlow的知识库检索参数").content == "answer"
+    assert cache.get(SCOPE, "如何配置RagFlow知识库的检索参数") is None
+    assert cache.get(SCOPE, "今天天气怎么样") is None
+
+
+def test_similarity_is_off_by_default():
+    cache = AnswerCache()
+    cache.put(SCOPE, "如何配置RagFlow的知识库检索参数", "answer")
+    assert cache.get(SCOPE, "请问如何配置RagFlow的知识库检索参数") is None
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = AnswerCache(ttl=60, similarity_threshold=0.5)
+    cache.put(SCOPE, "what is a2a", "answer")
+    clock.now += 59
+    assert cache.get(SCOPE, "what is a2a") is not None
+    clock.now += 2
+    assert cache.get(SCOPE, "what is a2a") is None
+    assert cache.get(SCOPE, "what is a2a protocol") is None
+    assert cache.stats() == {"entries": 0}
+    assert cache._buckets == {}
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AnswerCache(max_entries=2)
+    cache.put(SCOPE, "one", "1")
+    cache.put(SCOPE, "two", "2")
+    cache.get(SCOPE, "one")
+    cache.put(SCOPE, "three", "3")
+    assert cache.get(SCOPE, "two") is None
+    assert cache.get(SCOPE, "one") is not None
+    assert cache.get(SCOPE, "three") is not None
+
+
+def test_excluded_and_empty_questions_are_not_cacheable():
+    cache = AnswerCache(exclude_pattern=r"^(它|这个)")
+    assert cache.is_cacheable("什么是A2A")
+    assert not cache.is_cacheable("它支持流式吗")
+    assert not cache.is_cacheable("   ")
+    cache.put(SCOPE, "empty answer", "")
+    assert cache.get(SCOPE, "empty answer") is None
+
+
+def test_invalidate_by_query_scope_or_everything():
+    cache = AnswerCache(similarity_threshold=0.5)
+    cache.put(SCOPE, "first question", "1")
+    cache.put(SCOPE, "second question", "2")
+    cache.put("chat:other", "first question", "3")
+
+    assert cache.invalidate(SCOPE, "FIRST question!") == 1
+    assert cache.get(SCOPE, "first question") is None
+    assert cache.get(SCOPE, "second question") is not None
+
+    assert cache.invalidate(SCOPE) == 1
+    assert cache.get("chat:other", "first question") is not None
+    assert cache.invalidate() == 1
+    assert cache.stats() == {"entries": 0}
+    assert cache._buckets == {}
+
+
+def test_invalidate_endpoint_requires_the_token():
+    cache = AnswerCache()
+    cache.put(SCOPE, "question", "answer")
+    app = Starlette()
+    app.add_route("/invalidate", cache.invalidate_endpoint("secret"), methods=["POST"])
+
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            denied = await client.post("/invalidate")
+            bad = await client.post("/invalidate", content=b"[1]", headers={"Authorization": "Bearer secret"})
+            ok = await client.post("/invalidate", json={"scope": SCOPE}, headers={"Authorization": "Bearer secret"})
+        return denied, bad, ok
+
+    denied, bad, ok = asyncio.run(main())
+    assert denied.status_code == 401
+    assert bad.status_code == 400
+    assert ok.json() == {"removed": 1, "entries": 0}
@@ -0,0 +1,176 @@
+"""Tests for choosing a RagFlow assistant and ejecting ones that keep failing.
+
+The router's clock and tie-breaking come from patched module references, so
+every choice and ejection window is deterministic.
+"""
+
+import types
+
+import pytest
+
+from agents.ragflow import assistant_router as router_module
+from agents.ragflow.assistant_router import AssistantRouter, RagFlowAssistant
+
+
+class ManualClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = ManualClock()
+    monkeypatch.setattr(router_module, "time", types.SimpleNamespace(monotonic=clock))
+    # Ties go to the first candidate
+    monkeypatch.setattr(router_module, "random", types.SimpleNamespace(choice=lambda items: items[0]))
+    return clock
+
+
+def make_router(count: int, **kwargs) -> AssistantRouter:
+    return AssistantRouter([RagFlowAssistant("chat", f"a{i}") for i in range(count)], **kwargs)
+
+
+def fail(router: AssistantRouter, assistant: RagFlowAssistant, times: int):
+    for _ in range(times):
+        router.acquire(assistant)
+        router.release(assistant, False)
+
+
+def test_unknown_policy_and_empty_pool_are_rejected():
+    with pytest.raises(ValueError):
+        make_router(0)
+    with pytest.raises(ValueError):
+        make_router(2, policy="random")
+
+
+def test_least_outstanding_picks_the_idlest_assistant(clock):
+    router = make_router(3)
+    a0, a1, a2 = router.assistants
+    router.acquire(a0)
+    router.acquire(a0)
+    router.acquire(a1)
+    assert router.select() is a2
+    router.acquire(a2)
+    router.acquire(a2)
+    assert router.select() is a1
+
+    router.release(a0)
+    router.release(a0)
+    assert router.select() is a0
+    assert a0.outstanding == 0
+
+
+def test_ewma_tracks_latency(clock):
+    router = make_router(2, policy="ewma", ewma_alpha=0.5)
+    a0, _ = router.assistants
+    router.observe_latency(a0, 1.0)
+    assert a0.latency_ewma == 1.0
+    router.observe_latency(a0, 3.0)
+    assert a0.latency_ewma == 2.0
+
+
+def test_ewma_weighs_latency_by_load(clock):
+    router = make_router(2, policy="ewma", ewma_alpha=1.0)
+    fast, slow = router.assistants
+    router.observe_latency(fast, 0.1)
+    router.observe_latency(slow, 0.5)
+    assert router.select() is fast
+
+    # 0.1 * 6 in flight scores worse than 0.5 * 1
+    for _ in range(5):
+        router.acquire(fast)
+    assert router.select() is slow
+
+
+def test_ewma_scores_new_assistants_at_the_average(clock):
+    router = make_router(3, policy="ewma", ewma_alpha=1.0)
+    a0, a1, new = router.assistants
+    router.observe_latency(a0, 0.2)
+    router.observe_latency(a1, 0.4)
+    # The newcomer is scored at 0.3, below a1 but above a0
+    assert router.select() is a0
+    router.acquire(a0)
+    assert router.select() is new
+
+
+def test_assistant_is_ejected_after_consecutive_failures(clock):
+    router = make_router(4, eject_after=3, eject_time=30)
+    a0 = router.assistants[0]
+    fail(router, a0, 2)
+    router.acquire(a0)
+    router.release(a0, True)
+    fail(router, a0, 2)
+    assert not a0.is_ejected()
+
+    fail(router, a0, 1)
+    assert a0.is_ejected()
+    assert a0.ejected_until == clock.now + 30
+    # Ejected assistants are skipped even when idlest
+    for other in router.assistants[1:]:
+        router.acquire(other)
+    assert router.select() is not a0
+
+
+def test_assistant_is_readmitted_and_ejection_time_doubles(clock):
+    router = make_router(4, eject_after=1, eject_time=30, max_eject_time=100)
+    a0 = router.assistants[0]
+    for other in router.assistants[1:]:
+        router.acquire(other)
+
+    fail(router, a0, 1)
+    clock.now += 29
+    assert router.select() is not a0
+    clock.now += 1
+    assert router.select() is a0
+
+    fail(router, a0, 1)
+    assert a0.ejected_until == clock.now + 60
+    clock.now += 60
+    fail(router, a0, 1)
+    # Capped at max_eject_time
+    assert a0.ejected_until == clock.now + 100
+
+    # A success resets the backoff
+    clock.now += 100
+    router.acquire(a0)
+    router.release(a0, True)
+    fail(router, a0, 1)
+    assert a0.ejected_until == clock.now + 30
+
+
+def test_ejections_are_capped_by_the_ratio(clock):
+    router = make_router(4, eject_after=1, max_ejected_ratio=0.5)
+    for assistant in router.assistants:
+        fail(router, assistant, 1)
+    assert [a.is_ejected() for a in router.assistants] == [True, True, False, False]
+
+
+def test_all_ejected_falls_back_to_every_assistant(clock):
+    router = make_router(2, eject_after=1, max_ejected_ratio=1.0)
+    a0, a1 = router.assistants
+    fail(router, a0, 1)
+    fail(router, a1, 1)
+    assert a0.is_ejected() and a1.is_ejected()
+    router.acquire(a0)
+    assert router.select() is a1
+
+
+def test_neutral_outcomes_do_not_count_as_failures(clock):
+    router = make_router(2, eject_after=1)
+    a0 = router.assistants[0]
+    router.acquire(a0)
+    router.release(a0, None)
+    assert a0.consecutive_failures == 0 and not a0.is_ejected()
+
+
+def test_assistants_outside_the_pool_are_never_ejected_or_selected(clock):
+    router = make_router(2, eject_after=1, max_ejected_ratio=1.0)
+    legacy = router.get("agent", "old")
+    assert router.get("agent", "old") is legacy
+    assert router.get("chat", "a0") is router.assistants[0]
+    fail(router, legacy, 3)
+    assert not legacy.is_ejected()
+    assert all(router.select() is not legacy for _ in range(5))
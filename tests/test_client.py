@@ -0,0 +1,114 @@
+"""Tests for how A2AClient.send_task_streaming maps replies and transport errors."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from common.client.client import A2AClient
+from common.types import A2AClientHTTPError, A2AClientJSONError, TaskState
+
+URL = "http://agent.test/"
+PAYLOAD = {"id": "task-1", "message": {"role": "user", "parts": [{"type": "text", "text": "hi"}]}}
+
+
+def stream(handler, **kwargs) -> list:
+    """Runs send_task_streaming against `handler` and collects the responses."""
+
+    async def main():
+        client = A2AClient(url=URL, **kwargs)
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            client._get_client = lambda: http
+            return [response async for response in client.send_task_streaming(PAYLOAD)]
+
+    return asyncio.run(main())
+
+
+def status_event(request_id, state: str, final: bool) -> str:
+    event = {"id": "task-1", "status": {"state": state}, "final": final}
+    return f"data: {json.dumps({'jsonrpc': '2.0', 'id': request_id, 'result': event})}\n\n"
+
+
+def test_sse_events_are_yielded_in_order():
+    seen = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen["body"] = json.loads(request.content)
+        seen["accept"] = request.headers.get("accept")
+        request_id = seen["body"]["id"]
+        body = status_event(request_id, "working", False) + status_event(request_id, "completed", True)
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, text=body)
+
+    responses = stream(handler)
+
+    assert seen["body"]["method"] == "tasks/sendSubscribe"
+    assert seen["accept"] == "text/event-stream"
+    assert [r.result.status.state for r in responses] == [TaskState.WORKING, TaskState.COMPLETED]
+    assert responses[-1].result.final
+
+
+@pytest.mark.parametrize("status_code", [200, 503])
+def test_json_error_reply_is_yielded_as_a_response(status_code):
+    def handler(request: httpx.Request) -> httpx.Response:
+        error = {"code": -32050, "message": "Server busy", "data": {"retryAfter": 1}}
+        return httpx.Response(
+            status_code, json={"jsonrpc": "2.0", "id": json.loads(request.content)["id"], "error": error}
+        )
+
+    [response] = stream(handler)
+
+    assert response.result is None
+    assert response.error.code == -32050
+    assert response.error.data == {"retryAfter": 1}
+
+
+def test_non_json_http_error_raises_http_error():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(502, headers={"content-type": "text/html"}, text="<h1>Bad Gateway</h1>")
+
+    with pytest.raises(A2AClientHTTPError) as error:
+        stream(handler)
+
+    assert error.value.status_code == 502
+    assert "Bad Gateway" in error.value.message
+
+
+def test_non_json_success_reply_raises_json_error():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, headers={"content-type": "text/plain"}, text="ok")
+
+    with pytest.raises(A2AClientJSONError):
+        stream(handler)
+
+
+def test_malformed_sse_data_raises_json_error():
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, text="data: {oops\n\n")
+
+    with pytest.raises(A2AClientJSONError):
+        stream(handler)
+
+
+def test_stream_timeout_maps_to_408():
+    seen = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen["timeout"] = request.extensions["timeout"]
+        raise httpx.ReadTimeout("no event within the read timeout", request=request)
+
+    with pytest.raises(A2AClientHTTPError) as error:
+        stream(handler, stream_timeout=httpx.Timeout(5, read=42))
+
+    assert error.value.status_code == 408
+    assert seen["timeout"]["read"] == 42
+
+
+def test_connection_error_maps_to_400():
+    def handler(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("connection refused", request=request)
+
+    with pytest.raises(A2AClientHTTPError) as error:
+        stream(handler)
+
+    assert error.value.status_code == 400
@@ -0,0 +1,84 @@
+"""Tests for the shared HTTP client pool and how A2AClient uses it across event loops."""
+
+import asyncio
+import gc
+
+from common.client.client import A2AClient
+from common.client.http_pool import HTTPClientPool, HTTP_CLIENT_POOL
+
+URL = "http://127.0.0.1:9/"
+
+
+def refcounts(pool: HTTPClientPool) -> list[int]:
+    return [refs for clients in pool._loops.values() for _, refs in clients.values()]
+
+
+def test_clients_are_shared_per_origin_and_closed_with_the_last_reference():
+    async def main():
+        pool = HTTPClientPool()
+        key_a, client_a = pool.acquire(URL)
+        key_b, client_b = pool.acquire("http://127.0.0.1:9/other")
+        _, other_host = pool.acquire("http://127.0.0.2:9/")
+        assert client_a is client_b
+        assert other_host is not client_a
+
+        await pool.release(key_a)
+        assert not client_a.is_closed
+        await pool.release(key_b)
+        assert client_a.is_closed
+        # Releasing again is a no-op rather than driving the count negative
+        await pool.release(key_b)
+        assert refcounts(pool) == [1]
+        await pool.aclose_all()
+        assert other_host.is_closed
+
+    asyncio.run(main())
+
+
+def test_a_new_loop_never_gets_a_client_of_a_dead_loop():
+    pool = HTTPClientPool()
+
+    async def acquire():
+        return pool.acquire(URL)
+
+    _, first = asyncio.run(acquire())
+    gc.collect()
+    # The first loop is gone, even if the new loop ends up with the same id()
+    assert len(pool._loops) == 0
+    _, second = asyncio.run(acquire())
+    assert second is not first
+
+
+def test_client_releases_its_reference_when_the_loop_changes():
+    client = A2AClient(url=URL)
+
+    async def use():
+        return client._get_client()
+
+    async def use_and_close():
+        pooled = client._get_client()
+        assert refcounts(HTTP_CLIENT_POOL) == [1]
+        await client.aclose()
+        return pooled
+
+    first = asyncio.run(use())
+    second = asyncio.run(use_and_close())
+    gc.collect()
+    assert second is not first
+    assert second.is_closed
+    assert refcounts(HTTP_CLIENT_POOL) == []
+
+
+def test_release_from_another_loop_closes_the_client_on_its_own_loop():
+    async def main():
+        pool = HTTPClientPool()
+        key, client = pool.acquire(URL)
+        await asyncio.to_thread(pool.release_nowait, key)
+        for _ in range(10):
+            if client.is_closed:
+                break
+            await asyncio.sleep(0.01)
+        assert client.is_closed
+        assert refcounts(pool) == []
+
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+"""Smoke tests for the kbs_cli host against an A2A server backed by the mock RagFlow server."""
+
+import asyncio
+import io
+import json
+import socket
+import threading
+import time
+
+import pytest
+import uvicorn
+from click.testing import CliRunner
+from rich.console import Console
+
+import hosts.kbs_cli.__main__ as kbs_cli
+from agents.ragflow.mock_server import MockConfig, MockRagFlowServer
+from agents.ragflow.task_manager import RagFlowTaskManager
+from common.client import A2AClient
+from common.server.server import A2AServer
+from common.server.task_manager import InMemoryTaskManager
+from common.types import AgentCapabilities, AgentCard
+from hosts.kbs_cli.bench import BenchRunner
+from tests.helpers import make_ragflow_agent, setup_ragflow_env
+
+
+class Store(InMemoryTaskManager):
+    async def on_send_task(self, request):
+        raise NotImplementedError
+
+    async def on_send_task_subscribe(self, request):
+        raise NotImplementedError
+
+
+@pytest.fixture
+def mock():
+    return MockRagFlowServer(MockConfig(token_rate=0, latency="fixed:0", answer_tokens=5, reference_chunks=2))
+
+
+@pytest.fixture
+def agent_url(monkeypatch, tmp_path, mock):
+    """Serves RagFlowTaskManager over HTTP; RagFlow calls go to the in-process mock."""
+    setup_ragflow_env(monkeypatch, tmp_path)
+    # Every bench session asks the same question; keep one RagFlow call per task
+    agent, _ = make_ragflow_agent(mock.app, single_flight=False)
+    card = AgentCard(
+        name="ragflow", url="http://127.0.0.1/", version="1",
+        capabilities=AgentCapabilities(streaming=True), skills=[],
+    )
+    server = A2AServer(agent_card=card, task_manager=RagFlowTaskManager(Store(), agent, None))
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    uv = uvicorn.Server(uvicorn.Config(server.app, log_level="error"))
+    thread = threading.Thread(target=uv.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not uv.started:
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{sock.getsockname()[1]}/"
+    uv.should_exit = True
+    thread.join()
+
+
+def test_bench_reports_counts_for_each_operation(agent_url, mock, tmp_path):
+    output = tmp_path / "bench.json"
+
+    result = CliRunner().invoke(
+        kbs_cli.cli,
+        ["--timeout", "10", "bench", "--url", agent_url, "-c", "2", "-n", "4",
+         "--mix", "send=1,stream=1,get=1", "-o", str(output)],
+    )
+
+    assert result.exit_code == 0, result.output
+    summary = json.loads(output.read_text(encoding="utf-8"))["summary"]
+    total = summary["total"]
+    assert total["requests"] == 8
+    assert total["errors"] == 0, total["error_types"]
+    assert sum(summary[op]["requests"] for op in ("send", "stream", "get") if op in summary) == 8
+    # tasks/get is answered from the task store, every other request reaches RagFlow once
+    upstream = summary.get("send", {}).get("requests", 0) + summary.get("stream", {}).get("requests", 0)
+    assert mock.stats["completions"] + mock.stats["stream_completions"] == upstream
+    if "stream" in summary:
+        assert summary["stream"]["first_event"]["p50"] is not None
+
+
+def test_bench_runner_counts_failed_requests(agent_url):
+    async def main():
+        runner = BenchRunner(url=agent_url + "missing", sessions=2, requests_per_session=2, mix="send=1", timeout=5)
+        return await runner.run()
+
+    total = asyncio.run(main())["summary"]["total"]
+    assert total["requests"] == 4
+    assert total["errors"] == 4
+    assert total["latency"]["p50"] is None
+
+
+def test_stream_answer_renders_the_streamed_answer(agent_url, monkeypatch):
+    output = io.StringIO()
+    monkeypatch.setattr(kbs_cli, "console", Console(file=output, width=120))
+
+    async def main():
+        params = {
+            "id": "task-1",
+            "sessionId": "session-1",
+            "message": {"role": "user", "parts": [{"type": "text", "text": "什么是A2A？"}]},
+        }
+        async with A2AClient(url=agent_url) as client:
+            return await kbs_cli.stream_answer(client, params, "什么是A2A？")
+
+    assert asyncio.run(main()) is True
+    text = output.getvalue()
+    assert "首个事件" in text
+    assert "知识库引用" in text
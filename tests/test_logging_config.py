@@ -0,0 +1,72 @@
+"""Tests for the log rate limiter and the rate limit settings."""
+
+import logging
+import types
+
+import pytest
+
+from common.utils import logging_config as logging_config_module
+from common.utils.logging_config import RateLimitFilter, configure_logging, parse_rate_limits, shutdown_logging
+
+
+def make_record(name: str, level: int = logging.INFO, line: int = 1) -> logging.LogRecord:
+    return logging.LogRecord(name, level, "module.py", line, "message", None, None)
+
+
+def test_only_configured_prefixes_are_limited():
+    limiter = RateLimitFilter({"agents.ragflow": 1})
+    assert [limiter.filter(make_record("agents.ragflow.agent")) for _ in range(3)] == [True, False, False]
+    assert all(limiter.filter(make_record("common.server.server")) for _ in range(10))
+    assert all(limiter.filter(make_record("agents.ragflowx")) for _ in range(10))
+
+
+def test_warnings_and_other_call_sites_are_not_limited():
+    limiter = RateLimitFilter({"": 1})
+    assert limiter.filter(make_record("app", line=1))
+    assert not limiter.filter(make_record("app", line=1))
+    assert limiter.filter(make_record("app", line=2))
+    assert all(limiter.filter(make_record("app", logging.WARNING, line=1)) for _ in range(5))
+
+
+def test_next_record_reports_the_suppressed_count(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(logging_config_module, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    limiter = RateLimitFilter({"app": 1})
+    limiter.filter(make_record("app"))
+    assert not limiter.filter(make_record("app"))
+    assert not limiter.filter(make_record("app"))
+    now[0] += 1
+    record = make_record("app")
+    assert limiter.filter(record)
+    assert record.suppressed == 2
+
+
+def test_parse_rate_limits():
+    assert parse_rate_limits("") == {}
+    assert parse_rate_limits("20, agents.ragflow.agent=5") == {"": 20.0, "agents.ragflow.agent": 5.0}
+
+
+@pytest.fixture
+def restore_root_logger():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield
+    shutdown_logging()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    root.setLevel(level)
+
+
+def test_rate_limiting_is_off_by_default(monkeypatch, restore_root_logger):
+    monkeypatch.delenv("LOG_RATE_LIMITS", raising=False)
+    configure_logging(force=True)
+    (handler,) = logging.getLogger().handlers
+    assert not any(isinstance(f, RateLimitFilter) for f in handler.filters)
+
+    monkeypatch.setenv("LOG_RATE_LIMITS", "agents.ragflow.agent=5")
+    configure_logging(force=True)
+    (handler,) = logging.getLogger().handlers
+    (limiter,) = [f for f in handler.filters if isinstance(f, RateLimitFilter)]
+    assert limiter.rates == {"agents.ragflow.agent": 5.0}
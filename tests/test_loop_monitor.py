@@ -0,0 +1,55 @@
+"""Tests for the event loop lag monitor and blocking-call watchdog."""
+
+import asyncio
+import logging
+import time
+
+from common.utils.loop_monitor import LOOP_LAG, LOOP_STALLS, EventLoopMonitor
+
+
+def stalls() -> float:
+    return LOOP_STALLS.labels().value
+
+
+def blocking_call(seconds: float):
+    time.sleep(seconds)
+
+
+def test_blocked_loop_is_detected(caplog):
+    monitor = EventLoopMonitor(interval=0.02, threshold=0.05)
+    before = stalls()
+    lag_count_before, _ = LOOP_LAG.totals()
+
+    async def main():
+        monitor.start()
+        assert monitor.running
+        await asyncio.sleep(0.05)
+        blocking_call(0.3)
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+
+    with caplog.at_level(logging.WARNING, logger="common.utils.loop_monitor"):
+        asyncio.run(main())
+
+    assert stalls() == before + 1
+    assert monitor.max_lag >= 0.3 - monitor.interval
+    assert LOOP_LAG.totals()[0] > lag_count_before
+    assert not monitor.running
+    # the watchdog logs the stack of the blocking call while it is still running
+    assert any("blocking_call" in record.getMessage() for record in caplog.records)
+    assert any("was blocked for" in record.getMessage() for record in caplog.records)
+
+
+def test_idle_loop_reports_no_stall():
+    monitor = EventLoopMonitor(interval=0.01, threshold=0.2)
+    before = stalls()
+
+    async def main():
+        monitor.start()
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+
+    asyncio.run(main())
+
+    assert stalls() == before
+    assert monitor.max_lag < 0.2
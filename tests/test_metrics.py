@@ -0,0 +1,109 @@
+"""Tests for the Prometheus text exposition rendered by the metrics registry."""
+
+import asyncio
+
+import pytest
+
+from common.utils.metrics import Gauge, MetricsRegistry, _Metric, timed
+
+
+def test_counter_renders_with_the_total_suffix():
+    registry = MetricsRegistry()
+    counter = registry.counter("requests", "Requests handled")
+    counter.inc()
+    counter.inc(2)
+    assert registry.render() == (
+        "# HELP requests Requests handled\n"
+        "# TYPE requests counter\n"
+        "requests_total 3\n"
+    )
+    with pytest.raises(ValueError):
+        counter.inc(-1)
+
+
+def test_labelled_gauge_escapes_label_values():
+    registry = MetricsRegistry()
+    gauge = registry.gauge("queue_depth", "Queued items", ["queue", "host"])
+    gauge.labels("main", "a").set(2.5)
+    gauge.labels(queue='quote"back\\slash', host="line\nbreak").inc()
+    gauge.labels("main", "a").dec(0.5)
+    assert registry.render() == (
+        "# HELP queue_depth Queued items\n"
+        "# TYPE queue_depth gauge\n"
+        'queue_depth{queue="main",host="a"} 2\n'
+        'queue_depth{queue="quote\\"back\\\\slash",host="line\\nbreak"} 1\n'
+    )
+
+
+def test_histogram_renders_cumulative_buckets_sum_and_count():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency", ["op"], buckets=[1, 0.1])
+    histogram.labels("read").observe(0.05)
+    histogram.labels("read").observe(0.5)
+    histogram.labels("read").observe(5)
+    assert registry.render() == (
+        "# HELP latency_seconds Latency\n"
+        "# TYPE latency_seconds histogram\n"
+        'latency_seconds_bucket{op="read",le="0.1"} 1\n'
+        'latency_seconds_bucket{op="read",le="1"} 2\n'
+        'latency_seconds_bucket{op="read",le="+Inf"} 3\n'
+        'latency_seconds_sum{op="read"} 5.55\n'
+        'latency_seconds_count{op="read"} 3\n'
+    )
+    assert histogram.totals(op="read") == (3, pytest.approx(5.55))
+    assert histogram.totals(op="write") == (0, 0.0)
+
+
+def test_metrics_are_registered_once_per_name():
+    registry = MetricsRegistry()
+    counter = registry.counter("events", "Events")
+    assert registry.counter("events", "Events") is counter
+    assert registry.get("events") is counter
+    with pytest.raises(ValueError):
+        registry.gauge("events", "Events")
+
+
+def test_labels_must_match_the_declaration():
+    registry = MetricsRegistry()
+    counter = registry.counter("calls", "Calls", ["outcome"])
+    with pytest.raises(ValueError):
+        counter.inc()
+    with pytest.raises(ValueError):
+        counter.labels("ok", "extra")
+    assert counter.labels(outcome="ok") is counter.labels("ok")
+
+
+def test_gauge_callback_is_read_at_render_time():
+    registry = MetricsRegistry()
+    values = iter([1, 2])
+    registry.gauge("connections", "Open connections", callback=lambda: next(values))
+    assert registry.render().splitlines()[-1] == "connections 1"
+    assert registry.render().splitlines()[-1] == "connections 2"
+
+
+def test_gauge_callback_is_rejected_for_labelled_gauges():
+    with pytest.raises(ValueError):
+        Gauge("pool_size", "Pool size", ["pool"], callback=lambda: 1)
+    registry = MetricsRegistry()
+    registry.gauge("pool_size", "Pool size", ["pool"])
+    with pytest.raises(ValueError):
+        registry.gauge("pool_size", "Pool size", ["pool"], callback=lambda: 1)
+
+
+def test_base_metric_is_abstract():
+    with pytest.raises(TypeError):
+        _Metric("abstract", "Not a concrete metric")
+
+
+def test_timed_observes_async_durations():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("handler_seconds", "Handler time", ["handler"])
+
+    @timed(histogram, handler="fetch")
+    async def fetch():
+        await asyncio.sleep(0.01)
+        return "ok"
+
+    assert asyncio.run(fetch()) == "ok"
+    count, total = histogram.totals(handler="fetch")
+    assert count == 1 and total >= 0.01
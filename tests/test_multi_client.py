@@ -0,0 +1,235 @@
+"""Tests for fanning one task out to several agents with MultiAgentClient.
+
+The agents are fakes that stand in for `A2AClient`: each answers after a
+fixed delay, fails or hangs, and records whether its request was cancelled
+and whether it received a `tasks/cancel`.
+"""
+
+import asyncio
+
+import pytest
+
+from common.client.multi_client import FanOutMode, MultiAgentClient
+from common.types import (
+    InternalError,
+    SendTaskResponse,
+    SendTaskStreamingResponse,
+    Task,
+    TaskState,
+    TaskStatus,
+    TaskStatusUpdateEvent,
+)
+
+TASK_ID = "task-1"
+PAYLOAD = {"id": TASK_ID, "sessionId": "s1", "message": {"role": "user", "parts": [{"type": "text", "text": "hi"}]}}
+
+
+class FakeAgent:
+    def __init__(self, url: str, delay: float = 0.0, fail: bool = False, raises: bool = False, events: int = 1):
+        self.url = url
+        self.delay = delay
+        self.fail = fail
+        self.raises = raises
+        self.events = events
+        self.cancelled = False
+        self.cancel_requests: list[dict] = []
+        self.closed = False
+
+    async def _wait(self):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.raises:
+            raise ConnectionError(f"{self.url} is down")
+
+    async def send_task(self, payload: dict) -> SendTaskResponse:
+        await self._wait()
+        if self.fail:
+            return SendTaskResponse(id=payload["id"], error=InternalError())
+        return SendTaskResponse(
+            id=payload["id"],
+            result=Task(id=payload["id"], sessionId="s1", status=TaskStatus(state=TaskState.COMPLETED)),
+        )
+
+    async def send_task_streaming(self, payload: dict):
+        for index in range(self.events):
+            await self._wait()
+            if self.fail:
+                yield SendTaskStreamingResponse(id=payload["id"], error=InternalError())
+                return
+            final = index == self.events - 1
+            state = TaskState.COMPLETED if final else TaskState.WORKING
+            yield SendTaskStreamingResponse(
+                id=payload["id"],
+                result=TaskStatusUpdateEvent(id=payload["id"], status=TaskStatus(state=state), final=final),
+            )
+
+    async def cancel_task(self, payload: dict):
+        self.cancel_requests.append(payload)
+
+    async def aclose(self):
+        self.closed = True
+
+
+def make_client(*agents: FakeAgent, **kwargs) -> MultiAgentClient:
+    client = MultiAgentClient([agent.url for agent in agents], **kwargs)
+    client.clients = list(agents)
+    return client
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_all_mode_returns_every_result_in_completion_order():
+    slow = FakeAgent("http://slow", delay=0.05)
+    failing = FakeAgent("http://failing", delay=0.01, fail=True)
+    down = FakeAgent("http://down", raises=True)
+    hanging = FakeAgent("http://hanging", delay=10)
+
+    async def main():
+        async with make_client(slow, failing, down, hanging, per_agent_timeout={"http://hanging": 0.1}) as client:
+            return await client.send_task(PAYLOAD)
+
+    results = run(main())
+    assert [result.url for result in results] == ["http://down", "http://failing", "http://slow", "http://hanging"]
+    assert [result.ok for result in results] == [False, False, True, False]
+    assert results[0].error == "http://down is down"
+    assert results[1].response.error.code == InternalError().code
+    assert results[3].error == "timeout"
+    assert all(agent.closed for agent in (slow, failing, down, hanging))
+    # Nothing was abandoned, so no agent is asked to cancel
+    assert not any(agent.cancel_requests for agent in (slow, failing, down))
+
+
+def test_first_mode_returns_the_fastest_success_and_cancels_the_rest():
+    failing = FakeAgent("http://failing", fail=True)
+    fast = FakeAgent("http://fast", delay=0.02)
+    slow = FakeAgent("http://slow", delay=10)
+    slower = FakeAgent("http://slower", delay=20)
+
+    async def main():
+        async with make_client(failing, fast, slow, slower) as client:
+            return await client.send_task(PAYLOAD, mode=FanOutMode.FIRST)
+
+    results = run(main())
+    assert [result.url for result in results] == ["http://fast"]
+    assert slow.cancelled and slower.cancelled
+    assert slow.cancel_requests == slower.cancel_requests == [{"id": TASK_ID}]
+    assert not failing.cancel_requests and not fast.cancel_requests
+
+
+def test_quorum_mode_stops_once_enough_agents_succeeded():
+    agents = [FakeAgent("http://a", delay=0.01), FakeAgent("http://b", delay=0.02), FakeAgent("http://c", delay=10)]
+
+    async def main():
+        async with make_client(*agents) as client:
+            return await client.send_task(PAYLOAD, mode="quorum", quorum=2)
+
+    results = run(main())
+    assert [result.url for result in results] == ["http://a", "http://b"]
+    assert agents[2].cancelled
+    assert agents[2].cancel_requests == [{"id": TASK_ID}]
+
+
+def test_quorum_gives_up_once_it_cannot_be_reached():
+    agents = [
+        FakeAgent("http://a", fail=True),
+        FakeAgent("http://b", delay=0.01, raises=True),
+        FakeAgent("http://c", delay=10),
+    ]
+
+    async def main():
+        async with make_client(*agents) as client:
+            return await client.send_task(PAYLOAD, mode=FanOutMode.QUORUM, quorum=2)
+
+    results = run(main())
+    # Two failures leave one agent, which cannot make a quorum of two
+    assert [(result.url, result.ok) for result in results] == [("http://a", False), ("http://b", False)]
+    assert agents[2].cancelled
+    assert agents[2].cancel_requests == [{"id": TASK_ID}]
+
+
+@pytest.mark.parametrize("quorum", [None, 0, 3])
+def test_quorum_must_fit_the_number_of_agents(quorum):
+    async def main():
+        async with make_client(FakeAgent("http://a"), FakeAgent("http://b")) as client:
+            await client.send_task(PAYLOAD, mode=FanOutMode.QUORUM, quorum=quorum)
+
+    with pytest.raises(ValueError):
+        run(main())
+
+
+def test_losers_are_not_cancelled_upstream_when_disabled():
+    slow = FakeAgent("http://slow", delay=10)
+
+    async def main():
+        async with make_client(FakeAgent("http://fast"), slow, cancel_losers=False) as client:
+            return await client.send_task(PAYLOAD, mode=FanOutMode.FIRST)
+
+    results = run(main())
+    assert [result.url for result in results] == ["http://fast"]
+    assert slow.cancelled
+    assert slow.cancel_requests == []
+
+
+def test_streaming_first_mode_follows_the_first_agent_to_answer():
+    fast = FakeAgent("http://fast", delay=0.01, events=3)
+    slow = FakeAgent("http://slow", delay=0.2, events=3)
+    failing = FakeAgent("http://failing", fail=True)
+
+    async def main():
+        async with make_client(failing, fast, slow) as client:
+            return [result async for result in client.send_task_streaming(PAYLOAD, mode=FanOutMode.FIRST)]
+
+    results = run(main())
+    assert [result.url for result in results] == ["http://fast"] * 3
+    assert results[-1].response.result.final
+    assert slow.cancelled
+    assert slow.cancel_requests == [{"id": TASK_ID}]
+
+
+def test_streaming_first_mode_reports_failures_when_nobody_answers():
+    agents = [FakeAgent("http://a", fail=True), FakeAgent("http://b", delay=0.01, raises=True)]
+
+    async def main():
+        async with make_client(*agents) as client:
+            return [result async for result in client.send_task_streaming(PAYLOAD, mode=FanOutMode.FIRST)]
+
+    results = run(main())
+    assert [(result.url, result.ok) for result in results] == [("http://a", False), ("http://b", False)]
+
+
+def test_streaming_quorum_stops_after_enough_final_events():
+    agents = [
+        FakeAgent("http://a", delay=0.01, events=2),
+        FakeAgent("http://b", delay=0.02, events=2),
+        FakeAgent("http://c", delay=0.5, events=2),
+    ]
+
+    async def main():
+        async with make_client(*agents) as client:
+            return [
+                result async for result in client.send_task_streaming(PAYLOAD, mode=FanOutMode.QUORUM, quorum=2)
+            ]
+
+    results = run(main())
+    finals = [result.url for result in results if result.response.result.final]
+    assert finals == ["http://a", "http://b"]
+    assert "http://c" not in {result.url for result in results}
+    assert agents[2].cancelled
+    assert agents[2].cancel_requests == [{"id": TASK_ID}]
+
+
+def test_streaming_all_mode_merges_every_stream():
+    agents = [FakeAgent("http://a", delay=0.01, events=2), FakeAgent("http://b", delay=0.015, events=2)]
+
+    async def main():
+        async with make_client(*agents) as client:
+            return [result async for result in client.send_task_streaming(PAYLOAD)]
+
+    results = run(main())
+    assert sorted(result.url for result in results) == ["http://a"] * 2 + ["http://b"] * 2
+    assert not any(agent.cancel_requests for agent in agents)
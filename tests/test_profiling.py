@@ -0,0 +1,129 @@
+"""Tests for the on-demand profiler and its admin endpoint."""
+
+import asyncio
+import os
+import time
+
+import httpx
+import pytest
+
+from common.server.server import A2AServer
+from common.server.task_manager import InMemoryTaskManager
+from common.utils.profiling import Profiler, ProfileInProgressError
+
+
+class NoopTaskManager(InMemoryTaskManager):
+    async def on_send_task(self, request):
+        raise NotImplementedError
+
+    async def on_send_task_subscribe(self, request):
+        raise NotImplementedError
+
+
+def make_profiler(tmp_path) -> Profiler:
+    return Profiler(output_dir=str(tmp_path), sample_interval=0.001, task_sample_interval=0.01)
+
+
+async def busy_loop(stop: asyncio.Event):
+    while not stop.is_set():
+        end = time.perf_counter() + 0.03
+        while time.perf_counter() < end:
+            pass
+        await asyncio.sleep(0)
+
+
+async def capture_with_load(profiler: Profiler, **kwargs):
+    stop = asyncio.Event()
+    worker = asyncio.create_task(busy_loop(stop))
+    try:
+        return await profiler.capture(**kwargs)
+    finally:
+        stop.set()
+        await worker
+
+
+def test_sample_capture_writes_stacks_and_memory(tmp_path):
+    summary = asyncio.run(capture_with_load(make_profiler(tmp_path), seconds=0.2))
+
+    assert summary["mode"] == "sample"
+    assert summary["samples"] > 0
+    assert set(summary["files"]) == {"cpu", "tasks", "tracemalloc", "tracemalloc_text"}
+    assert all(os.path.isfile(path) for path in summary["files"].values())
+    with open(summary["files"]["cpu"]) as f:
+        assert "busy_loop" in f.read()
+    with open(summary["files"]["tasks"]) as f:
+        assert "busy_loop" in f.read()
+
+
+def test_cprofile_capture_writes_pstats(tmp_path):
+    summary = asyncio.run(
+        capture_with_load(make_profiler(tmp_path), seconds=0.1, mode="cprofile", memory=False)
+    )
+
+    assert summary["mode"] == "cprofile"
+    assert set(summary["files"]) == {"pstats", "pstats_text", "tasks"}
+    assert all(os.path.isfile(path) for path in summary["files"].values())
+    with open(summary["files"]["pstats_text"]) as f:
+        assert "busy_loop" in f.read()
+    assert "top_allocations" not in summary
+
+
+@pytest.mark.parametrize("kwargs", [{"mode": "perf"}, {"seconds": 0}, {"seconds": 121}])
+def test_capture_rejects_invalid_arguments(tmp_path, kwargs):
+    with pytest.raises(ValueError):
+        asyncio.run(make_profiler(tmp_path).capture(**kwargs))
+
+
+def test_concurrent_capture_is_rejected(tmp_path):
+    profiler = make_profiler(tmp_path)
+
+    async def main():
+        first = asyncio.create_task(profiler.capture(seconds=0.1, memory=False))
+        await asyncio.sleep(0)
+        assert profiler.running
+        with pytest.raises(ProfileInProgressError):
+            await profiler.capture(seconds=0.1, memory=False)
+        await first
+        assert not profiler.running
+
+    asyncio.run(main())
+
+
+async def post_profile(server: A2AServer, query: str, headers=None) -> httpx.Response:
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.post(f"/admin/profile?{query}", headers=headers)
+
+
+def test_profile_endpoint_requires_token(tmp_path):
+    server = A2AServer(task_manager=NoopTaskManager(), profiler=make_profiler(tmp_path), admin_token="secret")
+
+    for headers in (None, {"Authorization": "Bearer wrong"}):
+        response = asyncio.run(post_profile(server, "seconds=0.05", headers))
+        assert response.status_code == 401
+    assert not os.listdir(tmp_path)
+
+
+def test_profile_endpoint_captures_with_token(tmp_path):
+    server = A2AServer(task_manager=NoopTaskManager(), profiler=make_profiler(tmp_path), admin_token="secret")
+    headers = {"Authorization": "Bearer secret"}
+
+    response = asyncio.run(post_profile(server, "seconds=0.05&memory=0", headers))
+    assert response.status_code == 200
+    summary = response.json()
+    assert summary["mode"] == "sample"
+    assert os.path.isfile(summary["files"]["cpu"])
+
+    response = asyncio.run(post_profile(server, "seconds=0.05&mode=cprofile&format=pstats&memory=0", headers))
+    assert response.status_code == 200
+    assert response.content
+
+    response = asyncio.run(post_profile(server, "seconds=0.05&mode=cprofile&format=collapsed", headers))
+    assert response.status_code == 400
+
+
+def test_profile_endpoint_not_registered_without_token(tmp_path):
+    server = A2AServer(task_manager=NoopTaskManager(), profiler=make_profiler(tmp_path))
+
+    response = asyncio.run(post_profile(server, "seconds=0.05"))
+    assert response.status_code == 404
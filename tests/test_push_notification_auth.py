@@ -0,0 +1,212 @@
+"""Tests for signing push notifications and verifying them against a cached JWKS.
+
+The sender's JWKS endpoint is served through an `httpx.MockTransport`, which
+also counts how often the receiver fetches it.
+"""
+
+import asyncio
+import json
+import types
+
+import httpx
+import pytest
+from jwt import PyJWKClientError
+from starlette.requests import Request
+
+from common.utils import push_notification_auth as auth_module
+from common.utils.push_notification_auth import (
+    JWKSCache,
+    PushNotificationReceiverAuth,
+    PushNotificationSenderAuth,
+)
+
+JWKS_URL = "http://agent.test/.well-known/jwks.json"
+BODY = {"id": "task-1", "status": {"state": "completed"}}
+
+
+def make_sender() -> PushNotificationSenderAuth:
+    sender = PushNotificationSenderAuth()
+    sender.generate_jwk()
+    return sender
+
+
+@pytest.fixture(scope="module")
+def sender():
+    return make_sender()
+
+
+@pytest.fixture(scope="module")
+def old_sender():
+    """A key that is already published before `sender`'s key is rotated in."""
+    return make_sender()
+
+
+class JWKSEndpoint:
+    def __init__(self, *senders):
+        self.senders = list(senders)
+        self.fetches = 0
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.fetches += 1
+        keys = [key for sender in self.senders for key in sender.public_keys]
+        return httpx.Response(200, json={"keys": keys})
+
+    @property
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handler)
+
+
+class ManualClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = ManualClock()
+    monkeypatch.setattr(auth_module, "time", types.SimpleNamespace(monotonic=clock, time=auth_module.time.time))
+    return clock
+
+
+def signed_request(sender: PushNotificationSenderAuth, body: bytes, signed_body: bytes = None) -> Request:
+    token = sender._generate_jwt_for_body(signed_body if signed_body is not None else body)
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/webhook",
+        "headers": [(b"authorization", f"Bearer {token}".encode()), (b"content-type", b"application/json")],
+    }
+    return Request(scope, receive)
+
+
+def kid(sender: PushNotificationSenderAuth) -> str:
+    return sender.private_key_jwk.key_id
+
+
+def test_keys_are_indexed_by_kid(sender):
+    endpoint = JWKSEndpoint(sender)
+
+    async def main():
+        cache = JWKSCache(JWKS_URL, transport=endpoint.transport)
+        await cache.refresh()
+        first = await cache.get_signing_key(kid(sender))
+        second = await cache.get_signing_key(kid(sender))
+        return cache, first, second
+
+    cache, first, second = asyncio.run(main())
+    assert list(cache.keys) == [kid(sender)]
+    assert first is second
+    # Known kids never go back to the network
+    assert endpoint.fetches == 1
+
+
+def test_unknown_kid_refetches_at_most_once_per_interval(sender, old_sender, clock):
+    endpoint = JWKSEndpoint(old_sender)
+
+    async def main():
+        cache = JWKSCache(JWKS_URL, min_refetch_interval=30, transport=endpoint.transport)
+        await cache.refresh()
+
+        # The sender rotated in a new key after the last fetch, but it is too soon to refetch
+        endpoint.senders.append(sender)
+        clock.now += 10
+        with pytest.raises(PyJWKClientError):
+            await cache.get_signing_key(kid(sender))
+        assert endpoint.fetches == 1
+
+        clock.now += 20
+        key = await cache.get_signing_key(kid(sender))
+        assert endpoint.fetches == 2
+
+        # Unknown kids after that are rate limited again
+        with pytest.raises(PyJWKClientError):
+            await cache.get_signing_key("unknown")
+        assert endpoint.fetches == 2
+        return key
+
+    assert asyncio.run(main()).key_id == kid(sender)
+
+
+def test_background_refresh_picks_up_new_keys(sender, old_sender):
+    endpoint = JWKSEndpoint(old_sender)
+
+    async def main():
+        cache = JWKSCache(JWKS_URL, refresh_interval=0.02, transport=endpoint.transport)
+        await cache.start()
+        assert list(cache.keys) == [kid(old_sender)]
+        endpoint.senders.append(sender)
+        await asyncio.sleep(0.1)
+        await cache.close()
+        fetches = endpoint.fetches
+        await asyncio.sleep(0.05)
+        return cache, fetches
+
+    cache, fetches = asyncio.run(main())
+    assert kid(sender) in cache.keys
+    assert fetches >= 2
+    # Closing stops the loop
+    assert endpoint.fetches == fetches
+
+
+def test_failed_refresh_keeps_the_loaded_keys(sender):
+    endpoint = JWKSEndpoint(sender)
+    failing = {"on": False}
+
+    def handler(request):
+        if failing["on"]:
+            return httpx.Response(503)
+        return endpoint.handler(request)
+
+    async def main():
+        cache = JWKSCache(JWKS_URL, refresh_interval=0.02, transport=httpx.MockTransport(handler))
+        await cache.start()
+        failing["on"] = True
+        await asyncio.sleep(0.08)
+        await cache.close()
+        return cache
+
+    cache = asyncio.run(main())
+    assert endpoint.fetches == 1
+    assert list(cache.keys) == [kid(sender)]
+
+
+def test_receiver_verifies_the_digest_of_the_raw_body(sender):
+    body = sender._serialize_request_body(BODY)
+
+    async def main():
+        receiver = PushNotificationReceiverAuth()
+        await receiver.load_jwks(JWKS_URL, transport=JWKSEndpoint(sender).transport)
+        try:
+            assert await receiver.verify_push_notification(signed_request(sender, body))
+            # Same JSON, different bytes: the digest covers the raw body, not its parsed form
+            reformatted = json.dumps(BODY, indent=2).encode()
+            with pytest.raises(ValueError, match="Invalid request body"):
+                await receiver.verify_push_notification(signed_request(sender, reformatted, signed_body=body))
+        finally:
+            await receiver.close()
+
+    asyncio.run(main())
+
+
+def test_receiver_without_loaded_jwks_rejects_instead_of_crashing(sender):
+    body = sender._serialize_request_body(BODY)
+
+    async def main():
+        return await PushNotificationReceiverAuth().verify_push_notification(signed_request(sender, body))
+
+    assert asyncio.run(main()) is False
+
+
+def test_receiver_rejects_a_missing_bearer_token():
+    async def receive():
+        return {"type": "http.request", "body": b"{}", "more_body": False}
+
+    request = Request({"type": "http", "method": "POST", "path": "/", "headers": []}, receive)
+    assert asyncio.run(PushNotificationReceiverAuth().verify_push_notification(request)) is False
@@ -0,0 +1,111 @@
+"""Tests for merging identical in-flight questions at the RagFlow agent.
+
+Concurrent stateless questions should share one RagFlow completion, while
+sessions that already have a conversation must always get their own call.
+"""
+
+import asyncio
+
+import pytest
+
+from agents.ragflow.mock_server import MockConfig, MockRagFlowServer
+from tests.helpers import make_ragflow_agent, setup_ragflow_env
+
+
+@pytest.fixture
+def mock():
+    return MockRagFlowServer(MockConfig(token_rate=0, latency="fixed:0.2", answer_tokens=5))
+
+
+@pytest.fixture
+def make_agent(monkeypatch, tmp_path, mock):
+    setup_ragflow_env(monkeypatch, tmp_path)
+    return lambda **kwargs: make_ragflow_agent(mock.app, **kwargs)
+
+
+def test_identical_stateless_questions_share_one_completion(make_agent):
+    async def main():
+        agent, transport = make_agent()
+        results = await asyncio.gather(*(agent.invoke("What is A2A?", f"a2a-{i}") for i in range(5)))
+        await agent.close()
+        return agent, transport, results
+
+    agent, transport, results = asyncio.run(main())
+    assert transport.completions() == 1
+    assert transport.session_posts() == 1
+    assert all(result["is_task_complete"] for result in results)
+    assert len({result["content"] for result in results}) == 1
+    # Followers get their own copy of the result
+    assert len({id(result) for result in results}) == 5
+    # Only the leader's session got a RagFlow conversation
+    assert len(agent.session_manager.get_all_sessions()) == 1
+
+
+def test_normalized_questions_are_merged_but_different_ones_are_not(make_agent):
+    async def main():
+        agent, transport = make_agent()
+        await asyncio.gather(
+            agent.invoke("What is A2A?", "a2a-1"),
+            agent.invoke("  what is a2a ", "a2a-2"),
+            agent.invoke("What is HTTP?", "a2a-3"),
+        )
+        await agent.close()
+        return transport
+
+    transport = asyncio.run(main())
+    assert transport.completions() == 2
+
+
+def test_sessions_with_history_are_not_merged(make_agent):
+    async def main():
+        agent, transport = make_agent()
+        await agent.invoke("hello", "a2a-1")
+        await agent.invoke("hello", "a2a-2")
+        before = transport.completions()
+        await asyncio.gather(agent.invoke("What is A2A?", "a2a-1"), agent.invoke("What is A2A?", "a2a-2"))
+        await agent.close()
+        return transport, before
+
+    transport, before = asyncio.run(main())
+    assert transport.completions() - before == 2
+
+
+def test_followers_continue_as_stateful_sessions(make_agent):
+    async def main():
+        agent, transport = make_agent()
+        await asyncio.gather(agent.invoke("What is A2A?", "a2a-1"), agent.invoke("What is A2A?", "a2a-2"))
+        # The follower saw an answer, so its follow-up depends on context and is not merged
+        before = transport.completions()
+        await asyncio.gather(agent.invoke("Tell me more", "a2a-2"), agent.invoke("Tell me more", "a2a-3"))
+        await agent.close()
+        return transport, before
+
+    transport, before = asyncio.run(main())
+    assert transport.completions() - before == 2
+
+
+def test_single_flight_can_be_disabled(make_agent):
+    async def main():
+        agent, transport = make_agent(single_flight=False)
+        await asyncio.gather(*(agent.invoke("What is A2A?", f"a2a-{i}") for i in range(3)))
+        await agent.close()
+        return transport
+
+    assert asyncio.run(main()).completions() == 3
+
+
+def test_identical_streams_share_one_completion(make_agent):
+    async def collect(agent, session_id):
+        return [item async for item in agent.stream("What is A2A?", session_id)]
+
+    async def main():
+        agent, transport = make_agent()
+        streams = await asyncio.gather(*(collect(agent, f"a2a-{i}") for i in range(3)))
+        await agent.close()
+        return transport, streams
+
+    transport, streams = asyncio.run(main())
+    assert transport.completions() == 1
+    finals = [items[-1] for items in streams]
+    assert all(item["is_task_complete"] for item in finals)
+    assert len({item["content"] for item in finals}) == 1
@@ -0,0 +1,77 @@
+"""Tests for RagFlow session creation under concurrent first messages.
+
+The agent talks to the in-process mock RagFlow server through an ASGI
+transport that records every request, and persists mappings to a temporary
+SQLite database.
+"""
+
+import asyncio
+
+import pytest
+
+from agents.ragflow.mock_server import MockConfig, MockRagFlowServer
+from tests.helpers import make_ragflow_agent, setup_ragflow_env
+
+
+@pytest.fixture
+def mock():
+    return MockRagFlowServer(MockConfig(token_rate=0, latency="fixed:0", answer_tokens=5, session_latency="fixed:0.2"))
+
+
+@pytest.fixture
+def make_agent(monkeypatch, tmp_path, mock):
+    setup_ragflow_env(monkeypatch, tmp_path)
+    return lambda: make_ragflow_agent(mock.app, single_flight=False)
+
+
+def test_concurrent_first_messages_create_one_session(make_agent):
+    async def main():
+        agent, transport = make_agent()
+        results = await asyncio.gather(*(agent.invoke(f"question {i}", "a2a-1") for i in range(10)))
+        await agent.close()
+        return agent, transport, results
+
+    agent, transport, results = asyncio.run(main())
+    assert all(result["is_task_complete"] for result in results)
+    assert transport.session_posts() == 1
+    rows = agent.session_manager.get_all_sessions()
+    assert [row["a2a_session_id"] for row in rows] == ["a2a-1"]
+
+
+def test_cancelling_the_leader_does_not_cancel_the_shared_creation(make_agent):
+    async def main():
+        agent, transport = make_agent()
+        leader = asyncio.create_task(agent.invoke("first", "a2a-2"))
+        await asyncio.sleep(0.05)
+        followers = [asyncio.create_task(agent.invoke(f"follower {i}", "a2a-2")) for i in range(3)]
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        results = await asyncio.gather(*followers)
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        await agent.close()
+        return agent, transport, results
+
+    agent, transport, results = asyncio.run(main())
+    assert all(result["is_task_complete"] for result in results)
+    assert transport.session_posts() == 1
+    assert len(agent.session_manager.get_all_sessions()) == 1
+
+
+def test_cancelling_the_only_caller_abandons_the_creation(make_agent):
+    async def main():
+        agent, transport = make_agent()
+        caller = asyncio.create_task(agent.invoke("first", "a2a-3"))
+        await asyncio.sleep(0.05)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        # Nothing was stored, so the next message starts a new creation
+        result = await agent.invoke("again", "a2a-3")
+        await agent.close()
+        return agent, transport, result
+
+    agent, transport, result = asyncio.run(main())
+    assert result["is_task_complete"]
+    assert transport.session_posts() == 2
+    assert len(agent.session_manager.get_all_sessions()) == 1
@@ -0,0 +1,304 @@
+"""Tests for RagFlowTaskManager's ordering of verification, persistence, notifications and streaming.
+
+The agent and the push notification sender are fakes that record calls, and
+the task store is the in-memory task manager.
+"""
+
+import asyncio
+
+import pytest
+
+from agents.ragflow.task_manager import STREAM_TTFT, RagFlowTaskManager
+from common.server.task_manager import InMemoryTaskManager
+from common.types import (
+    InvalidParamsError,
+    SendTaskRequest,
+    SendTaskStreamingRequest,
+    TaskState,
+    TaskStatusUpdateEvent,
+)
+from common.utils.admission import AdmissionController
+
+PUSH_URL = "http://client.test/webhook"
+
+
+class Store(InMemoryTaskManager):
+    def __init__(self):
+        super().__init__()
+        self.fail_upsert = False
+
+    async def upsert_task(self, task_send_params):
+        if self.fail_upsert:
+            # Fail after a round trip, by which time the invocation is running
+            await asyncio.sleep(0.01)
+            raise RuntimeError("database is down")
+        return await super().upsert_task(task_send_params)
+
+    async def on_send_task(self, request):
+        raise NotImplementedError
+
+    async def on_send_task_subscribe(self, request):
+        raise NotImplementedError
+
+
+class FakeAgent:
+    """Answers `invoke` with `result` after `release` is set, or raises `error`."""
+
+    def __init__(self, result=None, error=None):
+        self.result = result or {"is_task_complete": True, "require_user_input": False, "content": "answer", "references": None}
+        self.error = error
+        self.release = asyncio.Event()
+        self.release.set()
+        self.calls = 0
+        self.cancelled = False
+
+    async def invoke(self, query, session_id):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class FakeSender:
+    """Records the task state of each push notification; the first send can be slowed down."""
+
+    def __init__(self, verified=True, first_delay=0.0):
+        self.verified = verified
+        self.first_delay = first_delay
+        self.verified_urls = []
+        self.sent = []
+        self.calls = 0
+
+    async def verify_push_notification_url(self, url):
+        self.verified_urls.append(url)
+        return self.verified
+
+    async def send_push_notification(self, url, data):
+        first = self.calls == 0
+        self.calls += 1
+        if first and self.first_delay:
+            await asyncio.sleep(self.first_delay)
+        # Recorded when the send finishes, so an overtaking send shows up first
+        self.sent.append(data["status"]["state"])
+
+
+def send_request(task_id="t1", push=True) -> SendTaskRequest:
+    params = {
+        "id": task_id,
+        "sessionId": "s1",
+        "message": {"role": "user", "parts": [{"type": "text", "text": "What is A2A?"}]},
+    }
+    if push:
+        params["pushNotification"] = {"url": PUSH_URL}
+    return SendTaskRequest(id=task_id, params=params)
+
+
+def test_rejected_push_url_never_calls_ragflow():
+    async def main():
+        store, agent, sender = Store(), FakeAgent(), FakeSender(verified=False)
+        task_manager = RagFlowTaskManager(store, agent, sender)
+        response = await task_manager.on_send_task(send_request())
+        return store, agent, sender, response
+
+    store, agent, sender, response = asyncio.run(main())
+    assert response.error.code == InvalidParamsError().code
+    assert sender.verified_urls == [PUSH_URL]
+    assert agent.calls == 0
+    assert store.tasks == {}
+    assert sender.sent == []
+
+
+@pytest.mark.parametrize("agent, final_state", [
+    (FakeAgent(), TaskState.COMPLETED),
+    (FakeAgent(error=RuntimeError("upstream failed")), TaskState.FAILED),
+    (FakeAgent(result={"is_task_complete": False, "require_user_input": True, "content": "which one?"}),
+     TaskState.INPUT_REQUIRED),
+])
+def test_notifications_follow_the_state_order_when_a_send_is_slow(agent, final_state):
+    async def main():
+        sender = FakeSender(first_delay=0.05)
+        task_manager = RagFlowTaskManager(Store(), agent, sender)
+        response = await task_manager.on_send_task(send_request())
+        return sender, response
+
+    sender, response = asyncio.run(main())
+    # The response waits until every notification went out, in order
+    assert sender.sent == [TaskState.WORKING, final_state]
+    if final_state != TaskState.FAILED:
+        assert response.result.status.state == final_state
+
+
+def test_tasks_without_push_configuration_send_no_notifications():
+    async def main():
+        sender = FakeSender()
+        task_manager = RagFlowTaskManager(Store(), FakeAgent(), sender)
+        response = await task_manager.on_send_task(send_request(push=False))
+        return sender, response
+
+    sender, response = asyncio.run(main())
+    assert response.result.status.state == TaskState.COMPLETED
+    assert sender.verified_urls == [] and sender.sent == []
+
+
+def test_failed_task_creation_cancels_the_started_invocation():
+    async def main():
+        store, agent = Store(), FakeAgent()
+        store.fail_upsert = True
+        agent.release.clear()
+        task_manager = RagFlowTaskManager(store, agent, FakeSender())
+        with pytest.raises(RuntimeError):
+            await task_manager.on_send_task(send_request())
+        await asyncio.sleep(0)
+        # No invocation is left running in the background
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        return agent, pending
+
+    agent, pending = asyncio.run(main())
+    assert agent.calls == 1
+    assert agent.cancelled
+    assert pending == []
+
+
+class GatedStore(Store):
+    """Store whose SSE consumer setup waits for `ready`, keeping the task unprepared."""
+
+    def __init__(self):
+        super().__init__()
+        self.ready = asyncio.Event()
+        self.updates = []
+
+    async def setup_sse_consumer(self, task_id, is_resubscribe=False):
+        await self.ready.wait()
+        return await super().setup_sse_consumer(task_id, is_resubscribe)
+
+    async def update_store(self, task_id, status, artifacts):
+        self.updates.append(status.state)
+        return await super().update_store(task_id, status, artifacts)
+
+
+class FakeStreamingAgent:
+    """Streams `chunks` partial answers and a final one, `delay` seconds apart."""
+
+    def __init__(self, chunks=2, delay=0.0):
+        self.chunks = chunks
+        self.delay = delay
+        self.started = asyncio.Event()
+        self.closed = False
+
+    async def stream(self, query, session_id):
+        self.started.set()
+        try:
+            for index in range(self.chunks + 1):
+                await asyncio.sleep(self.delay)
+                final = index == self.chunks
+                yield {
+                    "is_task_complete": final,
+                    "require_user_input": False,
+                    "content": "answer" if final else f"chunk {index}",
+                    "references": None,
+                }
+        finally:
+            self.closed = True
+
+
+def subscribe_request(task_id="t1", push=True) -> SendTaskStreamingRequest:
+    return SendTaskStreamingRequest(id=task_id, params=send_request(task_id, push).params)
+
+
+async def collect(events) -> list:
+    return [event.result async for event in events]
+
+
+def other_tasks() -> list:
+    return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+
+def test_stream_starts_early_but_publishes_only_once_prepared():
+    async def main():
+        store, agent = GatedStore(), FakeStreamingAgent()
+        admission = AdmissionController(max_concurrent=4)
+        task_manager = RagFlowTaskManager(store, agent, FakeSender(), admission=admission)
+        subscribing = asyncio.create_task(task_manager.on_send_task_subscribe(subscribe_request(push=False)))
+
+        await asyncio.wait_for(agent.started.wait(), 1)
+        await asyncio.sleep(0.05)
+        # The answer is already there, but nothing is written or published yet
+        assert store.updates == [] and not subscribing.done()
+
+        store.ready.set()
+        events = await collect(await subscribing)
+        await asyncio.sleep(0)
+        return store, agent, admission, events
+
+    store, agent, admission, events = asyncio.run(main())
+    statuses = [event for event in events if isinstance(event, TaskStatusUpdateEvent)]
+    # The answer was ready in time, so no placeholder notice comes first
+    assert statuses[0].status.message.parts[0].text == "chunk 0"
+    assert [event.status.state for event in statuses] == [TaskState.WORKING] * 2 + [TaskState.COMPLETED]
+    assert statuses[-1].final
+    assert store.updates == [TaskState.WORKING] * 2 + [TaskState.COMPLETED]
+    assert agent.closed
+    assert admission.active == 0
+
+
+def test_rejected_push_url_does_not_start_the_stream():
+    async def main():
+        store, agent = GatedStore(), FakeStreamingAgent()
+        admission = AdmissionController(max_concurrent=4)
+        task_manager = RagFlowTaskManager(store, agent, FakeSender(verified=False), admission=admission)
+        response = await task_manager.on_send_task_subscribe(subscribe_request())
+        await asyncio.sleep(0.01)
+        return store, agent, admission, response, other_tasks()
+
+    store, agent, admission, response, pending = asyncio.run(main())
+    assert response.error.code == InvalidParamsError().code
+    assert not agent.started.is_set()
+    assert store.tasks == {}
+    assert admission.active == 0
+    assert pending == []
+
+
+def test_client_disconnect_before_preparation_closes_the_stream():
+    async def main():
+        store, agent = GatedStore(), FakeStreamingAgent(delay=10)
+        admission = AdmissionController(max_concurrent=4)
+        task_manager = RagFlowTaskManager(store, agent, FakeSender(), admission=admission)
+        subscribing = asyncio.create_task(task_manager.on_send_task_subscribe(subscribe_request(push=False)))
+        await asyncio.wait_for(agent.started.wait(), 1)
+
+        subscribing.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await subscribing
+        for _ in range(5):
+            await asyncio.sleep(0)
+        return store, agent, admission, other_tasks()
+
+    store, agent, admission, pending = asyncio.run(main())
+    assert agent.closed
+    assert store.updates == []
+    assert admission.active == 0
+    assert pending == []
+
+
+@pytest.mark.parametrize("delay", [0.0, 0.05])
+def test_time_to_first_token_is_observed_once_per_stream(delay):
+    # With a slow first chunk a placeholder notice is published first; it does not count
+    async def main():
+        store, agent = GatedStore(), FakeStreamingAgent(chunks=3, delay=delay)
+        store.ready.set()
+        task_manager = RagFlowTaskManager(store, agent, FakeSender())
+        before = STREAM_TTFT.totals()[0]
+        events = await collect(await task_manager.on_send_task_subscribe(subscribe_request(push=False)))
+        return events, STREAM_TTFT.totals()[0] - before
+
+    events, observed = asyncio.run(main())
+    first = next(event for event in events if isinstance(event, TaskStatusUpdateEvent))
+    if delay:
+        assert first.status.message.parts[0].text == "正在查询知识库..."
+    assert events[-1].final
+    assert observed == 1
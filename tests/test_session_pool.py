@@ -0,0 +1,151 @@
+"""Tests for the pre-created RagFlow session pool: claims, refills, expiry and shutdown."""
+
+import asyncio
+import types
+
+import pytest
+
+from agents.ragflow import session_pool as session_pool_module
+from agents.ragflow.session_pool import RagFlowSessionPool
+
+
+class ManualClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = ManualClock()
+    monkeypatch.setattr(session_pool_module, "time", types.SimpleNamespace(monotonic=clock))
+    return clock
+
+
+class FakeRagFlow:
+    """Stands in for the create/delete calls; session IDs are numbered in creation order."""
+
+    def __init__(self):
+        self.created = 0
+        self.deleted: list[str] = []
+        self.fail = False
+
+    async def create(self) -> str:
+        if self.fail:
+            raise RuntimeError("upstream down")
+        self.created += 1
+        return f"s{self.created}"
+
+    async def delete(self, session_ids):
+        self.deleted.extend(session_ids)
+
+    def pool(self, **kwargs) -> RagFlowSessionPool:
+        return RagFlowSessionPool(self.create, self.delete, **kwargs)
+
+
+async def wait_for(condition, timeout: float = 2.0):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(poll(), timeout)
+
+
+def test_claim_misses_when_the_pool_is_empty(clock):
+    async def main():
+        pool = FakeRagFlow().pool(low_water=2)
+        assert pool.claim() is None
+
+    asyncio.run(main())
+
+
+def test_pool_refills_to_twice_the_low_water_mark(clock):
+    async def main():
+        ragflow = FakeRagFlow()
+        pool = ragflow.pool(low_water=2)
+        pool.start()
+        await wait_for(lambda: pool.size == 4)
+
+        # Claims are first in, first out, and do not refill above the low water mark
+        assert [pool.claim(), pool.claim()] == ["s1", "s2"]
+        await asyncio.sleep(0.05)
+        assert pool.size == 2 and ragflow.created == 4
+
+        assert pool.claim() == "s3"
+        await wait_for(lambda: pool.size == 4)
+        assert ragflow.created == 7
+        await pool.stop()
+
+    asyncio.run(main())
+
+
+def test_sessions_idle_past_max_idle_are_not_handed_out(clock):
+    async def main():
+        ragflow = FakeRagFlow()
+        pool = ragflow.pool(low_water=1, max_idle=600)
+        pool.start()
+        await wait_for(lambda: pool.size == 2)
+
+        clock.now += 600
+        assert pool.claim() is None
+        # The stale sessions are deleted in the background and replaced
+        await wait_for(lambda: sorted(ragflow.deleted) == ["s1", "s2"] and pool.size == 2)
+        assert pool.claim() == "s3"
+        await pool.stop()
+
+    asyncio.run(main())
+
+
+def test_recycle_deletes_only_expired_sessions(clock):
+    async def main():
+        ragflow = FakeRagFlow()
+        pool = ragflow.pool(low_water=1, target=2, max_idle=600)
+        await pool._refill()
+        clock.now += 300
+        pool._sessions.append(("late", clock.now))
+
+        clock.now += 300
+        await pool._recycle()
+        assert ragflow.deleted == ["s1", "s2"]
+        assert pool.claim() == "late"
+
+    asyncio.run(main())
+
+
+def test_failed_refill_waits_for_the_retry_interval(clock):
+    async def main():
+        ragflow = FakeRagFlow()
+        ragflow.fail = True
+        pool = ragflow.pool(low_water=1, retry_interval=0.1)
+        pool.start()
+        await asyncio.sleep(0.02)
+        # Claims while failing do not trigger immediate retries
+        assert pool.claim() is None
+        await asyncio.sleep(0.02)
+        assert pool.size == 0
+
+        ragflow.fail = False
+        await wait_for(lambda: pool.size == 2)
+        await pool.stop()
+
+    asyncio.run(main())
+
+
+def test_stop_deletes_the_unclaimed_sessions(clock):
+    async def main():
+        ragflow = FakeRagFlow()
+        pool = ragflow.pool(low_water=2)
+        pool.start()
+        await wait_for(lambda: pool.size == 4)
+        assert pool.claim() == "s1"
+
+        await pool.stop()
+        assert sorted(ragflow.deleted) == ["s2", "s3", "s4"]
+        assert pool.size == 0
+        # Stopping twice is harmless
+        await pool.stop()
+        assert len(ragflow.deleted) == 3
+
+    asyncio.run(main())
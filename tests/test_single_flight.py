@@ -0,0 +1,109 @@
+"""Tests for single-flight deduplication of in-flight calls and streams."""
+
+import asyncio
+
+import pytest
+
+from common.utils.single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def main():
+        flight = SingleFlight("test")
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+        assert [result for result, _ in results] == ["result"] * 5
+        assert [shared for _, shared in results] == [False] + [True] * 4
+        # A finished call is not joined by later callers
+        assert await flight.do("key", work) == ("result", False)
+
+    asyncio.run(main())
+    assert calls == 2
+
+
+def test_errors_are_shared():
+    async def work():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        flight = SingleFlight("test")
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+
+    asyncio.run(main())
+
+
+def test_cancelled_leader_leaves_the_call_running_for_followers():
+    started = 0
+
+    async def work():
+        nonlocal started
+        started += 1
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        flight = SingleFlight("test")
+        leader = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await follower == ("result", True)
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+    asyncio.run(main())
+    assert started == 1
+
+
+def test_call_is_cancelled_when_every_caller_is_gone():
+    cancelled = asyncio.Event()
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def main():
+        flight = SingleFlight("test")
+        callers = [asyncio.create_task(flight.do("key", work)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), 1)
+
+    asyncio.run(main())
+
+
+def test_stream_subscribers_receive_the_latest_and_final_items():
+    async def source():
+        for i in range(1, 6):
+            yield i
+            await asyncio.sleep(0.01)
+
+    async def collect(flight):
+        return [item async for item, _ in flight.stream("key", source)]
+
+    async def main():
+        flight = SingleFlight("test")
+        first = asyncio.create_task(collect(flight))
+        await asyncio.sleep(0.025)
+        late = asyncio.create_task(collect(flight))
+        return await first, await late
+
+    first, late = asyncio.run(main())
+    assert first == [1, 2, 3, 4, 5]
+    # A late subscriber starts from the latest snapshot, and always gets the last one
+    assert late[-1] == 5 and late[0] > 1
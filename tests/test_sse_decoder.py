@@ -0,0 +1,161 @@
+"""Fuzz tests for the incremental SSE decoder.
+
+Random event streams are serialized with random line endings, comments and
+field order, then fed to the decoder split at random byte offsets (including
+inside CRLF pairs and multi-byte UTF-8 sequences). Every split must decode to
+the same events as the stream fed in one piece, and those must match the
+generated events.
+"""
+
+import random
+
+import pytest
+
+from common.utils.sse import ServerSentEvent, SSEDecoder
+
+ALPHABET = "abc xyz:{}\"',.-_0123456789éü中文知识库🙂\0"
+
+
+def random_text(rng: random.Random, max_len: int = 40) -> str:
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, max_len)))
+
+
+def random_stream(rng: random.Random, count: int):
+    """Returns (encoded stream, expected events)."""
+    newline = rng.choice(["\n", "\r\n", "\r", None])
+    parts, expected = [], []
+    last_id, retry = "", None
+
+    def line(text: str):
+        ending = newline or rng.choice(["\n", "\r\n", "\r"])
+        if ending == "\n" and text == "" and parts and parts[-1].endswith("\r"):
+            # "\r" followed by "\n" would read as a single CRLF
+            ending = "\r"
+        parts.append(text + ending)
+
+    if rng.random() < 0.2:
+        parts.append("\ufeff")
+    for _ in range(count):
+        if rng.random() < 0.3:
+            line(":" + random_text(rng))
+        event_type = ""
+        data_lines = [random_text(rng) for _ in range(rng.randint(0, 3))]
+        fields = [("data", value) for value in data_lines]
+        if rng.random() < 0.3:
+            event_type = random_text(rng, 10).replace("\0", "")
+            fields.insert(rng.randint(0, len(fields)), ("event", event_type))
+        if rng.random() < 0.3:
+            fields.insert(rng.randint(0, len(fields)), ("id", random_text(rng, 10)))
+        if rng.random() < 0.2:
+            fields.insert(rng.randint(0, len(fields)), ("retry", str(rng.randint(0, 10000))))
+        if rng.random() < 0.1:
+            fields.insert(rng.randint(0, len(fields)), ("retry", "12a"))
+        if rng.random() < 0.1:
+            fields.insert(rng.randint(0, len(fields)), ("unknown", random_text(rng)))
+
+        for name, value in fields:
+            if name == "id" and "\0" not in value:
+                last_id = value
+            elif name == "retry" and value.isdigit():
+                retry = int(value)
+            # A value starting with a space needs the optional separator space
+            separator = ": " if value.startswith(" ") or rng.random() < 0.5 else ":"
+            if name == "data" and value == "" and rng.random() < 0.5:
+                line("data")
+            else:
+                line(f"{name}{separator}{value}")
+        line("")
+        if data_lines:
+            expected.append(ServerSentEvent(event_type or "message", "\n".join(data_lines), last_id, retry))
+    return "".join(parts).encode("utf-8"), expected
+
+
+def decode(chunks) -> list:
+    decoder = SSEDecoder()
+    events = []
+    for chunk in chunks:
+        events.extend(decoder.feed(chunk))
+    events.extend(decoder.flush())
+    return events
+
+
+def random_split(rng: random.Random, payload: bytes) -> list:
+    cuts = sorted(rng.sample(range(len(payload) + 1), min(len(payload) + 1, rng.randint(0, 30))))
+    chunks, start = [], 0
+    for cut in cuts:
+        chunks.append(payload[start:cut])
+        start = cut
+    chunks.append(payload[start:])
+    return chunks
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_random_splits_match_whole_stream(seed):
+    rng = random.Random(seed)
+    payload, expected = random_stream(rng, rng.randint(0, 12))
+
+    assert decode([payload]) == expected
+    for _ in range(5):
+        assert decode(random_split(rng, payload)) == expected
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_byte_at_a_time(seed):
+    rng = random.Random(seed)
+    payload, expected = random_stream(rng, 6)
+    assert decode(payload[i:i + 1] for i in range(len(payload))) == expected
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_garbage_never_raises(seed):
+    rng = random.Random(seed)
+    payload = bytes(rng.choice(b"data:event\r\n :\xff\xfe\xe4\xb8") for _ in range(rng.randint(0, 300)))
+    for event in decode(random_split(rng, payload)):
+        assert isinstance(event.data, str)
+
+
+def test_multiline_data_comments_and_fields():
+    payload = (
+        b": keep-alive\n"
+        b"event: update\n"
+        b"id: 7\n"
+        b"retry: 3000\n"
+        b"data: {\"a\":\n"
+        b"data:  1}\n"
+        b"\n"
+    )
+    [event] = decode([payload])
+    assert event == ServerSentEvent("update", '{"a":\n 1}', "7", 3000)
+    assert event.json() == {"a": 1}
+
+
+def test_event_without_data_is_not_dispatched_and_resets_type():
+    assert decode([b"event: ping\n\ndata: x\n\n"]) == [ServerSentEvent("message", "x")]
+
+
+def test_flush_dispatches_unterminated_event():
+    assert decode([b"data: {\"code\": 0, \"data\": true}"]) == [ServerSentEvent(data='{"code": 0, "data": true}')]
+    assert decode([b"data: last\r"]) == [ServerSentEvent(data="last")]
+
+
+def test_crlf_split_across_chunks_is_one_line_ending():
+    assert decode([b"data: a\r", b"\n\r", b"\n"]) == [ServerSentEvent(data="a")]
+
+
+def test_large_event_in_small_chunks():
+    data = "x" * 200_000
+    payload = f"data: {data}\n\n".encode()
+    chunks = [payload[i:i + 1000] for i in range(0, len(payload), 1000)]
+    assert decode(chunks) == [ServerSentEvent(data=data)]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_raw_data_matches_decoded(seed):
+    rng = random.Random(seed)
+    payload, expected = random_stream(rng, 8)
+    decoder = SSEDecoder(raw_data=True)
+    events = []
+    for chunk in random_split(rng, payload):
+        events.extend(decoder.feed(chunk))
+    events.extend(decoder.flush())
+    assert [event.data for event in events] == [event.data.encode("utf-8") for event in expected]
@@ -0,0 +1,259 @@
+"""Tests for trace context propagation, span recording and OTLP/JSON export."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from common.utils.tracing import (
+    NOOP_SPAN,
+    TRACER,
+    BatchSpanProcessor,
+    FileSpanExporter,
+    OTLPHttpSpanExporter,
+    SpanContext,
+    SpanKind,
+    Tracer,
+    parse_traceparent,
+    traced,
+)
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+SPAN_ID = "00f067aa0ba902b7"
+
+
+class MemoryExporter:
+    def __init__(self):
+        self.payloads = []
+        self.shut_down = False
+
+    def export(self, payload):
+        self.payloads.append(payload)
+
+    def shutdown(self):
+        self.shut_down = True
+
+    @property
+    def spans(self) -> list:
+        return [
+            span
+            for payload in self.payloads
+            for resource in payload["resourceSpans"]
+            for scope in resource["scopeSpans"]
+            for span in scope["spans"]
+        ]
+
+
+@pytest.fixture
+def tracer():
+    tracer = Tracer()
+    exporter = MemoryExporter()
+    tracer.configure(exporter, service_name="test-service", schedule_delay=60)
+    tracer.exporter = exporter
+    yield tracer
+    tracer.shutdown()
+
+
+@pytest.fixture
+def global_tracer():
+    exporter = MemoryExporter()
+    TRACER.configure(exporter, schedule_delay=60)
+    yield exporter
+    TRACER.shutdown()
+
+
+@pytest.mark.parametrize("value, expected", [
+    (f"00-{TRACE_ID}-{SPAN_ID}-01", SpanContext(TRACE_ID, SPAN_ID, True)),
+    (f"00-{TRACE_ID.upper()}-{SPAN_ID}-00", SpanContext(TRACE_ID, SPAN_ID, False)),
+    (f" 01-{TRACE_ID}-{SPAN_ID}-03-future ", SpanContext(TRACE_ID, SPAN_ID, True)),
+    (None, None),
+    ("", None),
+    (f"00-{TRACE_ID}-{SPAN_ID}", None),
+    (f"ff-{TRACE_ID}-{SPAN_ID}-01", None),
+    (f"00-{'0' * 32}-{SPAN_ID}-01", None),
+    (f"00-{TRACE_ID}-{'0' * 16}-01", None),
+    (f"00-{TRACE_ID[:-1]}-{SPAN_ID}-01", None),
+    (f"00-{TRACE_ID}-{SPAN_ID}-zz", None),
+])
+def test_parse_traceparent(value, expected):
+    assert parse_traceparent(value) == expected
+
+
+def test_disabled_tracer_returns_the_noop_span():
+    tracer = Tracer()
+    assert tracer.span("work") is NOOP_SPAN
+    assert tracer.start_span("work") is NOOP_SPAN
+    with tracer.span("work") as span:
+        span.set_attribute("key", "value")
+    assert tracer.inject({}) == {}
+
+
+def test_child_spans_join_the_remote_trace_and_propagate_it(tracer):
+    parent = Tracer.extract({"traceparent": f"00-{TRACE_ID}-{SPAN_ID}-01"})
+    with tracer.span("server", SpanKind.SERVER, parent=parent) as server:
+        with tracer.span("client", SpanKind.CLIENT) as client:
+            headers = tracer.inject({})
+        assert tracer.current_span() is server
+    assert tracer.current_span() is None
+
+    assert server.context.trace_id == client.context.trace_id == TRACE_ID
+    assert server.parent_span_id == SPAN_ID
+    assert client.parent_span_id == server.context.span_id
+    assert headers == {"traceparent": f"00-{TRACE_ID}-{client.context.span_id}-01"}
+    assert parse_traceparent(headers["traceparent"]) == client.context
+
+
+def test_unsampled_remote_parent_is_not_exported(tracer):
+    parent = parse_traceparent(f"00-{TRACE_ID}-{SPAN_ID}-00")
+    with tracer.span("server", parent=parent) as span:
+        assert tracer.inject({})["traceparent"].endswith("-00")
+    assert not span.context.sampled
+    tracer.shutdown()
+    assert tracer.exporter.spans == []
+
+
+def test_exceptions_are_recorded_on_the_span(tracer):
+    with pytest.raises(RuntimeError):
+        with tracer.span("work"):
+            raise RuntimeError("boom")
+    tracer.shutdown()
+    (span,) = tracer.exporter.spans
+    assert span["status"] == {"code": 2, "message": "boom"}
+    assert span["events"][0]["name"] == "exception"
+
+
+def test_otlp_payload_shape(tracer):
+    with tracer.span("lookup", SpanKind.CLIENT, {"retries": 2, "cached": False, "ratio": 0.5, "host": "a"}) as span:
+        span.add_event("retry", {"attempt": 1})
+        span.set_status(True)
+    tracer.shutdown()
+
+    (payload,) = tracer.exporter.payloads
+    (resource,) = payload["resourceSpans"]
+    assert resource["resource"]["attributes"] == [{"key": "service.name", "value": {"stringValue": "test-service"}}]
+    (scope,) = resource["scopeSpans"]
+    assert scope["scope"] == {"name": "kbs_agent_a2a"}
+    (exported,) = scope["spans"]
+    assert exported["traceId"] == span.context.trace_id and len(exported["traceId"]) == 32
+    assert exported["spanId"] == span.context.span_id and len(exported["spanId"]) == 16
+    assert "parentSpanId" not in exported
+    assert exported["name"] == "lookup"
+    assert exported["kind"] == SpanKind.CLIENT
+    assert int(exported["startTimeUnixNano"]) <= int(exported["endTimeUnixNano"])
+    assert exported["attributes"] == [
+        {"key": "retries", "value": {"intValue": "2"}},
+        {"key": "cached", "value": {"boolValue": False}},
+        {"key": "ratio", "value": {"doubleValue": 0.5}},
+        {"key": "host", "value": {"stringValue": "a"}},
+    ]
+    assert exported["events"][0]["name"] == "retry"
+    assert exported["status"] == {"code": 1, "message": ""}
+    # The payload is plain JSON
+    json.dumps(payload)
+    assert tracer.exporter.shut_down
+
+
+def test_traced_runs_the_coroutine_in_a_span(global_tracer):
+    @traced("handler", SpanKind.SERVER, route="/")
+    async def handler():
+        return TRACER.current_span()
+
+    span = asyncio.run(handler())
+    assert span.name == "handler"
+    TRACER.shutdown()
+    (exported,) = global_tracer.spans
+    assert exported["attributes"] == [{"key": "route", "value": {"stringValue": "/"}}]
+
+
+def test_traced_is_a_plain_call_when_disabled():
+    @traced("handler")
+    async def handler():
+        return TRACER.current_span()
+
+    assert asyncio.run(handler()) is None
+
+
+def test_processor_flushes_in_batches_on_shutdown():
+    exporter = MemoryExporter()
+    tracer = Tracer()
+    tracer.configure(exporter, schedule_delay=60, max_batch_size=2)
+    for i in range(5):
+        tracer.start_span(f"span {i}").end()
+    assert exporter.payloads == []
+
+    tracer.shutdown()
+    assert [len(payload["resourceSpans"][0]["scopeSpans"][0]["spans"]) for payload in exporter.payloads] == [2, 2, 1]
+    assert [span["name"] for span in exporter.spans] == [f"span {i}" for i in range(5)]
+    assert not tracer.enabled
+
+
+def test_processor_exports_in_the_background():
+    exporter = MemoryExporter()
+    processor = BatchSpanProcessor(exporter, {}, schedule_delay=0.01)
+    tracer = Tracer()
+    tracer.processor = processor
+    tracer.start_span("work").end()
+    for _ in range(100):
+        if exporter.payloads:
+            break
+        processor._stopped.wait(0.01)
+    assert len(exporter.spans) == 1
+    tracer.shutdown()
+
+
+def test_processor_drops_spans_when_the_queue_is_full():
+    exporter = MemoryExporter()
+    tracer = Tracer()
+    tracer.configure(exporter, schedule_delay=60, max_queue_size=2)
+    processor = tracer.processor
+    for i in range(5):
+        span = tracer.start_span(f"span {i}")
+        span.end()
+        span.end()  # Ending twice is a no-op
+    assert processor.dropped == 3
+    tracer.shutdown()
+    assert [span["name"] for span in exporter.spans] == ["span 0", "span 1"]
+
+
+def test_export_failures_are_logged_not_raised():
+    class FailingExporter(MemoryExporter):
+        def export(self, payload):
+            raise OSError("collector is down")
+
+    tracer = Tracer()
+    tracer.configure(FailingExporter(), schedule_delay=60)
+    tracer.start_span("work").end()
+    tracer.shutdown()
+
+
+def test_file_exporter_writes_one_payload_per_line(tmp_path):
+    path = tmp_path / "traces" / "spans.jsonl"
+    tracer = Tracer()
+    tracer.configure(FileSpanExporter(str(path)), schedule_delay=60, max_batch_size=1)
+    tracer.start_span("first").end()
+    tracer.start_span("second").end()
+    tracer.shutdown()
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    names = [json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"][0]["name"] for line in lines]
+    assert names == ["first", "second"]
+
+
+def test_otlp_http_exporter_posts_to_the_traces_endpoint():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200)
+
+    exporter = OTLPHttpSpanExporter("http://collector:4318/", headers={"x-token": "t"})
+    assert OTLPHttpSpanExporter("http://collector:4318/v1/traces").url == "http://collector:4318/v1/traces"
+    exporter.client = httpx.Client(transport=httpx.MockTransport(handler), headers={"x-token": "t"})
+    exporter.export({"resourceSpans": []})
+    exporter.shutdown()
+
+    (request,) = requests
+    assert str(request.url) == "http://collector:4318/v1/traces"
+    assert request.headers["x-token"] == "t"
+    assert json.loads(request.content) == {"resourceSpans": []}
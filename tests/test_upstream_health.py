@@ -0,0 +1,198 @@
+"""Tests for the circuit breaker, retry budget and jittered backoff.
+
+Time comes from a manual clock and jitter from a seeded RNG, so every
+transition is driven explicitly.
+"""
+
+import random
+
+import pytest
+
+from common.utils.upstream_health import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitOpenError,
+    RetryBudget,
+    UpstreamHealth,
+    parse_retry_after,
+)
+
+
+class ManualClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return ManualClock()
+
+
+def make_health(clock, **kwargs) -> UpstreamHealth:
+    kwargs.setdefault("failure_threshold", 3)
+    kwargs.setdefault("reset_timeout", 10.0)
+    return UpstreamHealth("test", clock=clock, rng=random.Random(42), **kwargs)
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    health = make_health(clock)
+    health.record_failure(500)
+    health.record_failure(500)
+    health.record_success()
+    health.record_failure(500)
+    health.record_failure(500)
+    assert health.state == CLOSED
+    health.check()
+
+    health.record_failure(503)
+    assert health.state == OPEN
+    clock.advance(4)
+    with pytest.raises(CircuitOpenError) as error:
+        health.check()
+    assert error.value.retry_after == pytest.approx(6)
+    assert health.open_for() == pytest.approx(6)
+
+
+def test_half_open_probe_closes_the_circuit_on_success(clock):
+    health = make_health(clock)
+    for _ in range(3):
+        health.record_failure(500)
+    clock.advance(10)
+
+    assert health.open_for() == 0
+    health.check()
+    assert health.state == HALF_OPEN
+    # Only one probe at a time
+    with pytest.raises(CircuitOpenError):
+        health.check()
+
+    health.record_success()
+    assert health.state == CLOSED
+    health.check()
+
+
+def test_failed_probe_reopens_the_circuit(clock):
+    health = make_health(clock)
+    for _ in range(3):
+        health.record_failure(500)
+    clock.advance(10)
+    health.check()
+
+    health.record_failure(502)
+    assert health.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        health.check()
+    clock.advance(10)
+    health.check()
+    assert health.state == HALF_OPEN
+
+
+def test_lost_probe_is_replaced_after_the_reset_timeout(clock):
+    health = make_health(clock)
+    for _ in range(3):
+        health.record_failure(500)
+    clock.advance(10)
+    health.check()
+    clock.advance(9)
+    with pytest.raises(CircuitOpenError):
+        health.check()
+    clock.advance(1)
+    health.check()
+
+
+def test_429_never_trips_the_breaker_and_frees_the_probe(clock):
+    health = make_health(clock)
+    for _ in range(10):
+        health.record_failure(429)
+    assert health.state == CLOSED
+
+    for _ in range(3):
+        health.record_failure(500)
+    clock.advance(10)
+    health.check()
+    health.record_failure(429)
+    assert health.state == HALF_OPEN
+    health.check()
+
+
+def test_retry_budget_allows_the_floor_plus_a_ratio_of_requests(clock):
+    budget = RetryBudget(ratio=0.5, min_per_second=0.2, window=10, clock=clock)
+    for _ in range(4):
+        budget.record_request()
+    # 0.2/s * 10s + 0.5 * 4 requests = 4 retries
+    assert [budget.try_withdraw() for _ in range(5)] == [True] * 4 + [False]
+
+    # Requests and retries leave the window together
+    clock.advance(11)
+    assert [budget.try_withdraw() for _ in range(3)] == [True, True, False]
+
+
+def test_retries_stop_when_the_budget_is_exhausted(clock):
+    health = make_health(clock, max_attempts=10, min_retries_per_second=0.1, budget_window=10, retry_ratio=0)
+    retry = health.start_request()
+    assert retry.next_delay() is not None
+    assert retry.next_delay() is None
+    # The budget is shared: other requests cannot retry either
+    assert health.start_request().next_delay() is None
+
+
+def test_retries_stop_after_max_attempts(clock):
+    health = make_health(clock, max_attempts=3)
+    retry = health.start_request()
+    assert retry.next_delay() is not None
+    assert retry.next_delay() is not None
+    assert retry.next_delay() is None
+    assert retry.attempt == 3
+
+
+def test_backoff_stays_within_decorrelated_jitter_bounds(clock):
+    health = make_health(clock, max_attempts=1000, base_delay=0.5, max_delay=8.0, min_retries_per_second=100)
+    for _ in range(50):
+        retry = health.start_request()
+        previous = health.base_delay
+        for _ in range(10):
+            delay = retry.next_delay()
+            assert health.base_delay <= delay <= min(health.max_delay, previous * 3)
+            previous = delay
+
+
+def test_backoff_is_reproducible_with_a_seeded_rng(clock):
+    def delays():
+        health = make_health(clock, max_attempts=6, min_retries_per_second=100)
+        retry = health.start_request()
+        return [retry.next_delay() for _ in range(5)]
+
+    assert delays() == delays()
+
+
+def test_retry_after_stretches_the_delay_up_to_the_cap(clock):
+    health = make_health(clock, max_attempts=10, max_delay=1.0, max_retry_after=5.0, min_retries_per_second=100)
+    retry = health.start_request()
+    assert retry.next_delay(retry_after=3.0) == 3.0
+    assert retry.next_delay(retry_after=60.0) == 5.0
+    assert retry.next_delay(retry_after=0.0) <= 1.0
+
+
+def test_failover_retries_immediately(clock):
+    health = make_health(clock, min_retries_per_second=100)
+    assert health.start_request().next_delay(failover=True) == 0.0
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("5", 5.0),
+    ("1.5", 1.5),
+    ("-3", 0.0),
+    ("", None),
+    (None, None),
+    ("soon", None),
+    ("Wed, 21 Oct 2015 07:28:00 GMT", 0.0),
+])
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value) == expected
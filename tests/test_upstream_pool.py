@@ -0,0 +1,159 @@
+"""Tests for load balancing across RagFlow hosts: parsing, weighted round-robin and failover."""
+
+import asyncio
+import random
+from collections import Counter
+
+import httpx
+import pytest
+
+from agents.ragflow.mock_server import MockConfig, MockRagFlowServer
+from common.utils.upstream_health import OPEN, CircuitOpenError
+from common.utils.upstream_pool import UpstreamPool, parse_endpoints
+from tests.helpers import RecordingTransport, make_ragflow_agent, setup_ragflow_env
+
+
+class ManualClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return ManualClock()
+
+
+def make_pool(clock, urls, **kwargs) -> UpstreamPool:
+    kwargs.setdefault("failure_threshold", 2)
+    kwargs.setdefault("reset_timeout", 10.0)
+    return UpstreamPool("test", urls, clock=clock, rng=random.Random(42), **kwargs)
+
+
+def urls(endpoints) -> list:
+    return [endpoint.url for endpoint in endpoints]
+
+
+def test_parse_endpoints():
+    assert parse_endpoints("http://a:9380/, http://b:9380;weight=3,,") == [("http://a:9380", 1), ("http://b:9380", 3)]
+    assert parse_endpoints(["http://a", "http://b; weight = 2"]) == [("http://a", 1), ("http://b", 2)]
+    with pytest.raises(ValueError):
+        parse_endpoints("http://a;weight=0")
+    with pytest.raises(ValueError):
+        parse_endpoints("http://a;priority=1")
+    with pytest.raises(ValueError):
+        UpstreamPool("test", " , ")
+
+
+def test_smooth_weighted_round_robin_interleaves_hosts(clock):
+    pool = make_pool(clock, "http://a,http://b;weight=2")
+    picks = urls(pool.select() for _ in range(6))
+    assert picks == ["http://b", "http://a", "http://b"] * 2
+
+
+def test_distribution_follows_the_weights(clock):
+    pool = make_pool(clock, "http://a;weight=1,http://b;weight=3,http://c;weight=6")
+    counts = Counter(urls(pool.select() for _ in range(1000)))
+    assert counts == {"http://a": 100, "http://b": 300, "http://c": 600}
+
+
+def test_select_prefers_hosts_not_yet_tried(clock):
+    pool = make_pool(clock, "http://a,http://b,http://c")
+    a, b, c = pool.endpoints
+    for _ in range(10):
+        assert pool.select(exclude=[a, b]) is c
+    assert pool.select(exclude=[a, c]) is b
+    # With every host tried, any available one is used again
+    assert pool.select(exclude=[a, b, c]) in pool.endpoints
+    assert pool.has_alternative([a, b])
+    assert not pool.has_alternative([a, b, c])
+
+
+def test_hosts_with_an_open_breaker_are_skipped(clock):
+    pool = make_pool(clock, "http://a,http://b")
+    a, b = pool.endpoints
+    pool.record_failure(a)
+    pool.record_failure(a, 503)
+    assert a.health.state == OPEN
+    assert urls(pool.select() for _ in range(4)) == ["http://b"] * 4
+    assert not pool.has_alternative([b])
+
+    # After the reset timeout the host gets one probe and rejoins on success
+    clock.now += 10
+    assert pool.select(exclude=[b]) is a
+    pool.record_success(a, 0.1)
+    assert sorted(urls(pool.select() for _ in range(4))) == ["http://a"] * 2 + ["http://b"] * 2
+
+
+def test_all_breakers_open_raises_with_the_shortest_wait(clock):
+    pool = make_pool(clock, "http://a,http://b")
+    a, b = pool.endpoints
+    pool.record_failure(a)
+    pool.record_failure(a)
+    clock.now += 4
+    pool.record_failure(b)
+    pool.record_failure(b)
+    with pytest.raises(CircuitOpenError) as error:
+        pool.select()
+    assert error.value.retry_after == pytest.approx(6)
+
+
+def test_single_host_uses_its_own_breaker(clock):
+    pool = make_pool(clock, "http://a")
+    assert pool.endpoints[0].health.name == "test"
+    pool.record_failure(pool.endpoints[0])
+    pool.record_failure(pool.endpoints[0])
+    with pytest.raises(CircuitOpenError):
+        pool.select()
+
+
+def test_stats_track_requests_and_latency(clock):
+    pool = make_pool(clock, "http://a")
+    host = pool.endpoints[0]
+    pool.record_success(host, 1.0)
+    pool.record_success(host, 2.0)
+    pool.record_failure(host, 500)
+    snapshot = pool.snapshot()[0]
+    assert (snapshot["requests"], snapshot["failures"]) == (3, 1)
+    assert snapshot["latencyEwma"] == pytest.approx(1.3)
+
+
+class PartlyDownTransport(RecordingTransport):
+    """Refuses connections to the hosts in `down` and sends the rest to the mock server."""
+
+    def __init__(self, app, down):
+        super().__init__(app)
+        self.down = set(down)
+        self.hosts: list[str] = []
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.hosts.append(request.url.host)
+        if request.url.host in self.down:
+            raise httpx.ConnectError("Connection refused", request=request)
+        return await super().handle_async_request(request)
+
+
+def test_agent_fails_over_to_an_untried_host_on_connect_error(monkeypatch, tmp_path, clock):
+    setup_ragflow_env(monkeypatch, tmp_path)
+    mock = MockRagFlowServer(MockConfig(token_rate=0, latency="fixed:0", answer_tokens=5))
+
+    async def main():
+        upstream = make_pool(clock, "http://down.test,http://up.test", failure_threshold=5, max_attempts=3)
+        transport = PartlyDownTransport(mock.app, ["down.test"])
+        agent, _ = make_ragflow_agent(mock.app, transport, upstream=upstream)
+        results = [await agent.invoke(f"question {i}", f"a2a-{i}") for i in range(3)]
+        await agent.close()
+        return upstream, transport, results
+
+    upstream, transport, results = asyncio.run(main())
+    assert all(result["is_task_complete"] for result in results)
+    # Every call that hit the dead host moved straight on to the other one
+    for previous, host in zip(transport.hosts, transport.hosts[1:]):
+        if previous == "down.test":
+            assert host == "up.test"
+    assert transport.completions() == 3
+    down, up = upstream.endpoints
+    assert down.failures == down.requests > 0
+    assert up.failures == 0